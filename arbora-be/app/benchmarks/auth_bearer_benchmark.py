@@ -0,0 +1,68 @@
+"""
+Measures the overhead the JWTBearer dependency adds to every authenticated request: the token validated and then decoded
+again, the way it used to be, against it verified once, the first time it is seen and when it was verified recently.
+
+Run from the app directory with the source roots on the path:
+
+$ PYTHONPATH=.:utils:models:routers python benchmarks/auth_bearer_benchmark.py
+"""
+import asyncio
+import os
+import time
+
+# the settings are read on import, the benchmark doesn't need real ones
+for name, value in {'JWT_SECRET_KEY': 'benchmark-secret-of-at-least-32-bytes', 'JWT_ALGORITHM': 'HS256',
+                    'MONGODB_URL': 'mongodb://localhost:27017', 'DB_NAME': 'arbora', 'GOOGLE_AI_API_KEY': 'benchmark-key'}.items():
+    os.environ.setdefault(name, value)
+
+from fastapi import HTTPException
+from fastapi.security import HTTPBearer
+from starlette.requests import Request
+
+from auth_bearer import JWTBearer
+from utils.auth_utils import VERIFIED_TOKEN_CACHE, decodeJWTToken, generateJWTToken
+
+NO_OF_REQUESTS = 20_000
+
+
+class DoubleDecodingJWTBearer(HTTPBearer):
+    # the dependency as it was, the token is decoded to validate it and then again to read it
+    async def __call__(self, request: Request):
+        credentials = await super().__call__(request)
+        payload = decodeJWTToken(credentials.credentials)
+        if payload is None or payload.expires <= time.time():
+            raise HTTPException(status_code=401, detail="Invalid token or expired token.")
+        token = decodeJWTToken(credentials.credentials)
+        request.state.user_id = token.user_id
+        return token
+
+
+def createRequest(token: str) -> Request:
+    return Request({'type': 'http', 'method': 'GET', 'path': '/', 'headers': [(b'authorization', f'Bearer {token}'.encode())]})
+
+
+async def measure(bearer: HTTPBearer, tokens: list[str], clear_cache: bool) -> float:
+    # the microseconds per request, the best of a few runs
+    timings = []
+    for _ in range(3):
+        requests = [createRequest(tokens[i % len(tokens)]) for i in range(NO_OF_REQUESTS)]
+        start = time.perf_counter()
+        for request in requests:
+            if clear_cache:
+                VERIFIED_TOKEN_CACHE.clear()
+            await bearer(request)
+        timings.append((time.perf_counter() - start) / NO_OF_REQUESTS * 1e6)
+    return min(timings)
+
+
+async def main() -> None:
+    # a few clients, each making many requests with the same token
+    tokens = [generateJWTToken(f'user-{i}') for i in range(50)]
+    double_decoding = await measure(DoubleDecodingJWTBearer(), tokens, False)
+    cold = await measure(JWTBearer(), tokens, True)
+    warm = await measure(JWTBearer(), tokens, False)
+    print(f'decoded twice {double_decoding:6.1f} us | decoded once {cold:6.1f} us | verified recently {warm:6.1f} us')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,99 @@
+"""
+Compares listing documents as a single json body, read with to_list, validated into ListDocumentsResponse and dumped into a
+JSONResponse, against streaming them as newline delimited json a batch at a time: the peak memory of each and the time until the
+first byte of the response is ready.
+
+The documents are generated as the cursor is iterated, the way they would arrive from the database, so only what the listing
+holds on to counts towards its memory.
+
+Run from the app directory with the source roots on the path:
+
+$ PYTHONPATH=.:utils:models:routers python benchmarks/list_documents_stream_benchmark.py
+"""
+import asyncio
+import random
+import time
+import tracemalloc
+
+from starlette.responses import JSONResponse
+
+from models.document import Document
+from routers import GenericResponse
+from utils.model_utils import getCurrentTimestamp
+from utils.note_review_utils import HALF_LIFE, createRecallState, updateAllNotesRecallProbabilities
+from utils.stream_utils import generateNdjsonLines
+from note import NoteReview
+
+
+class ListDocumentsResponse(GenericResponse):
+    documents: list[Document]
+
+
+class GeneratedCursor:
+    # a motor cursor over generated documents, each generated when it is fetched
+    def __init__(self, no_of_documents: int, notes_per_document: int, reviews_per_note: int):
+        self.no_of_documents = no_of_documents
+        self.notes_per_document = notes_per_document
+        self.reviews_per_note = reviews_per_note
+
+    def batch_size(self, batch_size: int) -> 'GeneratedCursor':
+        return self
+
+    async def to_list(self, length=None) -> list[dict]:
+        return [document async for document in self]
+
+    async def __aiter__(self):
+        # the reviews of a note are generated once and shared, only the notes and documents are new every time
+        rng = random.Random(0)
+        now = getCurrentTimestamp()
+        reviews = [NoteReview(review_type=rng.choice(list(HALF_LIFE)), score=rng.random(), timestamp=now).model_dump()
+                   for _ in range(self.reviews_per_note)]
+        recall_state = createRecallState([NoteReview(**review) for review in reviews]).model_dump()
+        for _ in range(self.no_of_documents):
+            notes = {str(i + 1): {'title': str(i + 1), 'content': 'content ' * 50, 'level': 1, 'children': [], 'edits': [],
+                                  'created_at': now, 'recall_probability': 0, 'reviews': reviews, 'recall_state': recall_state}
+                     for i in range(self.notes_per_document)}
+            yield {'creator_id': 'user', 'title': 'document', 'content': 'content ' * 1000, 'notes': notes}
+
+
+async def listDocuments(cursor: GeneratedCursor) -> float:
+    start = time.perf_counter()
+    documents = await cursor.to_list(length=None)
+    updateAllNotesRecallProbabilities([document['notes'] for document in documents])
+    response = ListDocumentsResponse(documents=documents, is_successful=True, message="Documents retrieved successfully")
+    JSONResponse(content=response.model_dump(mode='json')).body
+    return time.perf_counter() - start
+
+
+async def streamDocuments(cursor: GeneratedCursor) -> float:
+    start = time.perf_counter()
+    first_byte = None
+    async for _ in generateNdjsonLines(cursor, Document, lambda documents: updateAllNotesRecallProbabilities(
+            [document['notes'] for document in documents])):
+        if first_byte is None:
+            first_byte = time.perf_counter() - start
+    return first_byte
+
+
+def measure(listing, cursor: GeneratedCursor) -> tuple[float, int]:
+    # the time to the first byte without tracing, as tracing slows everything down, and the peak memory with it
+    first_byte = asyncio.run(listing(cursor))
+    tracemalloc.start()
+    asyncio.run(listing(cursor))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return first_byte, peak
+
+
+def benchmark(no_of_documents: int, notes_per_document: int, reviews_per_note: int) -> None:
+    cursor = GeneratedCursor(no_of_documents, notes_per_document, reviews_per_note)
+    legacy_first_byte, legacy_peak = measure(listDocuments, cursor)
+    first_byte, peak = measure(streamDocuments, cursor)
+    print(f'{no_of_documents:>5} documents x {notes_per_document} notes x {reviews_per_note} reviews | '
+          f'peak memory {legacy_peak / 2 ** 20:7.1f} MiB -> {peak / 2 ** 20:5.1f} MiB | '
+          f'first byte {legacy_first_byte * 1000:8.1f} ms -> {first_byte * 1000:6.1f} ms')
+
+
+if __name__ == '__main__':
+    for no_of_documents in (100, 500, 2_000):
+        benchmark(no_of_documents, 30, 10)
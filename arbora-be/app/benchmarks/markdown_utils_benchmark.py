@@ -0,0 +1,123 @@
+"""
+Compares the single-pass heading parser against the previous line-by-line implementation, and the incremental re-parse
+of a one sentence edit against parsing the edited document from scratch.
+
+Run from the app directory with the source roots on the path:
+
+$ PYTHONPATH=.:utils:models:routers python benchmarks/markdown_utils_benchmark.py
+"""
+import random
+import re
+import timeit
+
+from utils.document_utils import calculateContentEditOpcodes
+from utils.markdown_utils import parseMarkdownHeadings, reparseMarkdownHeadings, HeadingNode
+
+WORDS = ['arbora', 'note', 'recall', 'review', 'memory', 'tree', 'branch', 'leaf', 'study', 'card', 'question', 'answer']
+
+
+def legacyParseMarkdownHeadings(markdown: str) -> dict[str, HeadingNode]:
+    # the per-line regex parser that parseMarkdownHeadings replaced, kept as the baseline
+    lines = markdown.split('\n')
+    heading_structure = {}
+    node_stack = []
+    current_content = []
+
+    for line in lines:
+        line = line.strip()
+        heading_match = re.match(r'^(#{1,6})\s+(.+)$', line)
+
+        if heading_match:
+            if node_stack:
+                last_coords = node_stack[-1][1]
+                heading_structure[last_coords].content = '\n'.join(current_content).strip()
+            current_content = []
+
+            level = len(heading_match.group(1))
+            title = heading_match.group(2)
+
+            while node_stack and node_stack[-1][0] >= level:
+                if node_stack[-1][1].count('.') == 0:
+                    break
+                node_stack.pop()
+
+            if len(node_stack) == 0:
+                coords = '1'
+            else:
+                if node_stack[-1][0] >= level:
+                    coords = str(int(node_stack[-1][1]) + 1)
+                else:
+                    coords = node_stack[-1][1] + '.' + str(len(heading_structure[node_stack[-1][1]].children) + 1)
+
+            if node_stack and coords.count('.') > 0:
+                parent_coords = '.'.join(coords.split('.')[:-1])
+                heading_structure[parent_coords].children.append(coords)
+
+            node_stack.append((level, coords))
+            node = HeadingNode()
+            node.title = title
+            node.coords = coords
+            node.level = level
+            heading_structure[coords] = node
+        else:
+            current_content.append(line)
+
+    if node_stack:
+        last_coords = node_stack[-1][1]
+        heading_structure[last_coords].content = '\n'.join(current_content).strip()
+
+    return heading_structure
+
+
+def generateDocument(no_of_chars: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    lines = []
+    size = 0
+    while size < no_of_chars:
+        if rng.random() < 0.15:
+            line = '#' * rng.randint(1, 4) + ' ' + ' '.join(rng.choices(WORDS, k=rng.randint(1, 4)))
+        else:
+            line = ' '.join(rng.choices(WORDS, k=rng.randint(4, 16)))
+        lines.append(line)
+        size += len(line) + 1
+    return '\n'.join(lines)[:no_of_chars]
+
+
+def benchmark(no_of_chars: int) -> None:
+    document = generateDocument(no_of_chars)
+    repeats = max(1, 200_000 // no_of_chars)
+
+    legacy = min(timeit.repeat(lambda: legacyParseMarkdownHeadings(document), number=repeats, repeat=3)) / repeats
+    single_pass = min(timeit.repeat(lambda: parseMarkdownHeadings(document), number=repeats, repeat=3)) / repeats
+
+    def parseAndMaterialize():
+        for node in parseMarkdownHeadings(document).values():
+            _ = node.content
+
+    materialized = min(timeit.repeat(parseAndMaterialize, number=repeats, repeat=3)) / repeats
+
+    print(f'{no_of_chars:>9} chars | legacy {legacy * 1000:9.3f} ms | single pass {single_pass * 1000:9.3f} ms '
+          f'({legacy / single_pass:5.1f}x) | single pass + all content {materialized * 1000:9.3f} ms ({legacy / materialized:5.1f}x)')
+
+
+def benchmarkReparse(no_of_chars: int) -> None:
+    document = generateDocument(no_of_chars)
+    middle = document.index('\n', no_of_chars // 2)
+    edited_document = document[:middle] + ' an extra sentence in one section.' + document[middle:]
+    edit_opcodes = calculateContentEditOpcodes(document, edited_document)
+    previous_structure = parseMarkdownHeadings(document)
+    repeats = max(1, 200_000 // no_of_chars)
+
+    full = min(timeit.repeat(lambda: parseMarkdownHeadings(edited_document), number=repeats, repeat=3)) / repeats
+    incremental = min(timeit.repeat(lambda: reparseMarkdownHeadings(previous_structure, edited_document, edit_opcodes),
+                                    number=repeats, repeat=3)) / repeats
+
+    print(f'{no_of_chars:>9} chars | full re-parse {full * 1000:9.3f} ms | incremental re-parse {incremental * 1000:9.3f} ms '
+          f'({full / incremental:5.1f}x)')
+
+
+if __name__ == '__main__':
+    for size in (10_000, 1_000_000):
+        benchmark(size)
+    for size in (10_000, 1_000_000):
+        benchmarkReparse(size)
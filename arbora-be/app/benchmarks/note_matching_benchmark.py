@@ -0,0 +1,113 @@
+"""
+Compares the indexed note matcher against the previous all-pairs SequenceMatcher matching on synthetic documents.
+
+Run from the app directory with the source roots on the path:
+
+$ PYTHONPATH=.:utils:models:routers python benchmarks/note_matching_benchmark.py
+"""
+import difflib
+import random
+import time
+from typing import Optional
+
+from utils.markdown_utils import parseMarkdownHeadings
+from utils.model_utils import getCurrentTimestamp
+from utils.note_matching_utils import matchNotes
+from note import Note
+
+WORDS = ['arbora', 'note', 'recall', 'review', 'memory', 'tree', 'branch', 'leaf', 'study', 'card', 'question', 'answer',
+         'forest', 'root', 'seed', 'growth', 'season', 'light', 'water', 'soil']
+
+# the all-pairs matching takes minutes past this many headings
+LEGACY_MAX_HEADINGS = 500
+
+
+def legacyCalculateContentEdit(before: str, after: str) -> tuple[int, int]:
+    # the SequenceMatcher diff calculateContentEdit did before diff_utils
+    added_chars, deleted_chars = 0, 0
+    for opcode, i1, i2, j1, j2 in difflib.SequenceMatcher(None, before, after).get_opcodes():
+        if opcode in ('insert', 'replace'):
+            added_chars += j2 - j1
+        if opcode in ('delete', 'replace'):
+            deleted_chars += i2 - i1
+    return added_chars, deleted_chars
+
+
+def legacyMatchNotes(current_notes: dict[str, Note], new_sections: dict, content_change_threshold: float = 0.5) -> dict[str, tuple[str, int, int]]:
+    # the matching generateUpdatedDocumentNotes did before matchNotes, kept as the baseline
+    matches = {}
+    for new_coords in list(new_sections.keys()):
+        closest_match: Optional[tuple[str, float, int, int]] = None
+        for existing_coords in current_notes.keys():
+            added, deleted = legacyCalculateContentEdit(current_notes[existing_coords].content, new_sections[new_coords].content)
+            change = (added + deleted) / (len(current_notes[existing_coords].content) + 1)
+
+            if new_sections[new_coords].title == current_notes[existing_coords].title:
+                closest_match = (existing_coords, change, added, deleted)
+                break
+
+            if closest_match is None or change < closest_match[1]:
+                closest_match = (existing_coords, change, added, deleted)
+
+        if closest_match and closest_match[1] < content_change_threshold:
+            matches[new_coords] = closest_match[0], closest_match[2], closest_match[3]
+    return matches
+
+
+def generateSection(rng: random.Random, index: int) -> str:
+    title = f'{" ".join(rng.choices(WORDS, k=2))} {index}'
+    content = '\n'.join(' '.join(rng.choices(WORDS, k=rng.randint(6, 14))) for _ in range(rng.randint(1, 3)))
+    return f'{"#" * rng.randint(1, 3)} {title}\n{content}\n'
+
+
+def generateDocuments(no_of_headings: int, seed: int = 0) -> tuple[str, str]:
+    """
+    Generates a document and an edited version of it where a tenth of the sections have a word changed, and a few are
+    renamed, inserted or deleted.
+    """
+    rng = random.Random(seed)
+    sections = [generateSection(rng, i) for i in range(no_of_headings)]
+    edited_sections = []
+    for i, section in enumerate(sections):
+        roll = rng.random()
+        if roll < 0.1:
+            words = section.split(' ')
+            words[rng.randrange(1, len(words))] = rng.choice(WORDS)
+            edited_sections.append(' '.join(words))
+        elif roll < 0.13:
+            heading, content = section.split('\n', 1)
+            edited_sections.append(heading + ' renamed\n' + content)
+        elif roll < 0.15:
+            edited_sections.append(section)
+            edited_sections.append(generateSection(rng, no_of_headings + i))
+        elif roll < 0.17:
+            continue
+        else:
+            edited_sections.append(section)
+    return ''.join(sections), ''.join(edited_sections)
+
+
+def benchmark(no_of_headings: int) -> None:
+    document, edited_document = generateDocuments(no_of_headings)
+    current_notes = {coords: Note(created_at=getCurrentTimestamp(), title=node.title, content=node.content, level=node.level, children=node.children)
+                     for coords, node in parseMarkdownHeadings(document).items()}
+    new_sections = parseMarkdownHeadings(edited_document)
+
+    start = time.perf_counter()
+    matches = matchNotes(current_notes, new_sections)
+    indexed = time.perf_counter() - start
+
+    if no_of_headings <= LEGACY_MAX_HEADINGS:
+        start = time.perf_counter()
+        legacy_matches = legacyMatchNotes(current_notes, new_sections)
+        legacy = time.perf_counter() - start
+        legacy_result = f'legacy {legacy * 1000:10.1f} ms ({len(legacy_matches)} matched, {legacy / indexed:6.1f}x)'
+    else:
+        legacy_result = 'legacy skipped (quadratic)'
+
+    print(f'{no_of_headings:>5} headings | indexed {indexed * 1000:8.1f} ms ({len(matches)} matched) | {legacy_result}')
+
+
+if __name__ == '__main__':
+    for headings in (50, 500, 5000):
+        benchmark(headings)
@@ -0,0 +1,102 @@
+"""
+Compares the array-backed NoteTree against walking the dotted coords and children lists of the stored notes, on deep and on
+wide trees: the memory each takes and the time of a full traversal and of looking up the branch of every note.
+
+Run from the app directory with the source roots on the path:
+
+$ PYTHONPATH=.:utils:models:routers python benchmarks/note_tree_benchmark.py
+"""
+import timeit
+import tracemalloc
+
+from utils.note_tree_utils import NoteTree
+
+
+def generateDeepNotes(no_of_notes: int, depth: int) -> dict:
+    # chains of notes, each one the only child of the one before it
+    notes = {}
+    root_count = 0
+    while len(notes) < no_of_notes:
+        root_count += 1
+        coords = str(root_count)
+        for _ in range(depth):
+            if len(notes) == no_of_notes:
+                break
+            notes[coords] = {'children': []}
+            if '.' in coords:
+                notes[coords.rsplit('.', 1)[0]]['children'].append(coords)
+            coords += '.1'
+    return notes
+
+
+def generateWideNotes(no_of_notes: int) -> dict:
+    # a single root with every other note as its child
+    notes = {'1': {'children': [f'1.{i + 1}' for i in range(no_of_notes - 1)]}}
+    for child_coords in notes['1']['children']:
+        notes[child_coords] = {'children': []}
+    return notes
+
+
+def legacyTraverse(notes: dict) -> list[tuple[str, int]]:
+    # the recursive walk of the children lists from the roots the recall computation did before NoteTree
+    order = []
+
+    def visit(note_id: str, depth: int) -> None:
+        order.append((note_id, depth))
+        for child_id in notes[note_id]['children']:
+            visit(child_id, depth + 1)
+
+    for root_note_id in [key for key in notes.keys() if '.' not in key]:
+        visit(root_note_id, 0)
+    return order
+
+
+def legacyBranches(notes: dict) -> list[list[str]]:
+    # every note's ancestors worked out by splitting its coords
+    branches = []
+    for coords in notes.keys():
+        parts = coords.split('.')
+        branches.append(['.'.join(parts[:i + 1]) for i in range(len(parts))])
+    return branches
+
+
+def treeTraverse(tree: NoteTree) -> list[tuple[int, int]]:
+    return list(zip(range(len(tree)), tree.depths))
+
+
+def treeBranches(tree: NoteTree) -> list[list[int]]:
+    return [tree.branch(note_id) for note_id in range(len(tree))]
+
+
+def measureMemory(build) -> int:
+    tracemalloc.start()
+    built = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del built
+    return size
+
+
+def benchmark(name: str, notes: dict) -> None:
+    tree = NoteTree.fromNotes(notes)
+    repeats = max(1, 200_000 // len(notes))
+
+    # the structure alone, the coords and children lists of the stored notes against the tree's arrays and coords
+    structure_memory = measureMemory(lambda: {coords: list(note['children']) for coords, note in notes.items()})
+    tree_memory = measureMemory(lambda: NoteTree.fromNotes(notes))
+    build = min(timeit.repeat(lambda: NoteTree.fromNotes(notes), number=repeats, repeat=3)) / repeats
+    legacy_traversal = min(timeit.repeat(lambda: legacyTraverse(notes), number=repeats, repeat=3)) / repeats
+    tree_traversal = min(timeit.repeat(lambda: treeTraverse(tree), number=repeats, repeat=3)) / repeats
+    legacy_branches = min(timeit.repeat(lambda: legacyBranches(notes), number=repeats, repeat=3)) / repeats
+    tree_branches = min(timeit.repeat(lambda: treeBranches(tree), number=repeats, repeat=3)) / repeats
+
+    print(f'{name:<24} | memory {structure_memory / 1024:8.1f} KiB -> {tree_memory / 1024:8.1f} KiB | build {build * 1000:7.2f} ms | '
+          f'traversal {legacy_traversal * 1000:7.2f} -> {tree_traversal * 1000:6.2f} ms | '
+          f'branches {legacy_branches * 1000:7.2f} -> {tree_branches * 1000:6.2f} ms')
+
+
+if __name__ == '__main__':
+    for no_of_notes in (1_000, 100_000):
+        benchmark(f'deep ({no_of_notes} notes, depth 6)', generateDeepNotes(no_of_notes, 6))
+        benchmark(f'deep ({no_of_notes} notes, depth 50)', generateDeepNotes(no_of_notes, 50))
+        benchmark(f'wide ({no_of_notes} notes)', generateWideNotes(no_of_notes))
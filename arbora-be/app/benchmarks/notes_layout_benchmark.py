@@ -0,0 +1,142 @@
+"""
+Compares the two layouts the notes of a document can be stored in, inside the document or as items of the notes collection, as
+documents grow: the latency of an edit that changes a single note and of a review of a single note, and the bson sent to the
+database for each.
+
+The bytes are worked out offline, the latencies need a mongodb, set BENCHMARK_MONGODB_URL to point them at one, a throwaway
+database is created on it and dropped after.
+
+Run from the app directory with the source roots on the path:
+
+$ PYTHONPATH=.:utils:models:routers python benchmarks/notes_layout_benchmark.py
+"""
+import asyncio
+import os
+import random
+import statistics
+import time
+
+import bson
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+from index_utils import createIndexes
+from model_utils import getCurrentTimestamp
+from mongo_utils import appendNoteItemReviewsUpdate, appendNoteReviewsUpdate
+from note import NoteReview
+from note_review_utils import HALF_LIFE, createRecallState
+from note_storage_utils import appendNoteReviews, findDocument, insertDocument, updateDocumentNoteItems
+
+BENCHMARK_MONGODB_URL = os.environ.get('BENCHMARK_MONGODB_URL', 'mongodb://localhost:27017')
+NO_OF_OPERATIONS = 50
+
+
+def generateDocument(notes_per_document: int, reviews_per_note: int) -> dict:
+    rng = random.Random(0)
+    now = getCurrentTimestamp()
+    notes = {}
+    for i in range(notes_per_document):
+        reviews = [NoteReview(review_type=rng.choice(list(HALF_LIFE)), score=rng.random(), timestamp=now).model_dump()
+                   for _ in range(reviews_per_note)]
+        notes[str(i + 1)] = {'title': f'note {i + 1}', 'content': 'content ' * 50, 'level': 1, 'children': [], 'edits': [],
+                             'created_at': now, 'reviews': reviews,
+                             'recall_state': createRecallState([NoteReview(**review) for review in reviews]).model_dump()}
+    return {'creator_id': 'user', 'title': 'document', 'content': 'content ' * 50 * notes_per_document, 'notes': notes, 'version': 1}
+
+
+def editNote(notes: dict, note_id: str) -> dict:
+    return {**notes, note_id: {**notes[note_id], 'content': notes[note_id]['content'] + 'edited '}}
+
+
+def generateReview() -> dict:
+    return NoteReview(review_type=list(HALF_LIFE)[0], score=0.5, timestamp=getCurrentTimestamp()).model_dump()
+
+
+def measureBytes(document: dict) -> None:
+    # the bson of the update of each layout, the edit of the embedded notes sends all of them
+    notes = editNote(document['notes'], '1')
+    embedded_edit = len(bson.encode({'u': {'$set': {'notes': notes}}}))
+    in_collection_edit = len(bson.encode({'u': {'$set': {'content': notes['1']['content']}}}))
+    embedded_review = len(bson.encode({'u': appendNoteReviewsUpdate({'1': [generateReview()]})}))
+    in_collection_review = len(bson.encode({'u': appendNoteItemReviewsUpdate([generateReview()])}))
+    print(f'    bytes sent | edit {embedded_edit:>9,} -> {in_collection_edit:>6,} | review {embedded_review:>6,} -> {in_collection_review:>6,}')
+
+
+async def timeOperations(operation) -> float:
+    # the median latency in milliseconds
+    latencies = []
+    for i in range(NO_OF_OPERATIONS):
+        start = time.perf_counter()
+        await operation(i)
+        latencies.append(time.perf_counter() - start)
+    return statistics.median(latencies) * 1000
+
+
+async def measureLatencies(mongodb, document: dict, notes_in_collection: bool) -> tuple[float, float]:
+    stored_document = {**document, 'notes': dict(document['notes'])}
+    await insertDocument(mongodb, stored_document, notes_in_collection)
+    document_id = stored_document['_id']
+    note_ids = list(document['notes'])
+
+    async def edit(i: int) -> None:
+        # the document is read and written back with one of its notes changed, the way update_document does
+        current_document = await findDocument(mongodb, {'_id': document_id})
+        notes = editNote(current_document['notes'], note_ids[i % len(note_ids)])
+        if notes_in_collection:
+            await mongodb['documents'].update_one({'_id': document_id}, {'$inc': {'version': 1}})
+            await updateDocumentNoteItems(mongodb, current_document, notes)
+        else:
+            await mongodb['documents'].update_one({'_id': document_id}, {'$set': {'notes': notes}, '$inc': {'version': 1}})
+
+    async def review(i: int) -> None:
+        await appendNoteReviews(mongodb, document_id, 'user', note_ids[i % len(note_ids)], [generateReview()], getCurrentTimestamp(),
+                                notes_in_collection)
+
+    return await timeOperations(edit), await timeOperations(review)
+
+
+async def benchmark(mongodb, notes_per_document: int, reviews_per_note: int) -> None:
+    document = generateDocument(notes_per_document, reviews_per_note)
+    print(f'{notes_per_document:>4} notes x {reviews_per_note} reviews, {len(bson.encode(document)) / 2 ** 10:8.1f} KiB')
+    measureBytes(document)
+    embedded_edit, embedded_review = await measureLatencies(mongodb, document, False)
+    in_collection_edit, in_collection_review = await measureLatencies(mongodb, document, True)
+    print(f'    latency    | edit {embedded_edit:7.2f} ms -> {in_collection_edit:5.2f} ms | '
+          f'review {embedded_review:5.2f} ms -> {in_collection_review:5.2f} ms')
+
+
+def isMongoAvailable() -> bool:
+    client = MongoClient(BENCHMARK_MONGODB_URL, serverSelectionTimeoutMS=1000)
+    try:
+        client.admin.command('ping')
+        return True
+    except PyMongoError:
+        return False
+    finally:
+        client.close()
+
+
+async def main() -> None:
+    client = AsyncIOMotorClient(BENCHMARK_MONGODB_URL)
+    database_name = 'arbora_benchmark_' + str(ObjectId())
+    mongodb = client[database_name]
+    await createIndexes(mongodb)
+    try:
+        for notes_per_document in (10, 100, 500):
+            await benchmark(mongodb, notes_per_document, 10)
+    finally:
+        await client.drop_database(database_name)
+        client.close()
+
+
+if __name__ == '__main__':
+    if isMongoAvailable():
+        asyncio.run(main())
+    else:
+        # without a database only the bytes can be compared
+        print(f'no mongodb at {BENCHMARK_MONGODB_URL}, only the bytes sent are measured')
+        for no_of_notes in (10, 100, 500):
+            print(f'{no_of_notes:>4} notes x 10 reviews')
+            measureBytes(generateDocument(no_of_notes, 10))
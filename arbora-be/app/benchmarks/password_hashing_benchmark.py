@@ -0,0 +1,100 @@
+"""
+Measures the latency of a request that doesn't touch passwords while a storm of logins is checking them: with bcrypt run
+on the event loop, the way login used to, and on the password hashing threads, with the logins beyond its queue turned away.
+
+The app only has the two endpoints, called in process through an asgi transport, so the latencies are those of the event loop
+alone. The hashes are made at a lower cost than the api's, so the benchmark runs in seconds, the blocking scales with it.
+
+Run from the app directory with the source roots on the path:
+
+$ PYTHONPATH=.:utils:models:routers python benchmarks/password_hashing_benchmark.py
+"""
+import asyncio
+import os
+import statistics
+import time
+
+# the settings are read on import, the benchmark doesn't need real ones
+for name, value in {'JWT_SECRET_KEY': 'benchmark-secret', 'JWT_ALGORITHM': 'HS256', 'MONGODB_URL': 'mongodb://localhost:27017',
+                    'DB_NAME': 'arbora', 'GOOGLE_AI_API_KEY': 'benchmark-key'}.items():
+    os.environ.setdefault(name, value)
+
+import bcrypt
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from starlette import status
+from starlette.responses import Response
+
+from config import settings
+from executor_utils import BoundedExecutor, ExecutorBusyError
+
+BENCHMARK_COST = 11
+PASSWORD = 'password'
+PASSWORD_HASH = bcrypt.hashpw(PASSWORD.encode('utf-8'), bcrypt.gensalt(BENCHMARK_COST))
+
+NO_OF_LOGINS = 64
+PING_INTERVAL = 0.005
+
+
+def checkPassword() -> bool:
+    return bcrypt.checkpw(PASSWORD.encode('utf-8'), PASSWORD_HASH)
+
+
+def createApp(executor: BoundedExecutor) -> FastAPI:
+    app = FastAPI()
+
+    @app.post('/blocking-login')
+    async def blocking_login():
+        checkPassword()
+        return Response(status_code=status.HTTP_200_OK)
+
+    @app.post('/login')
+    async def login():
+        try:
+            await executor.run(checkPassword)
+        except ExecutorBusyError:
+            return Response(status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response(status_code=status.HTTP_200_OK)
+
+    @app.get('/ping')
+    async def ping():
+        return Response(status_code=status.HTTP_200_OK)
+
+    return app
+
+
+async def pingUntil(client: AsyncClient, is_done: asyncio.Event) -> list[float]:
+    # the latency of a ping is counted from when it was due, so the time the event loop was too blocked to send it counts too
+    latencies = []
+    while not is_done.is_set():
+        due = time.perf_counter() + PING_INTERVAL
+        await asyncio.sleep(PING_INTERVAL)
+        await client.get('/ping')
+        latencies.append(time.perf_counter() - due)
+    return latencies
+
+
+async def storm(login_path: str) -> None:
+    executor = BoundedExecutor(settings.PASSWORD_HASHING_WORKERS, settings.PASSWORD_HASHING_QUEUE_SIZE, settings.PASSWORD_HASHING_QUEUE_TIMEOUT)
+    async with AsyncClient(transport=ASGITransport(app=createApp(executor)), base_url='http://benchmark') as client:
+        is_done = asyncio.Event()
+        pings = asyncio.ensure_future(pingUntil(client, is_done))
+        await asyncio.sleep(0.05)
+        start = time.perf_counter()
+        responses = await asyncio.gather(*[client.post(login_path) for _ in range(NO_OF_LOGINS)])
+        duration = time.perf_counter() - start
+        is_done.set()
+        latencies = sorted(await pings)
+    executor.shutdown()
+
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    no_of_rejected = sum(response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE for response in responses)
+    print(f'{login_path:<15} | {NO_OF_LOGINS} logins in {duration:5.2f}s, {no_of_rejected:>2} turned away | '
+          f'{len(latencies):>4} pings, p50 {statistics.median(latencies) * 1000:7.1f} ms, p99 {p99 * 1000:7.1f} ms, '
+          f'max {latencies[-1] * 1000:7.1f} ms')
+
+
+if __name__ == '__main__':
+    print(f'bcrypt cost {BENCHMARK_COST}, {settings.PASSWORD_HASHING_WORKERS} workers, a queue of {settings.PASSWORD_HASHING_QUEUE_SIZE}')
+    asyncio.run(storm('/blocking-login'))
+    asyncio.run(storm('/login'))
@@ -0,0 +1,121 @@
+"""
+Compares the batched NumPy recall computation of list-documents against the previous per-note recursion, and reading the
+recall of a single note from its recall state against replaying its whole review history.
+
+Run from the app directory with the source roots on the path:
+
+$ PYTHONPATH=.:utils:models:routers python benchmarks/recall_benchmark.py
+"""
+import copy
+import random
+import time
+import timeit
+from datetime import datetime, timedelta
+
+from pydantic import BaseModel
+
+from note import NoteReview, RecallState
+from utils.note_review_utils import DEPTH_DECAY, HALF_LIFE, createRecallState, evaluateRecallState, getNoteRecallState, \
+    updateAllNotesRecallProbabilities
+
+
+class LegacyNoteReview(BaseModel):
+    # reviews as they were read before timestamps were stored as epoch milliseconds
+    review_type: str
+    score: float
+    timestamp: str
+
+
+def legacyCalculateRecallProbability(note_reviews: list[LegacyNoteReview]) -> float:
+    # the recall computation list-documents did per note before the batched one and the recall state, kept as the baseline
+    recall = 0
+    now_timestamp = datetime.now().timestamp()
+    note_reviews.sort(key=lambda x: datetime.fromisoformat(x.timestamp).timestamp())
+    for review in note_reviews:
+        review_recall = (0.5 ** (((now_timestamp - datetime.fromisoformat(note_reviews[0].timestamp).timestamp()) / (60 * 60 * 24)) /
+                                 HALF_LIFE[review.review_type]) * review.score)
+        recall += (1 - recall) * review_recall
+    return recall
+
+
+def legacyUpdateNotesRecallProbabilities(notes: dict) -> None:
+    root_note_ids = [key for key in notes.keys() if '.' not in key]
+
+    def updateRecallProbabilities(note_id: str, parent_recall: float) -> None:
+        note = notes[note_id]
+        note['recall_probability'] = legacyCalculateRecallProbability([LegacyNoteReview(**review) for review in (note['reviews'] if note['reviews'] else [])])
+        note['recall_probability'] += (parent_recall * DEPTH_DECAY) * (1 - note['recall_probability'])
+        for child_id in note['children']:
+            updateRecallProbabilities(child_id, note['recall_probability'])
+
+    for root_note_id in root_note_ids:
+        updateRecallProbabilities(root_note_id, 0)
+
+
+def generateDocumentNotes(rng: random.Random, no_of_notes: int, no_of_reviews: int) -> dict:
+    # a tree of root notes with up to 3 levels of children, and reviews spread over the last 90 days, with their recall state
+    now = datetime.now()
+    notes = {}
+    root_count = 0
+    while len(notes) < no_of_notes:
+        root_count += 1
+        stack = [(str(root_count), 1)]
+        while stack and len(notes) < no_of_notes:
+            coords, level = stack.pop()
+            children = [f'{coords}.{i + 1}' for i in range(rng.randint(1, 4))] if level < 3 else []
+            notes[coords] = {'title': coords, 'content': '', 'level': level, 'children': [], 'edits': [], 'reviews': [],
+                             'created_at': now.isoformat(), 'recall_probability': 0}
+            if coords.count('.'):
+                notes[coords.rsplit('.', 1)[0]]['children'].append(coords)
+            stack.extend((child, level + 1) for child in reversed(children))
+    note_ids = list(notes.keys())
+    for _ in range(no_of_reviews):
+        notes[rng.choice(note_ids)]['reviews'].append({
+            'review_type': rng.choice(list(HALF_LIFE)), 'score': rng.random(),
+            'timestamp': (now - timedelta(seconds=rng.random() * 90 * 24 * 60 * 60)).isoformat()
+        })
+    for note in notes.values():
+        note['recall_state'] = createRecallState([NoteReview(**review) for review in note['reviews']]).model_dump()
+    return notes
+
+
+def benchmark(no_of_documents: int, notes_per_document: int, reviews_per_document: int) -> None:
+    rng = random.Random(0)
+    notes_list = [generateDocumentNotes(rng, notes_per_document, reviews_per_document) for _ in range(no_of_documents)]
+    legacy_notes_list = copy.deepcopy(notes_list)
+
+    start = time.perf_counter()
+    for notes in legacy_notes_list:
+        legacyUpdateNotesRecallProbabilities(notes)
+    legacy = time.perf_counter() - start
+
+    start = time.perf_counter()
+    updateAllNotesRecallProbabilities(notes_list)
+    batched = time.perf_counter() - start
+
+    print(f'{no_of_documents:>4} documents x {notes_per_document:>3} notes x {reviews_per_document:>4} reviews | '
+          f'legacy {legacy * 1000:9.1f} ms | batched {batched * 1000:8.1f} ms ({legacy / batched:5.1f}x)')
+
+
+def benchmarkNoteRead(no_of_reviews: int) -> None:
+    rng = random.Random(0)
+    now = datetime.now()
+    reviews = [{'review_type': rng.choice(list(HALF_LIFE)), 'score': rng.random(),
+                'timestamp': (now - timedelta(seconds=rng.random() * 90 * 24 * 60 * 60)).isoformat()} for _ in range(no_of_reviews)]
+    note = {'reviews': reviews, 'recall_state': createRecallState([NoteReview(**review) for review in reviews]).model_dump()}
+    repeats = max(1, 100_000 // no_of_reviews)
+
+    legacy = min(timeit.repeat(lambda: legacyCalculateRecallProbability([LegacyNoteReview(**review) for review in note['reviews']]),
+                               number=repeats, repeat=3)) / repeats
+    from_state = min(timeit.repeat(lambda: evaluateRecallState(RecallState(**getNoteRecallState(note))), number=repeats * 10, repeat=3)) / (repeats * 10)
+
+    print(f'{no_of_reviews:>7} reviews per note | replay {legacy * 1e6:12.1f} us | recall state {from_state * 1e6:6.1f} us '
+          f'({legacy / from_state:8.1f}x)')
+
+
+if __name__ == '__main__':
+    benchmark(10, 50, 100)
+    benchmark(100, 100, 500)
+    benchmark(300, 100, 1000)
+    for reviews_per_note in (10, 1_000, 100_000):
+        benchmarkNoteRead(reviews_per_note)
@@ -0,0 +1,72 @@
+"""
+Compares serializing a large list-documents response the way the routers did, dumping it to a dict and encoding that with the
+standard json module in a JSONResponse, against ModelResponse serializing the model straight to json bytes: the time and the
+peak memory each takes.
+
+Run from the app directory with the source roots on the path:
+
+$ PYTHONPATH=.:utils:models:routers python benchmarks/response_benchmark.py
+"""
+import random
+import timeit
+import tracemalloc
+
+from bson import ObjectId
+from starlette.responses import JSONResponse
+
+from models.document import Document
+from note import NoteReview
+from routers import GenericResponse
+from utils.model_utils import getCurrentTimestamp
+from utils.note_review_utils import HALF_LIFE, createRecallState
+from utils.response_utils import ModelResponse
+
+
+class ListDocumentsResponse(GenericResponse):
+    documents: list[Document]
+
+
+def generateResponse(no_of_documents: int, notes_per_document: int, reviews_per_note: int) -> ListDocumentsResponse:
+    rng = random.Random(0)
+    now = getCurrentTimestamp()
+    documents = []
+    for _ in range(no_of_documents):
+        notes = {}
+        for i in range(notes_per_document):
+            reviews = [NoteReview(review_type=rng.choice(list(HALF_LIFE)), score=rng.random(), timestamp=now) for _ in range(reviews_per_note)]
+            notes[str(i + 1)] = {'title': f'Heading {i + 1}', 'content': 'content ' * 50, 'level': 1, 'children': [], 'created_at': now,
+                                 'reviews': reviews, 'recall_state': createRecallState(reviews), 'recall_probability': rng.random()}
+        documents.append({'_id': ObjectId(), 'creator_id': 'user', 'title': 'Document', 'content': 'content ' * 1000, 'notes': notes,
+                          'updated_at': now})
+    return ListDocumentsResponse(documents=documents, is_successful=True, message="Documents retrieved successfully")
+
+
+def peakMemory(serialize) -> int:
+    tracemalloc.start()
+    serialize()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def benchmark(no_of_documents: int, notes_per_document: int, reviews_per_note: int) -> None:
+    response = generateResponse(no_of_documents, notes_per_document, reviews_per_note)
+
+    def legacy():
+        return JSONResponse(content=response.model_dump(mode='json'), status_code=200).body
+
+    def current():
+        return ModelResponse(response, status_code=200).body
+
+    repeats = 5
+    legacy_time = min(timeit.repeat(legacy, number=repeats, repeat=3)) / repeats
+    current_time = min(timeit.repeat(current, number=repeats, repeat=3)) / repeats
+    print(f'{no_of_documents:>4} documents x {notes_per_document} notes x {reviews_per_note} reviews ({len(current()) / 2 ** 20:5.1f} MiB) | '
+          f'dict + json {legacy_time * 1000:7.1f} ms, {peakMemory(legacy) / 2 ** 20:6.1f} MiB | '
+          f'model json {current_time * 1000:6.1f} ms, {peakMemory(current) / 2 ** 20:5.1f} MiB ({legacy_time / current_time:4.1f}x)')
+
+
+if __name__ == '__main__':
+    benchmark(10, 50, 10)
+    benchmark(100, 50, 20)
+    benchmark(300, 100, 20)
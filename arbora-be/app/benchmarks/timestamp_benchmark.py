@@ -0,0 +1,189 @@
+"""
+Compares the cost of timestamps stored as iso strings against bson datetimes on the paths that read them: list-documents,
+working out the recall of notes without a recall state from their reviews and building the response, record-note-review,
+creating the review and the recall state it is merged into the note with, and the replay of the reviews of a note that
+worked out its recall before notes kept a recall state, which parsed every timestamp to sort the reviews and again to decay
+them.
+
+Storing datetimes saves the parsing on the replay alone, which is about 1.4x faster. On list-documents and
+record-note-review the parsing is a small part of the work, pydantic validates a datetime about as fast as a string and
+serializing it back to an iso string costs more, so they are no faster, and list-documents of a few documents is slower,
+about 0.7x, 1.0x and 0.8x where this was measured.
+
+Run from the app directory with the source roots on the path:
+
+$ PYTHONPATH=.:utils:models:routers python benchmarks/timestamp_benchmark.py
+"""
+import copy
+import random
+import time
+import timeit
+from datetime import datetime, timedelta
+
+from pydantic import BaseModel
+
+from models.document import Document
+from note import NoteReview
+from utils.model_utils import getCurrentTimestamp, toEpochSeconds
+from utils.note_review_utils import HALF_LIFE, _decay, createRecallState, updateAllNotesRecallProbabilities
+
+
+class LegacyNoteReview(BaseModel):
+    # the models as they were before timestamps were stored as datetimes
+    review_type: str
+    score: float
+    timestamp: str
+
+
+class LegacyNote(BaseModel):
+    created_at: str
+    edits: list[dict] = []
+    reviews: list[LegacyNoteReview] = []
+    content: str = ''
+    title: str
+    level: int
+    children: list[str] = []
+    recall_probability: float = 0
+    recall_state: dict = None
+    content_hash: str = ''
+    title_hash: str = ''
+
+
+class LegacyDocument(BaseModel):
+    creator_id: str
+    title: str
+    notes: dict[str, LegacyNote]
+    content: str
+    content_hash: str = ''
+
+
+def legacyCreateRecallState(note_reviews: list[LegacyNoteReview]) -> dict:
+    # createRecallState parsing the iso strings, as it did before
+    review_timestamps = [datetime.fromisoformat(review.timestamp).timestamp() for review in note_reviews]
+    reference_timestamp = max(review_timestamps, default=0)
+    accumulators = {}
+    for review, review_timestamp in zip(note_reviews, review_timestamps):
+        accumulators[review.review_type] = (accumulators.get(review.review_type, 0) +
+                                            review.score * _decay(review.review_type, reference_timestamp - review_timestamp))
+    return {'version': 2, 'reference_timestamp': reference_timestamp, 'accumulators': accumulators}
+
+
+def legacyListDocuments(documents: list[dict]) -> list[dict]:
+    # the recall states of the notes worked out from their reviews, as notes saved before recall states are, then the response
+    for document in documents:
+        for note in document['notes'].values():
+            note['recall_state'] = legacyCreateRecallState([LegacyNoteReview(**review) for review in note['reviews']])
+    updateAllNotesRecallProbabilities([document['notes'] for document in documents])
+    return [LegacyDocument(**document).model_dump() for document in documents]
+
+
+def listDocuments(documents: list[dict]) -> list[dict]:
+    for document in documents:
+        for note in document['notes'].values():
+            note['recall_state'] = None
+    updateAllNotesRecallProbabilities([document['notes'] for document in documents])
+    return [Document(**document).model_dump(mode='json') for document in documents]
+
+
+def generateDocuments(rng: random.Random, no_of_documents: int, notes_per_document: int, reviews_per_note: int) -> list[dict]:
+    # flat documents of notes with reviews spread over the last 90 days, with iso string timestamps
+    now = datetime.now()
+    documents = []
+    for _ in range(no_of_documents):
+        notes = {}
+        for i in range(notes_per_document):
+            notes[str(i + 1)] = {
+                'title': str(i + 1), 'content': '', 'level': 1, 'children': [], 'edits': [], 'created_at': now.isoformat(),
+                'recall_probability': 0,
+                'reviews': [{'review_type': rng.choice(list(HALF_LIFE)), 'score': rng.random(),
+                             'timestamp': (now - timedelta(seconds=rng.random() * 90 * 24 * 60 * 60)).isoformat()}
+                            for _ in range(reviews_per_note)],
+            }
+        documents.append({'creator_id': 'user', 'title': 'document', 'content': '', 'notes': notes})
+    return documents
+
+
+def convertDocuments(documents: list[dict]) -> list[dict]:
+    # the documents as the migration leaves them, and as mongo gives them back
+    return [Document(**document).model_dump(by_alias=True, exclude={'id'}) for document in documents]
+
+
+def timeOnCopies(function, documents: list[dict], repeats: int = 3) -> float:
+    # the fastest of a few runs, each on its own copy of the documents as the notes are updated in place
+    copies = [copy.deepcopy(documents) for _ in range(repeats)]
+    timings = []
+    for documents_copy in copies:
+        start = time.perf_counter()
+        function(documents_copy)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def benchmarkListDocuments(no_of_documents: int, notes_per_document: int, reviews_per_note: int) -> None:
+    legacy_documents = generateDocuments(random.Random(0), no_of_documents, notes_per_document, reviews_per_note)
+    documents = convertDocuments(legacy_documents)
+
+    legacy = timeOnCopies(legacyListDocuments, legacy_documents)
+    current = timeOnCopies(listDocuments, documents)
+
+    print(f'list-documents {no_of_documents:>4} documents x {notes_per_document:>3} notes x {reviews_per_note:>3} reviews | '
+          f'iso {legacy * 1000:8.1f} ms | datetime {current * 1000:8.1f} ms ({legacy / current:4.1f}x)')
+
+
+def benchmarkRecordNoteReview(no_of_reviews: int) -> None:
+    # the review as it is created, stored and merged into the recall state of the note
+    def legacyRecord() -> None:
+        review = LegacyNoteReview(review_type='chat', score=1, timestamp=datetime.now().isoformat())
+        legacyCreateRecallState([LegacyNoteReview(**review.model_dump())])
+
+    def record() -> None:
+        review = NoteReview(review_type='chat', score=1, timestamp=getCurrentTimestamp())
+        createRecallState([NoteReview(**review.model_dump())])
+
+    legacy = min(timeit.repeat(legacyRecord, number=no_of_reviews, repeat=3)) / no_of_reviews
+    current = min(timeit.repeat(record, number=no_of_reviews, repeat=3)) / no_of_reviews
+    print(f'record-note-review | iso {legacy * 1e6:6.1f} us | datetime {current * 1e6:6.1f} us ({legacy / current:4.1f}x)')
+
+
+def legacyReplayReviews(note_reviews: list[dict], now_timestamp: float) -> float:
+    # the recall of a note worked out from its reviews as it was, parsing the iso strings to sort them and to decay them
+    recall = 0
+    note_reviews.sort(key=lambda review: datetime.fromisoformat(review['timestamp']).timestamp())
+    for review in note_reviews:
+        review_recall = 0.5 ** ((now_timestamp - datetime.fromisoformat(review['timestamp']).timestamp()) / (60 * 60 * 24)
+                                / HALF_LIFE[review['review_type']]) * review['score']
+        recall += (1 - recall) * review_recall
+    return recall
+
+
+def replayReviews(note_reviews: list[dict], now_timestamp: float) -> float:
+    # the same with the datetimes as mongo gives them back, sorted as they are
+    recall = 0
+    note_reviews.sort(key=lambda review: review['timestamp'])
+    for review in note_reviews:
+        review_recall = 0.5 ** ((now_timestamp - toEpochSeconds(review['timestamp'])) / (60 * 60 * 24)
+                                / HALF_LIFE[review['review_type']]) * review['score']
+        recall += (1 - recall) * review_recall
+    return recall
+
+
+def benchmarkReplayReviews(no_of_notes: int, reviews_per_note: int) -> None:
+    legacy_documents = generateDocuments(random.Random(0), 1, no_of_notes, reviews_per_note)
+    documents = convertDocuments(legacy_documents)
+    now_timestamp = datetime.now().timestamp()
+
+    def replayAll(replay):
+        return lambda documents_copy: [replay(note['reviews'], now_timestamp) for note in documents_copy[0]['notes'].values()]
+
+    legacy = timeOnCopies(replayAll(legacyReplayReviews), legacy_documents)
+    current = timeOnCopies(replayAll(replayReviews), documents)
+    print(f'review replay {no_of_notes:>5} notes x {reviews_per_note:>3} reviews | '
+          f'iso {legacy * 1000:8.1f} ms | datetime {current * 1000:8.1f} ms ({legacy / current:4.1f}x)')
+
+
+if __name__ == '__main__':
+    benchmarkListDocuments(10, 50, 10)
+    benchmarkListDocuments(100, 100, 20)
+    benchmarkRecordNoteReview(20_000)
+    benchmarkReplayReviews(1000, 20)
+    benchmarkReplayReviews(1000, 100)
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from dotenv import load_dotenv
 from pydantic_settings import BaseSettings
 
@@ -10,6 +12,22 @@ class Settings(BaseSettings):
     MONGODB_URL: str
     DB_NAME: str
     GOOGLE_AI_API_KEY: str
+    # adds debugging information to the responses, like the mongo operations each request made
+    DEBUG: bool = False
+    # saves the notes of new documents as items of the notes collection instead of inside the documents, so edits and reviews
+    # only write the notes they change. see migrations/normalize_notes.py to move the notes of saved documents
+    NOTES_IN_COLLECTION: bool = False
+    # passwords are hashed and checked on a pool of threads, a login or signup waits for one at most the timeout, in seconds,
+    # behind at most the queue size of others, and is turned away with a 503 otherwise
+    PASSWORD_HASHING_WORKERS: int = 4
+    PASSWORD_HASHING_QUEUE_SIZE: int = 32
+    PASSWORD_HASHING_QUEUE_TIMEOUT: float = 10
+    # the bcrypt cost passwords are hashed at, or, if a target time in milliseconds is set, the cost a hash takes that long at
+    # on the machine, worked out on startup
+    PASSWORD_HASH_COST: int = 14
+    PASSWORD_HASH_TARGET_MILLISECONDS: Optional[float] = None
+    # the most calls to gemini a worker makes at once
+    GEMINI_MAX_CONCURRENT_CALLS: int = 16
 
     class Config:
         env_file = "./../.env"
@@ -6,14 +6,32 @@ $ pip install google-generativeai
 See the getting started guide for more information:
 https://ai.google.dev/gemini-api/docs/get-started/python
 """
+import asyncio
 import enum
 import os
+import weakref
 
 import google.generativeai as genai
 from config import settings
 
 genai.configure(api_key=settings.GOOGLE_AI_API_KEY)
 
+# the semaphores that cap the model calls waiting on gemini at once, one per event loop, a semaphore can only be waited on in
+# the loop it was first used in
+MODEL_CALL_SEMAPHORES: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def getModelCallSemaphore() -> asyncio.Semaphore:
+    """
+    Returns the semaphore of the running event loop that caps the model calls it has waiting on gemini at once, created on
+    its first call, the calls beyond wait for one of them to finish.
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = MODEL_CALL_SEMAPHORES.get(loop)
+    if semaphore is None:
+        semaphore = MODEL_CALL_SEMAPHORES[loop] = asyncio.Semaphore(settings.GEMINI_MAX_CONCURRENT_CALLS)
+    return semaphore
+
 
 class OutputType(enum.Enum):
     JSON = "application/json"
@@ -36,3 +54,16 @@ def getModel(system_instruction: str, model_name: str = "gemini-1.5-flash", outp
         # safety_settings = Adjust safety settings
         # See https://ai.google.dev/gemini-api/docs/safety-settings
     )
+
+
+async def generateContent(model: genai.GenerativeModel, model_input: str):
+    """
+    Generates the response of a model to an input without blocking the event loop, a call takes seconds and every other
+    request would wait on it otherwise.
+
+    :param model: The model, from getModel
+    :param model_input: The prompt
+    :return: The response of the model
+    """
+    async with getModelCallSemaphore():
+        return await model.generate_content_async(model_input)
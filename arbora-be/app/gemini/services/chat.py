@@ -1,4 +1,6 @@
-from gemini import getModel, OutputType
+import asyncio
+
+from gemini import generateContent, getModel, OutputType
 from chat import ChatResponse
 import json
 
@@ -38,14 +40,14 @@ chat_model = getModel(
 )
 
 
-def explainContentToAI(content: str, previous_conversation: list[str], countdown: int, curiosity: int) -> ChatResponse:
+async def explainContentToAI(content: str, previous_conversation: list[str], countdown: int, curiosity: int) -> ChatResponse:
     model_input = {
         "content": content,
         "conversation": previous_conversation,
         "countdown": countdown,
         "curiosity": curiosity
     }
-    model_output = chat_model.generate_content(json.dumps(model_input))
+    model_output = await generateContent(chat_model, json.dumps(model_input))
     response_json = json.loads(model_output.text)
 
     return ChatResponse(
@@ -65,7 +67,7 @@ if __name__ == '__main__':
     curiosity = 1  # Example: medium curiosity level
 
     while True:
-        ai_response = explainContentToAI(content, conversation, countdown, curiosity)
+        ai_response = asyncio.run(explainContentToAI(content, conversation, countdown, curiosity))
         print("Arby:", ai_response.message)
         conversation.append(f"ai: {ai_response.message}")
 
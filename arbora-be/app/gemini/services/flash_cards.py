@@ -1,5 +1,8 @@
-from gemini import getModel, OutputType
+import asyncio
+
+from gemini import generateContent, getModel, OutputType
 from flash_card import FlashCard
+from generation_cache_utils import generateGenerationCacheKey, getCachedGeneration
 from string_utils import generateRandomId
 import json
 
@@ -91,34 +94,43 @@ SYSTEM_INSTRUCTION: str = '''
      Here are a few example pairs of prompts and answers:
     ''' + '\n'.join([f'INPUT: {ex["input"]}\nOUTPUT: {ex["output"]}\n' for ex in INPUT_OUTPUT_EXAMPLES])
 
+# the name generated flash cards are cached under, and the version of the prompt, changed with it
+SERVICE_NAME = "flash_cards"
+PROMPT_VERSION = 1
+
 flash_cards_model = getModel(
     system_instruction=SYSTEM_INSTRUCTION,
     output_type=OutputType.JSON
 )
 
 
-def generateFlashCards(no_of_flash_cards: int, content: str) -> list[FlashCard]:
-    flash_cards = []
+async def generateFlashCardItems(no_of_flash_cards: int, content: str) -> list[dict]:
     model_input = {
         "no_of_flash_cards": no_of_flash_cards,
         "content": content
     }
-    model_output = flash_cards_model.generate_content(str(model_input))
-    flash_cards_json = json.loads(model_output.text)
-    for flash_card_json in flash_cards_json:
-        flash_card = FlashCard(
-            id=generateRandomId(5),
-            prompt=flash_card_json["prompt"],
-            answer=flash_card_json["answer"]
-        )
-        flash_cards.append(flash_card)
+    model_output = await generateContent(flash_cards_model, str(model_input))
+    return [{"prompt": flash_card_json["prompt"], "answer": flash_card_json["answer"]} for flash_card_json in json.loads(model_output.text)]
+
+
+async def generateFlashCards(no_of_flash_cards: int, content: str, mongodb=None, bypass_cache: bool = False) -> list[FlashCard]:
+    """
+    Generates flash cards from content, or reuses the ones generated from the same content before.
 
-    return flash_cards
+    :param no_of_flash_cards: The number of flash cards
+    :param content: The content to generate them from
+    :param mongodb: The database to keep them in, None to only keep them in the process
+    :param bypass_cache: Whether to generate new ones even if some were generated before
+    """
+    cache_key = generateGenerationCacheKey(SERVICE_NAME, flash_cards_model.model_name, PROMPT_VERSION, content, no_of_flash_cards)
+    flash_card_items = await getCachedGeneration(mongodb, SERVICE_NAME, cache_key,
+                                                 lambda: generateFlashCardItems(no_of_flash_cards, content), bypass_cache)
+    return [FlashCard(id=generateRandomId(5), **flash_card_item) for flash_card_item in flash_card_items]
 
 
 if __name__ == '__main__':
-    cards = generateFlashCards(
+    cards = asyncio.run(generateFlashCards(
         5,
         '''Superman was born on the fictional planet Krypton with the birth name of Kal-El. As a baby, his parents sent him to Earth in a small spaceship 
         shortly before Krypton was destroyed in a natural cataclysm. His ship landed in the American countryside near the fictional town of Smallville, Kansas. He was found and adopted by farmers Jonathan and Martha Kent, who named him Clark Kent. Clark began developing superhuman abilities, such as incredible strength and impervious skin. His adoptive parents advised him to use his powers to benefit of humanity, and he decided to fight crime as a vigilante. To protect his personal life, he changes into a colorful costume and uses the alias "Superman" when fighting crime. Clark resides in the fictional American city of Metropolis, where he works as a journalist for the Daily Planet. Superman's supporting characters include his love interest and fellow journalist Lois Lane, Daily Planet photographer Jimmy Olsen, and editor-in-chief Perry White, and his enemies include Brainiac, General Zod, and archenemy Lex Luthor.'''
-    )
+    ))
@@ -1,4 +1,6 @@
-from gemini import getModel, OutputType
+import asyncio
+
+from gemini import generateContent, getModel, OutputType
 import json
 
 from question import OpenEndedQuestionAssessment, OpenEndedQuestionAnswer
@@ -54,13 +56,13 @@ grading_model = getModel(
 )
 
 
-def gradeOpenEndedQuestions(content: str, answers: list[OpenEndedQuestionAnswer]) -> list[OpenEndedQuestionAssessment]:
+async def gradeOpenEndedQuestions(content: str, answers: list[OpenEndedQuestionAnswer]) -> list[OpenEndedQuestionAssessment]:
     graded_answers = []
     model_input = {
         "content": content,
         "answers": answers
     }
-    model_output = grading_model.generate_content(str(model_input))
+    model_output = await generateContent(grading_model, str(model_input))
     grades_json = json.loads(model_output.text)
 
     for grade_json in grades_json:
@@ -93,7 +95,7 @@ if __name__ == '__main__':
 
     answers = [OpenEndedQuestionAnswer(**answer) for answer in answers]
 
-    graded_answers = gradeOpenEndedQuestions(content, answers)
+    graded_answers = asyncio.run(gradeOpenEndedQuestions(content, answers))
     for answer in graded_answers:
         print(f"Answer ID: {answer.id}")
         print(f"Grade: {answer.grade}")
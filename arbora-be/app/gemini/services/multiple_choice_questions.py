@@ -1,4 +1,7 @@
-from gemini import getModel, OutputType
+import asyncio
+
+from gemini import generateContent, getModel, OutputType
+from generation_cache_utils import generateGenerationCacheKey, getCachedGeneration
 from question import MultipleChoiceQuestion
 from string_utils import generateRandomId
 import json
@@ -43,42 +46,60 @@ SYSTEM_INSTRUCTION: str = '''
     Here's an example of the input and output format:
 ''' + '\n'.join([f'INPUT: {ex["input"]}\nOUTPUT: {ex["output"]}\n' for ex in INPUT_OUTPUT_EXAMPLES])
 
+# the name generated questions are cached under, and the version of the prompt, changed with it
+SERVICE_NAME = "multiple_choice_questions"
+PROMPT_VERSION = 1
+
 mcq_model = getModel(
     system_instruction=SYSTEM_INSTRUCTION,
     output_type=OutputType.JSON
 )
 
 
-def generateMultipleChoiceQuestions(no_of_questions: int, content: str) -> list[MultipleChoiceQuestion]:
-    multiple_choice_questions = []
+async def generateMultipleChoiceQuestionItems(no_of_questions: int, content: str) -> list[dict]:
     model_input = {
         "no_of_questions": no_of_questions,
         "content": content
     }
-    model_output = mcq_model.generate_content(str(model_input))
-    questions_json = json.loads(model_output.text)
+    model_output = await generateContent(mcq_model, str(model_input))
+    return [{"question": question_json["question"], "answer": question_json["answer"], "wrong_answers": question_json["wrong_answers"]}
+            for question_json in json.loads(model_output.text)]
+
+
+def createMultipleChoiceQuestion(question_item: dict) -> MultipleChoiceQuestion:
+    # the choices are shuffled for every question created, so questions reused from the cache don't always have the same order
+    choices = [question_item["answer"]] + question_item["wrong_answers"]
+    random.shuffle(choices)
+    return MultipleChoiceQuestion(
+        id=generateRandomId(5),
+        question=question_item["question"],
+        choices=choices,
+        correct_choice=choices.index(question_item["answer"])
+    )
 
-    for question_json in questions_json:
-        choices = [question_json["answer"]] + question_json["wrong_answers"]
-        random.shuffle(choices)
-        correct_choice = choices.index(question_json["answer"])
 
-        mcq = MultipleChoiceQuestion(
-            id=generateRandomId(5),
-            question=question_json["question"],
-            choices=choices,
-            correct_choice=correct_choice
-        )
-        multiple_choice_questions.append(mcq)
+async def generateMultipleChoiceQuestions(no_of_questions: int, content: str, mongodb=None, bypass_cache: bool = False) \
+        -> list[MultipleChoiceQuestion]:
+    """
+    Generates multiple choice questions from content, or reuses the ones generated from the same content before, with their
+    choices shuffled again.
 
-    return multiple_choice_questions
+    :param no_of_questions: The number of questions
+    :param content: The content to generate them from
+    :param mongodb: The database to keep them in, None to only keep them in the process
+    :param bypass_cache: Whether to generate new ones even if some were generated before
+    """
+    cache_key = generateGenerationCacheKey(SERVICE_NAME, mcq_model.model_name, PROMPT_VERSION, content, no_of_questions)
+    question_items = await getCachedGeneration(mongodb, SERVICE_NAME, cache_key,
+                                               lambda: generateMultipleChoiceQuestionItems(no_of_questions, content), bypass_cache)
+    return [createMultipleChoiceQuestion(question_item) for question_item in question_items]
 
 
 if __name__ == '__main__':
-    questions = generateMultipleChoiceQuestions(
+    questions = asyncio.run(generateMultipleChoiceQuestions(
         3,
         "The Python programming language was created by Guido van Rossum and first released in 1991. Python is known for its simplicity and readability, emphasizing code readability with its notable use of significant whitespace. It supports multiple programming paradigms, including structured, object-oriented, and functional programming. Python is often described as a 'batteries included' language due to its comprehensive standard library."
-    )
+    ))
     for q in questions:
         print(f"Question: {q.question}")
         for i, choice in enumerate(q.choices):
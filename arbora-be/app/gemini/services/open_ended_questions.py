@@ -1,4 +1,7 @@
-from gemini import getModel, OutputType
+import asyncio
+
+from gemini import generateContent, getModel, OutputType
+from generation_cache_utils import generateGenerationCacheKey, getCachedGeneration
 from question import OpenEndedQuestion
 from string_utils import generateRandomId
 import json
@@ -31,36 +34,45 @@ SYSTEM_INSTRUCTION: str = '''
     Here's an example of the input and output format:
 ''' + '\n'.join([f'INPUT: {ex["input"]}\nOUTPUT: {ex["output"]}\n' for ex in INPUT_OUTPUT_EXAMPLES])
 
+# the name generated questions are cached under, and the version of the prompt, changed with it
+SERVICE_NAME = "open_ended_questions"
+PROMPT_VERSION = 1
+
 open_ended_model = getModel(
     system_instruction=SYSTEM_INSTRUCTION,
     output_type=OutputType.JSON
 )
 
 
-def generateOpenEndedQuestions(no_of_questions: int, content: str) -> list[OpenEndedQuestion]:
-    open_ended_questions = []
+async def generateOpenEndedQuestionItems(no_of_questions: int, content: str) -> list[dict]:
     model_input = {
         "no_of_questions": no_of_questions,
         "content": content
     }
-    model_output = open_ended_model.generate_content(str(model_input))
-    questions_json = json.loads(model_output.text)
+    model_output = await generateContent(open_ended_model, str(model_input))
+    return [{"question": question_json["question"]} for question_json in json.loads(model_output.text)]
+
 
-    for question_json in questions_json:
-        open_ended_question = OpenEndedQuestion(
-            id=generateRandomId(5),
-            question=question_json["question"]
-        )
-        open_ended_questions.append(open_ended_question)
+async def generateOpenEndedQuestions(no_of_questions: int, content: str, mongodb=None, bypass_cache: bool = False) -> list[OpenEndedQuestion]:
+    """
+    Generates open ended questions from content, or reuses the ones generated from the same content before.
 
-    return open_ended_questions
+    :param no_of_questions: The number of questions
+    :param content: The content to generate them from
+    :param mongodb: The database to keep them in, None to only keep them in the process
+    :param bypass_cache: Whether to generate new ones even if some were generated before
+    """
+    cache_key = generateGenerationCacheKey(SERVICE_NAME, open_ended_model.model_name, PROMPT_VERSION, content, no_of_questions)
+    question_items = await getCachedGeneration(mongodb, SERVICE_NAME, cache_key,
+                                               lambda: generateOpenEndedQuestionItems(no_of_questions, content), bypass_cache)
+    return [OpenEndedQuestion(id=generateRandomId(5), **question_item) for question_item in question_items]
 
 
 if __name__ == '__main__':
-    questions = generateOpenEndedQuestions(
+    questions = asyncio.run(generateOpenEndedQuestions(
         3,
         "Climate change is the long-term alteration of temperature and typical weather patterns in a place. Climate change could refer to a particular location or the planet as a whole. Climate change may cause weather patterns to be less predictable. These unexpected weather patterns can make it difficult to maintain and grow crops in regions that rely on farming because expected temperature and rainfall levels can no longer be relied on. Climate change has also been connected with other damaging weather events such as more frequent and more intense hurricanes, floods, downpours, and winter storms."
-    )
+    ))
     for q in questions:
         print(f"Question ID: {q.id}")
         print(f"Question: {q.question}\n")
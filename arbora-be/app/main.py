@@ -7,16 +7,27 @@ from config import settings
 from routers.document import document_router
 from routers.auth import auth_router
 from routers.user import user_router
+from index_utils import createIndexes
+from mongo_stats_utils import MONGO_DURATION_HEADER, MONGO_OPERATIONS_HEADER, MongoStatsListener, MongoStatsMiddleware
+from utils.auth_utils import PASSWORD_HASHING_EXECUTOR, calibratePasswordHashCost, setPasswordHashCost
 from fastapi.middleware.cors import CORSMiddleware
 
 
 async def lifespan(app: FastAPI):
     # startup
-    app.mongodb_client = AsyncIOMotorClient(settings.MONGODB_URL)
+    # in debug the mongo operations of every request are counted
+    app.mongodb_client = AsyncIOMotorClient(settings.MONGODB_URL, event_listeners=[MongoStatsListener()] if settings.DEBUG else [])
     app.mongodb = app.mongodb_client[settings.DB_NAME]
+    await createIndexes(app.mongodb)
+    # passwords are hashed at the cost configured, or the one that takes the target time on this machine
+    if settings.PASSWORD_HASH_TARGET_MILLISECONDS is not None:
+        setPasswordHashCost(await PASSWORD_HASHING_EXECUTOR.run(calibratePasswordHashCost, settings.PASSWORD_HASH_TARGET_MILLISECONDS))
+    else:
+        setPasswordHashCost(settings.PASSWORD_HASH_COST)
 
     yield
     app.mongodb_client.close()
+    PASSWORD_HASHING_EXECUTOR.shutdown()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -27,8 +38,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", MONGO_OPERATIONS_HEADER, MONGO_DURATION_HEADER],
 )
 
+if settings.DEBUG:
+    app.add_middleware(MongoStatsMiddleware)
+
 app.include_router(auth_router)
 app.include_router(user_router)
 app.include_router(document_router)
@@ -0,0 +1,31 @@
+"""
+Builds the note schedule entries, the next due timestamps of the study queue, of every document created before it was added.
+
+Documents that already have their entries are rebuilt as well, so it is safe to run again.
+
+Run from the app directory with the source roots on the path:
+
+$ PYTHONPATH=.:utils:models:routers python migrations/backfill_note_schedule.py
+"""
+import asyncio
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from config import settings
+from study_queue_utils import createNoteScheduleIndexes, updateNoteSchedule
+
+
+async def main() -> None:
+    client = AsyncIOMotorClient(settings.MONGODB_URL)
+    mongodb = client[settings.DB_NAME]
+    await createNoteScheduleIndexes(mongodb)
+    no_of_documents = 0
+    async for document in mongodb["documents"].find({}, {"creator_id": 1, "version": 1, "notes": 1}):
+        await updateNoteSchedule(mongodb, document)
+        no_of_documents += 1
+    client.close()
+    print(f"built the note schedule of {no_of_documents} documents")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,101 @@
+"""
+Backfills the recall state of every note saved before notes kept one, or with a recall state of an older formula version.
+
+The state is worked out from the note's reviews and written back only if no review was added to the document in between,
+documents that got a review while being migrated are read and migrated again. The notes of documents stored in the notes
+collection are backfilled the same way, item by item.
+
+Run from the app directory with the source roots on the path:
+
+$ PYTHONPATH=.:utils:models:routers python migrations/backfill_recall_state.py [--dry-run]
+"""
+import sys
+
+from pymongo import MongoClient
+
+from config import settings
+from mongo_utils import NOTES_COLLECTION, noteFieldExpression, setNoteFieldsUpdate
+from note import NoteReview
+from note_review_utils import RECALL_FORMULA_VERSION, createRecallState
+
+# times a document is read again when reviews keep being added to it while it is migrated
+MAX_ATTEMPTS = 5
+
+
+def findStaleNotes(document: dict) -> dict[str, dict]:
+    return {note_id: note for note_id, note in document["notes"].items()
+            if (note.get("recall_state") or {}).get("version") != RECALL_FORMULA_VERSION}
+
+
+def backfillDocument(documents_collection, document: dict, dry_run: bool) -> int:
+    """
+    Backfills the recall state of the stale notes of a document, returns how many notes were backfilled.
+    """
+    for _ in range(MAX_ATTEMPTS):
+        stale_notes = findStaleNotes(document)
+        if not stale_notes or dry_run:
+            return len(stale_notes)
+
+        recall_states = {note_id: {"recall_state": createRecallState([NoteReview(**review) for review in note.get("reviews") or []]).model_dump()}
+                         for note_id, note in stale_notes.items()}
+        # the states are only written if every note still has the reviews they were worked out from
+        unchanged_reviews = {"$expr": {"$and": [
+            {"$eq": [{"$size": {"$ifNull": [{"$getField": {"field": "reviews", "input": noteFieldExpression(note_id)}}, []]}},
+                     len(note.get("reviews") or [])]}
+            for note_id, note in stale_notes.items()
+        ]}}
+        result = documents_collection.update_one({"_id": document["_id"], **unchanged_reviews}, setNoteFieldsUpdate(recall_states))
+        if result.matched_count == 1:
+            return len(stale_notes)
+
+        document = documents_collection.find_one({"_id": document["_id"]}, {"notes": 1})
+        if document is None:
+            return 0
+    raise RuntimeError(f"document {document['_id']} kept changing while it was migrated")
+
+
+def backfillNoteItem(notes_collection, note_item: dict, dry_run: bool) -> bool:
+    """
+    Backfills the recall state of an item of the notes collection, returns whether it was backfilled.
+    """
+    for _ in range(MAX_ATTEMPTS):
+        if dry_run:
+            return True
+        reviews = note_item.get("reviews") or []
+        recall_state = createRecallState([NoteReview(**review) for review in reviews]).model_dump()
+        # the state is only written if the item still has the reviews it was worked out from
+        result = notes_collection.update_one({"_id": note_item["_id"], "$expr": {"$eq": [{"$size": {"$ifNull": ["$reviews", []]}}, len(reviews)]}},
+                                             {"$set": {"recall_state": recall_state}})
+        if result.matched_count == 1:
+            return True
+
+        note_item = notes_collection.find_one({"_id": note_item["_id"]}, {"reviews": 1})
+        if note_item is None:
+            return False
+    raise RuntimeError(f"note {note_item['_id']} kept changing while it was migrated")
+
+
+def main(dry_run: bool) -> None:
+    client = MongoClient(settings.MONGODB_URL)
+    documents_collection = client[settings.DB_NAME]["documents"]
+    notes_collection = client[settings.DB_NAME][NOTES_COLLECTION]
+    no_of_documents = 0
+    no_of_notes = 0
+    for document in documents_collection.find({}, {"notes": 1}):
+        backfilled_notes = backfillDocument(documents_collection, document, dry_run)
+        if backfilled_notes:
+            no_of_documents += 1
+            no_of_notes += backfilled_notes
+    # the notes of documents stored in the notes collection
+    backfilled_document_ids = set()
+    for note_item in notes_collection.find({"recall_state.version": {"$ne": RECALL_FORMULA_VERSION}}, {"document_id": 1, "reviews": 1}):
+        if backfillNoteItem(notes_collection, note_item, dry_run):
+            backfilled_document_ids.add(note_item["document_id"])
+            no_of_notes += 1
+    no_of_documents += len(backfilled_document_ids)
+    client.close()
+    print(f"{'would backfill' if dry_run else 'backfilled'} {no_of_notes} notes in {no_of_documents} documents")
+
+
+if __name__ == '__main__':
+    main(dry_run='--dry-run' in sys.argv[1:])
@@ -0,0 +1,107 @@
+"""
+Converts the iso string timestamps of everything saved before timestamps were stored as bson datetimes: the creation, edits
+and reviews of every note, the creation of every folder and the dates of every user.
+
+Documents are written back only if their notes didn't change in between, documents that got a review or an edit while
+being migrated are read and migrated again. The api reads both formats, so it can keep running while this does.
+
+Run from the app directory with the source roots on the path:
+
+$ PYTHONPATH=.:utils:models:routers python migrations/convert_timestamps.py [--dry-run]
+"""
+import sys
+
+from pymongo import MongoClient
+
+from config import settings
+from model_utils import parseLegacyTimestamp, parseOptionalLegacyTimestamp
+
+# times a document is read again when it keeps changing while it is migrated
+MAX_ATTEMPTS = 5
+
+# the timestamp fields of the folders and users, the unset dates of users, empty strings, become null
+FOLDER_TIMESTAMP_FIELDS = ["created_at"]
+USER_TIMESTAMP_FIELDS = ["created_at", "updated_at", "deleted_at"]
+
+
+def isConverted(value) -> bool:
+    return not isinstance(value, str)
+
+
+def convertTimestamp(value):
+    return parseLegacyTimestamp(value) if isinstance(value, str) else value
+
+
+def convertNoteTimestamps(note: dict) -> dict:
+    """
+    Returns the note with its timestamps, and the ones of its edits and reviews, as datetimes.
+    """
+    return {
+        **note,
+        "created_at": convertTimestamp(note["created_at"]),
+        "edits": [{**edit, "timestamp": convertTimestamp(edit["timestamp"])} for edit in note.get("edits") or []],
+        "reviews": [{**review, "timestamp": convertTimestamp(review["timestamp"])} for review in note.get("reviews") or []],
+    }
+
+
+def hasStaleNotes(document: dict) -> bool:
+    return any(not isConverted(note.get("created_at")) or
+               any(not isConverted(item["timestamp"]) for item in (note.get("edits") or []) + (note.get("reviews") or []))
+               for note in document["notes"].values())
+
+
+def convertDocument(documents_collection, document: dict, dry_run: bool) -> bool:
+    """
+    Converts the timestamps of the notes of a document, returns whether it had any to convert.
+    """
+    for _ in range(MAX_ATTEMPTS):
+        if not hasStaleNotes(document):
+            return False
+        if dry_run:
+            return True
+
+        notes = {note_id: convertNoteTimestamps(note) for note_id, note in document["notes"].items()}
+        # the notes are only written if they are still the ones they were converted from
+        result = documents_collection.update_one({"_id": document["_id"], "notes": document["notes"]}, {"$set": {"notes": notes}})
+        if result.matched_count == 1:
+            return True
+
+        document = documents_collection.find_one({"_id": document["_id"]}, {"notes": 1})
+        if document is None:
+            return False
+    raise RuntimeError(f"document {document['_id']} kept changing while it was migrated")
+
+
+def convertFields(collection, fields: list[str], dry_run: bool) -> int:
+    """
+    Converts the given timestamp fields of every item of a collection that has them as strings, returns how many were converted.
+    """
+    no_of_items = 0
+    stale_filter = {"$or": [{field: {"$type": "string"}} for field in fields]}
+    for item in collection.find(stale_filter, {field: 1 for field in fields}):
+        stale_fields = {field: item[field] for field in fields if isinstance(item.get(field), str)}
+        no_of_items += 1
+        if dry_run:
+            continue
+        # a date that was changed in between keeps its new value
+        collection.update_one({"_id": item["_id"], **stale_fields},
+                              {"$set": {field: parseOptionalLegacyTimestamp(value) for field, value in stale_fields.items()}})
+    return no_of_items
+
+
+def main(dry_run: bool) -> None:
+    client = MongoClient(settings.MONGODB_URL)
+    database = client[settings.DB_NAME]
+    no_of_documents = 0
+    for document in database["documents"].find({}, {"notes": 1}):
+        if convertDocument(database["documents"], document, dry_run):
+            no_of_documents += 1
+    no_of_folders = convertFields(database["folders"], FOLDER_TIMESTAMP_FIELDS, dry_run)
+    no_of_users = convertFields(database["users"], USER_TIMESTAMP_FIELDS, dry_run)
+    client.close()
+    print(f"{'would convert' if dry_run else 'converted'} the timestamps of {no_of_documents} documents, {no_of_folders} folders "
+          f"and {no_of_users} users")
+
+
+if __name__ == '__main__':
+    main(dry_run='--dry-run' in sys.argv[1:])
@@ -0,0 +1,104 @@
+"""
+Moves the notes of every document saved with its notes inside it into the notes collection, or back into the documents with
+--embed, the layout new documents are saved in is set by NOTES_IN_COLLECTION.
+
+The note items of a document are written first, and the document is only switched over if its version didn't change in
+between, documents that got a review or an edit while being migrated are read and migrated again. The api reads both layouts,
+so it can keep running while this does.
+
+Run from the app directory with the source roots on the path:
+
+$ PYTHONPATH=.:utils:models:routers python migrations/normalize_notes.py [--embed] [--dry-run]
+"""
+import sys
+
+from pymongo import MongoClient, ReplaceOne
+
+from config import settings
+from mongo_utils import NOTES_COLLECTION, NOTES_IN_COLLECTION_FIELD, noteItemProjection
+from note_storage_utils import toNoteItems
+from note_tree_utils import coordsSortKey
+
+# times a document is read again when it keeps changing while it is migrated
+MAX_ATTEMPTS = 5
+
+
+def versionFilter(document: dict) -> dict:
+    # documents saved before they were versioned have no version, and keep none until they are changed
+    return {"_id": document["_id"], "version": document.get("version")}
+
+
+def moveNotesToCollection(database, document: dict, dry_run: bool) -> bool:
+    """
+    Moves the notes of a document into the notes collection, returns whether it had its notes inside it.
+    """
+    document_id = document["_id"]
+    for _ in range(MAX_ATTEMPTS):
+        if document.get(NOTES_IN_COLLECTION_FIELD) is True:
+            return False
+        if dry_run:
+            return True
+
+        note_items = toNoteItems(document_id, document["creator_id"], document["notes"])
+        # items left by an earlier attempt are replaced, and the ones of notes removed since are deleted
+        database[NOTES_COLLECTION].delete_many({"document_id": document_id, "note_id": {"$nin": list(document["notes"])}})
+        if note_items:
+            database[NOTES_COLLECTION].bulk_write([ReplaceOne({"document_id": document_id, "note_id": note_item["note_id"]}, note_item,
+                                                              upsert=True) for note_item in note_items], ordered=False)
+        result = database["documents"].update_one(versionFilter(document), {"$set": {"notes": {}, NOTES_IN_COLLECTION_FIELD: True}})
+        if result.matched_count == 1:
+            return True
+
+        document = database["documents"].find_one({"_id": document_id}, {"creator_id": 1, "version": 1, "notes": 1, NOTES_IN_COLLECTION_FIELD: 1})
+        if document is None:
+            database[NOTES_COLLECTION].delete_many({"document_id": document_id})
+            return False
+    raise RuntimeError(f"document {document_id} kept changing while it was migrated")
+
+
+def embedNotes(database, document: dict, dry_run: bool) -> bool:
+    """
+    Moves the notes of a document in the notes collection back into it, returns whether they were in the notes collection.
+    """
+    document_id = document["_id"]
+    for _ in range(MAX_ATTEMPTS):
+        if document.get(NOTES_IN_COLLECTION_FIELD) is not True:
+            return False
+        if dry_run:
+            return True
+
+        # the items come back in index order, the notes are put back in the order they are in the document
+        note_items = sorted(database[NOTES_COLLECTION].find({"document_id": document_id}, noteItemProjection()),
+                            key=lambda note_item: coordsSortKey(note_item["note_id"]))
+        notes = {note_item.pop("note_id"): note_item for note_item in note_items}
+        result = database["documents"].update_one(versionFilter(document), {"$set": {"notes": notes}, "$unset": {NOTES_IN_COLLECTION_FIELD: ""}})
+        if result.matched_count == 1:
+            database[NOTES_COLLECTION].delete_many({"document_id": document_id})
+            return True
+
+        document = database["documents"].find_one({"_id": document_id}, {"version": 1, NOTES_IN_COLLECTION_FIELD: 1})
+        if document is None:
+            return False
+    raise RuntimeError(f"document {document_id} kept changing while it was migrated")
+
+
+def main(embed: bool, dry_run: bool) -> None:
+    client = MongoClient(settings.MONGODB_URL)
+    database = client[settings.DB_NAME]
+    no_of_documents = 0
+    if embed:
+        for document in database["documents"].find({NOTES_IN_COLLECTION_FIELD: True}, {"version": 1, NOTES_IN_COLLECTION_FIELD: 1}):
+            if embedNotes(database, document, dry_run):
+                no_of_documents += 1
+    else:
+        for document in database["documents"].find({NOTES_IN_COLLECTION_FIELD: {"$ne": True}},
+                                                   {"creator_id": 1, "version": 1, "notes": 1, NOTES_IN_COLLECTION_FIELD: 1}):
+            if moveNotesToCollection(database, document, dry_run):
+                no_of_documents += 1
+    client.close()
+    print(f"{'would move' if dry_run else 'moved'} the notes of {no_of_documents} documents "
+          f"{'back into the documents' if embed else 'into the notes collection'}")
+
+
+if __name__ == '__main__':
+    main(embed='--embed' in sys.argv[1:], dry_run='--dry-run' in sys.argv[1:])
@@ -1,8 +1,8 @@
 import enum
 from typing import Optional
 
-from model_utils import PyObjectId
-from note import Note
+from model_utils import PyObjectId, Timestamp
+from note import Note, NoteSummary
 
 from pydantic import BaseModel, Field
 import uuid
@@ -15,6 +15,24 @@ class Document(BaseModel):
     title: str
     notes: dict[str, Note]
     content: str
+    content_hash: str = ''
+    # the last change to the document, its notes' reviews and folder included, None for documents saved before it was kept
+    updated_at: Optional[Timestamp] = None
+    # incremented by every change to the document, its notes' reviews included, 0 for documents saved before it was kept
+    version: int = 0
+
+    model_config = {
+        "populate_by_field_name": True,
+    }
+
+
+class DocumentSummary(BaseModel):
+    id: PyObjectId = Field(alias="_id")
+    folder_id: Optional[str] = None
+    title: str
+    updated_at: Timestamp
+    version: int = 0
+    notes: dict[str, NoteSummary]
 
     model_config = {
         "populate_by_field_name": True,
@@ -32,7 +50,9 @@ class Folder(BaseModel):
     id: Optional[PyObjectId] = Field(alias="_id", default=None)
     creator_id: str
     name: str
-    created_at: str
+    created_at: Timestamp
+    # None for folders saved before it was kept
+    updated_at: Optional[Timestamp] = None
 
     model_config = {
         "populate_by_field_name": True,
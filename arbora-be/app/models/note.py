@@ -1,22 +1,34 @@
 import enum
+from typing import Optional
 
 from pydantic import BaseModel
 
+from model_utils import Timestamp
+
 
 class NoteEdit(BaseModel):
     added: int
     deleted: int
-    timestamp: str
+    timestamp: Timestamp
+    # how added and deleted were counted, see diff_utils.EDIT_COUNT_VERSION, edits saved before it was added are version 1
+    version: int = 1
 
 
 class NoteReview(BaseModel):
     review_type: str
     score: float
-    timestamp: str
+    timestamp: Timestamp
+
+
+class RecallState(BaseModel):
+    # the scores of a note's reviews of each type, decayed to reference_timestamp, see note_review_utils
+    version: int = 2
+    reference_timestamp: float = 0
+    accumulators: dict[str, float] = {}
 
 
 class Note(BaseModel):
-    created_at: str
+    created_at: Timestamp
     edits: list[NoteEdit] = []
     reviews: list[NoteReview] = []
     content: str = ''
@@ -24,3 +36,15 @@ class Note(BaseModel):
     level: int
     children: list[str] = []
     recall_probability: float = 0
+    # None for notes saved before it was added, until they are backfilled by migrations/backfill_recall_state.py
+    recall_state: Optional[RecallState] = None
+    # fingerprints of the title and content, empty for notes saved before they were added
+    content_hash: str = ''
+    title_hash: str = ''
+
+
+class NoteSummary(BaseModel):
+    title: str
+    level: int
+    children: list[str] = []
+    recall_probability: float = 0
@@ -3,7 +3,7 @@ from typing import Optional
 
 from pydantic import BaseModel, Field, EmailStr
 
-from model_utils import PyObjectId
+from model_utils import OptionalTimestamp, PyObjectId, Timestamp
 
 
 class User(BaseModel):
@@ -13,9 +13,9 @@ class User(BaseModel):
     password_hash: str
     is_active: bool
     is_verified: bool
-    created_at: str
-    updated_at: str
-    deleted_at: str
+    created_at: Timestamp
+    updated_at: OptionalTimestamp = None
+    deleted_at: OptionalTimestamp = None
 
     class Config:
         populate_by_field_name = True
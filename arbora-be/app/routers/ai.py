@@ -1,11 +1,11 @@
 from fastapi import APIRouter, Depends, Request
 from starlette import status
 from pydantic import BaseModel
-from starlette.responses import JSONResponse
 
 from auth_bearer import JWTBearer
 from chat import ChatResponse
 from flash_card import FlashCard
+from generation_cache_utils import getGenerationCacheStats
 from gemini.services.flash_cards import generateFlashCards
 from gemini.services.multiple_choice_questions import generateMultipleChoiceQuestions
 from gemini.services.open_ended_questions import generateOpenEndedQuestions
@@ -13,6 +13,7 @@ from gemini.services.chat import explainContentToAI
 from gemini.services.grade_open_ended_questions import gradeOpenEndedQuestions
 
 from question import MultipleChoiceQuestion, OpenEndedQuestion, OpenEndedQuestionAssessment, OpenEndedQuestionAnswer
+from response_utils import ModelResponse
 from routers import GenericResponse
 
 ai_router = APIRouter(prefix='/ai', dependencies=[Depends(JWTBearer())])
@@ -21,6 +22,8 @@ ai_router = APIRouter(prefix='/ai', dependencies=[Depends(JWTBearer())])
 class GetFlashCardsRequest(BaseModel):
     no_of_flash_cards: int
     content: str
+    # generates new ones even if some were generated from the same content before
+    bypass_cache: bool = False
 
 
 class GetFlashCardsResponse(GenericResponse):
@@ -32,26 +35,28 @@ async def get_flash_cards(request: Request, params: GetFlashCardsRequest):
     # if the number of cards are more than 25, return an error
     if params.no_of_flash_cards > 25:
         response = GetFlashCardsResponse(is_successful=False, message="Number of flash-cards cannot be more than 25", questions=[])
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_400_BAD_REQUEST)
+        return ModelResponse(response, status_code=status.HTTP_400_BAD_REQUEST)
 
     # if there is no content, throw an error
     if not len(params.content):
         response = GetFlashCardsResponse(is_successful=False, message="There is no content to create cards from", flash_cards=[])
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_400_BAD_REQUEST)
+        return ModelResponse(response, status_code=status.HTTP_400_BAD_REQUEST)
 
     try:
-        flash_cards = generateFlashCards(params.no_of_flash_cards, params.content)
+        flash_cards = await generateFlashCards(params.no_of_flash_cards, params.content, request.app.mongodb, params.bypass_cache)
     except Exception as e:
         response = GetFlashCardsResponse(is_successful=False, message="Internal error getting flash cards " + str(e), flash_cards=[])
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return ModelResponse(response, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
     response = GetFlashCardsResponse(is_successful=True, message="Flash cards generated successfully", flash_cards=flash_cards)
-    return JSONResponse(content=response.dict(), status_code=status.HTTP_200_OK)
+    return ModelResponse(response, status_code=status.HTTP_200_OK)
 
 
 class GetMultipleChoiceQuestionsRequest(BaseModel):
     no_of_questions: int
     content: str
+    # generates new ones even if some were generated from the same content before
+    bypass_cache: bool = False
 
 
 class GetMultipleChoiceQuestionsResponse(GenericResponse):
@@ -64,27 +69,30 @@ async def get_multiple_choice_questions(request: Request, params: GetMultipleCho
     # if the number of questions are more than 25, return an error
     if params.no_of_questions > 25:
         response = GetMultipleChoiceQuestionsResponse(is_successful=False, message="Number of questions cannot be more than 25", questions=[])
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_400_BAD_REQUEST)
+        return ModelResponse(response, status_code=status.HTTP_400_BAD_REQUEST)
 
     # if there is no content, throw an error
     if not len(params.content):
         response = GetMultipleChoiceQuestionsResponse(is_successful=False, message="There is no content to create questions from", questions=[])
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_400_BAD_REQUEST)
+        return ModelResponse(response, status_code=status.HTTP_400_BAD_REQUEST)
 
     try:
-        mc_questions = generateMultipleChoiceQuestions(params.no_of_questions, params.content)
+        mc_questions = await generateMultipleChoiceQuestions(params.no_of_questions, params.content, request.app.mongodb,
+                                                             params.bypass_cache)
     except Exception as e:
         response = GetMultipleChoiceQuestionsResponse(is_successful=False, message="Internal server error generating multiple choice questions," + str(e),
                                                       questions=[])
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return ModelResponse(response, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
     response = GetMultipleChoiceQuestionsResponse(is_successful=True, message="Multiple choice questions generated successfully", questions=mc_questions)
-    return JSONResponse(content=response.dict(), status_code=status.HTTP_200_OK)
+    return ModelResponse(response, status_code=status.HTTP_200_OK)
 
 
 class GetOpenEndedQuestionsRequest(BaseModel):
     no_of_questions: int
     content: str
+    # generates new ones even if some were generated from the same content before
+    bypass_cache: bool = False
 
 
 class GetOpenEndedQuestionsResponse(GenericResponse):
@@ -97,21 +105,21 @@ async def get_open_ended_questions(request: Request, params: GetOpenEndedQuestio
     # if the number of questions are more than 25, return an error
     if params.no_of_questions > 25:
         response = GetOpenEndedQuestionsResponse(is_successful=False, message="Number of questions cannot be more than 25", questions=[])
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_400_BAD_REQUEST)
+        return ModelResponse(response, status_code=status.HTTP_400_BAD_REQUEST)
 
     # if there is no content, throw an error
     if not len(params.content):
         response = GetOpenEndedQuestionsResponse(is_successful=False, message="There is no content to create questions from", questions=[])
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_400_BAD_REQUEST)
+        return ModelResponse(response, status_code=status.HTTP_400_BAD_REQUEST)
 
     try:
-        oe_questions = generateOpenEndedQuestions(params.no_of_questions, params.content)
+        oe_questions = await generateOpenEndedQuestions(params.no_of_questions, params.content, request.app.mongodb, params.bypass_cache)
     except Exception as e:
         response = GetOpenEndedQuestionsResponse(is_successful=False, message='Internal server error ' + str(e), questions=[])
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return ModelResponse(response, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
     response = GetOpenEndedQuestionsResponse(is_successful=True, message="Open ended questions generated successfully", questions=oe_questions)
-    return JSONResponse(content=response.dict(), status_code=status.HTTP_200_OK)
+    return ModelResponse(response, status_code=status.HTTP_200_OK)
 
 
 class GradeOpenEndedQuestionsRequest(BaseModel):
@@ -130,18 +138,18 @@ async def grade_open_ended_questions(request: Request, params: GradeOpenEndedQue
     # check that the number of questions match the number of answers
     if len(params.questions) != len(params.answers):
         response = GradeOpenEndedQuestionsResponse(is_successful=False, message="Number of questions and answers do not match", grading=[])
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_400_BAD_REQUEST)
+        return ModelResponse(response, status_code=status.HTTP_400_BAD_REQUEST)
 
     try:
-        grading = gradeOpenEndedQuestions(params.content,
-                                          [OpenEndedQuestionAnswer(id=q.id, question=q.question, answer=a) for q, a in zip(params.questions,
-                                                                                                                           params.answers)])
+        grading = await gradeOpenEndedQuestions(params.content,
+                                                [OpenEndedQuestionAnswer(id=q.id, question=q.question, answer=a) for q, a in zip(params.questions,
+                                                                                                                                 params.answers)])
     except Exception as e:
         response = GradeOpenEndedQuestionsResponse(is_successful=False, message=str(e), grading=[])
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return ModelResponse(response, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
     response = GradeOpenEndedQuestionsResponse(is_successful=True, message="Open ended questions graded successfully", grading=grading)
-    return JSONResponse(content=response.dict(), status_code=status.HTTP_200_OK)
+    return ModelResponse(response, status_code=status.HTTP_200_OK)
 
 
 class ChatWithArbyRequest(BaseModel):
@@ -160,10 +168,23 @@ class ChatWithArbyResponse(GenericResponse):
 @ai_router.post("/chat-with-arby", description="chat with the AI", response_model=GenericResponse)
 async def chat_with_arby(request: Request, params: ChatWithArbyRequest):
     try:
-        response = explainContentToAI(params.content, params.conversation, params.limit, params.curiosity)
+        response = await explainContentToAI(params.content, params.conversation, params.limit, params.curiosity)
     except Exception as e:
         response = ChatWithArbyResponse(is_successful=False, message="Internal error in Chat with Arby : " + str(e), response=ChatResponse())
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return ModelResponse(response, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
     response = ChatWithArbyResponse(is_successful=True, message="Chat with Arby successful", response=response)
-    return JSONResponse(content=response.dict(), status_code=status.HTTP_200_OK)
+    return ModelResponse(response, status_code=status.HTTP_200_OK)
+
+
+class GetGenerationCacheStatsResponse(GenericResponse):
+    # the number of lookups of every service by their outcome, a memory_hit, in_flight_hit, mongo_hit, miss or bypass
+    stats: dict[str, dict[str, int]]
+
+
+@ai_router.get("/generation-cache-stats", description="get how the lookups of generated flash cards and questions went since the process started",
+               response_model=GetGenerationCacheStatsResponse)
+async def get_generation_cache_stats(request: Request):
+    response = GetGenerationCacheStatsResponse(is_successful=True, message="Generation cache stats retrieved successfully",
+                                               stats=getGenerationCacheStats())
+    return ModelResponse(response, status_code=status.HTTP_200_OK)
@@ -1,11 +1,13 @@
+from bson import ObjectId
 from fastapi import APIRouter, Request, Depends
 
 from auth_bearer import JWTBearer
+from executor_utils import ExecutorBusyError
+from response_utils import ModelResponse
 from user import User
-from utils.auth_utils import hashPassword, generateJWTToken, verifyPassword, JWTPayload, validateJWTToken, decodeJWTToken
+from utils.auth_utils import PASSWORD_HASHING_RETRY_AFTER, generateJWTToken, hashPassword, needsRehash, verifyJWTToken, verifyPassword
 from pydantic import BaseModel, EmailStr
 from starlette import status
-from starlette.responses import JSONResponse
 
 auth_router = APIRouter()
 
@@ -28,18 +30,34 @@ async def login(request: Request, login_params: LoginRequest):
     user = await request.app.mongodb["users"].find_one({"email": login_params.email})
     if user is None:
         response = LoginResponse(message="User does not exist", is_successful=False)
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_404_NOT_FOUND)
+        return ModelResponse(response, status_code=status.HTTP_404_NOT_FOUND)
 
     user = User(**user)
 
-    # check if the password is correct
-    if verifyPassword(login_params.password, user.password_hash) is False:
+    # check if the password is correct, a login storm is turned away rather than queued for longer than the queue timeout
+    try:
+        is_password_correct = await verifyPassword(login_params.password, user.password_hash)
+    except ExecutorBusyError:
+        response = LoginResponse(message="Too many logins at the moment, try again in a few seconds", is_successful=False)
+        return ModelResponse(response, status_code=status.HTTP_503_SERVICE_UNAVAILABLE, headers={"Retry-After": str(PASSWORD_HASHING_RETRY_AFTER)})
+    if not is_password_correct:
         response = LoginResponse(message="Incorrect password", is_successful=False)
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_400_BAD_REQUEST)
+        return ModelResponse(response, status_code=status.HTTP_400_BAD_REQUEST)
+
+    # a password hashed at another cost than the current one is hashed again now that it is known, so the cost can be changed
+    # without resetting passwords. it is only replaced if it wasn't changed in between
+    if needsRehash(user.password_hash):
+        try:
+            password_hash = await hashPassword(login_params.password)
+            await request.app.mongodb["users"].update_one({"_id": ObjectId(user.id), "password_hash": user.password_hash},
+                                                          {"$set": {"password_hash": password_hash}})
+        except ExecutorBusyError:
+            # it is hashed again on a later login instead
+            pass
 
     response = LoginResponse(is_successful=True, message="Login successful!", access_token=generateJWTToken(user.id),
                              refresh_token=generateJWTToken(user.id, seconds_to_expiry=3600 * 24))
-    return JSONResponse(content=response.dict(), status_code=status.HTTP_200_OK)
+    return ModelResponse(response, status_code=status.HTTP_200_OK)
 
 
 class RefreshTokenRequest(BaseModel):
@@ -55,10 +73,10 @@ class RefreshTokenResponse(BaseModel):
 @auth_router.post("/refresh-token", description="refresh the access token", response_model=LoginResponse, status_code=status.HTTP_200_OK)
 async def refresh_token(refresh_token_params: RefreshTokenRequest):
     # check if the refresh token is valid
-    if not validateJWTToken(refresh_token_params.refresh_token):
+    payload = verifyJWTToken(refresh_token_params.refresh_token)
+    if payload is None:
         response = RefreshTokenResponse(message="Invalid refresh token", is_successful=False)
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_400_BAD_REQUEST)
+        return ModelResponse(response, status_code=status.HTTP_400_BAD_REQUEST)
     # if it is valid, generate a new access token
-    response = RefreshTokenResponse(is_successful=True, message="Token refreshed", access_token=generateJWTToken(decodeJWTToken(
-        refresh_token_params.refresh_token).user_id))
-    return JSONResponse(content=response.dict(), status_code=status.HTTP_200_OK)
+    response = RefreshTokenResponse(is_successful=True, message="Token refreshed", access_token=generateJWTToken(payload.user_id))
+    return ModelResponse(response, status_code=status.HTTP_200_OK)
@@ -1,19 +1,33 @@
+import asyncio
 from datetime import datetime
 from typing import Optional
 
 from bson import ObjectId
 from fastapi import APIRouter, Request, Depends
 from pydantic import BaseModel
+from pymongo import DESCENDING
+from pymongo.errors import DuplicateKeyError
 from starlette import status
-from starlette.responses import JSONResponse
+from starlette.responses import StreamingResponse
 
 from auth_bearer import JWTBearer
-from document_utils import calculateContentEdit, extractDocumentTitle
+from config import settings
+from document_utils import calculateContentEditOpcodes, extractDocumentTitle, generateDocumentsETag
 from markdown_utils import generateNewDocumentNotes, generateUpdatedDocumentNotes
-from models.document import Document, ReviewType, Folder
+from model_utils import getCurrentTimestamp
+from mongo_utils import documentSummaryStages, findCreatorId
+from models.document import Document, DocumentSummary, ReviewType, Folder
 from note import NoteReview, Note
-from note_review_utils import updateNotesRecallProbabilities
+from note_review_utils import updateAllNotesRecallProbabilities
+from note_storage_utils import appendDocumentsNoteReviews, appendNoteReviews, assembleDocumentNotes, deleteDocument, findDocument, \
+    findDocuments, findDocumentsCursor, findDocumentsNoteIds, insertDocument, isNotesInCollection, updateDocumentNoteItems
+from note_tree_utils import coordsSortKey
+from response_utils import ModelResponse, matchesETag, notModifiedResponse
 from routers import GenericResponse
+from stream_utils import NDJSON_MEDIA_TYPE, generateNdjsonLines
+from string_utils import generateContentHash
+from study_queue_utils import deleteNoteSchedule, getStudyQueue, updateEditedNoteSchedule, updateNoteSchedule
+from sync_utils import TOMBSTONE_TTL, generateSyncToken, getSyncChanges, parseSyncToken, recordTombstone
 
 document_router = APIRouter(dependencies=[Depends(JWTBearer())])
 
@@ -28,58 +42,163 @@ class CreateDocumentResponse(GenericResponse):
 
 @document_router.post("/create-document", description="create a document", response_model=CreateDocumentResponse)
 async def create_document(request: Request, document_params: CreateDocumentRequest):
-    # first we need to get the access token to get the user id
+    # the user id is the one the access token was issued to
     user_id = request.state.user_id
-    user = await request.app.mongodb["users"].find_one({"_id": ObjectId(user_id)})
-    if not user_id or not user:
-        response = CreateDocumentResponse(message="Invalid access token", is_successful=False)
-        return CreateDocumentResponse(content=response.dict(), status_code=status.HTTP_404_NOT_FOUND)
 
     # there is a limit of 10000 characters per document
     if len(document_params.content) > 10000:
         response = CreateDocumentResponse(is_successful=False, message="Document content is too long (max : 10000)")
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_400_BAD_REQUEST)
+        return ModelResponse(response, status_code=status.HTTP_400_BAD_REQUEST)
 
     document = Document(
         creator_id=user_id,
         title=extractDocumentTitle(document_params.content),
         notes=generateNewDocumentNotes(document_params.content),
         content=document_params.content,
+        content_hash=generateContentHash(document_params.content),
+        updated_at=getCurrentTimestamp(),
+        version=1,
     )
-    new_document = await request.app.mongodb["documents"].insert_one(document.dict(by_alias=True, exclude={"id"}))
-    created_document = await request.app.mongodb["documents"].find_one({"_id": new_document.inserted_id})
-    if created_document is None:
-        response = CreateDocumentResponse(is_successful=False, message="Failed to create document")
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    # the document is given back as it was inserted, insert_one sets its _id, instead of being read again
+    created_document = document.dict(by_alias=True, exclude={"id"})
+    await insertDocument(request.app.mongodb, created_document, settings.NOTES_IN_COLLECTION)
+    await updateNoteSchedule(request.app.mongodb, created_document, is_new_document=True)
     response = CreateDocumentResponse(is_successful=True, message="Document created successfully", document=created_document)
-    return JSONResponse(content=response.dict(), status_code=status.HTTP_201_CREATED)
+    return ModelResponse(response, status_code=status.HTTP_201_CREATED)
 
 
 class ListDocumentsResponse(GenericResponse):
     documents: list[Document]
 
 
-@document_router.get("/list-documents", description="Get and return a list of all the documents created by the current user",
+@document_router.get("/list-documents", description="Get and return a list of all the documents created by the current user, "
+                                                   "or all of them as newline delimited json with stream=true",
                      response_model=ListDocumentsResponse)
-async def list_documents(request: Request):
+async def list_documents(request: Request, stream: bool = False):
     user_id = request.state.user_id
-    documents = await request.app.mongodb["documents"].find({"creator_id": user_id}).to_list(length=100)
-
-    # update the note recall probabilities for all documents
-    for document in documents:
-        updateNotesRecallProbabilities(document['notes'])
+    now_timestamp = datetime.now().timestamp()
+    if stream or request.headers.get("if-none-match"):
+        # the versions of the documents are read first, so a client that already has them is answered without reading them,
+        # and a stream, sent before all of its documents are read, has its etag
+        versions = await request.app.mongodb["documents"].find({"creator_id": user_id}, {"version": 1}) \
+            .to_list(length=None if stream else 100)
+        etag = generateDocumentsETag(versions, now_timestamp, stream)
+        if matchesETag(request, etag):
+            return notModifiedResponse(etag)
+
+    if stream:
+        # every document as a line of json, read and written a batch at a time with the recall of the batch's notes updated
+        cursor = findDocumentsCursor(request.app.mongodb, {"creator_id": user_id})
+
+        def prepareBatch(documents: list[dict]) -> None:
+            assembleDocumentNotes(documents)
+            updateAllNotesRecallProbabilities([document['notes'] for document in documents], now_timestamp)
+        return StreamingResponse(generateNdjsonLines(cursor, Document, prepareBatch), media_type=NDJSON_MEDIA_TYPE, headers={"ETag": etag})
+
+    documents = await findDocuments(request.app.mongodb, {"creator_id": user_id}, limit=100)
+
+    # update the note recall probabilities for all documents at once
+    updateAllNotesRecallProbabilities([document['notes'] for document in documents], now_timestamp)
 
     response = ListDocumentsResponse(
         documents=documents,
         is_successful=True,
         message="Documents retrieved successfully"
     )
-    return JSONResponse(content=response.dict(), status_code=status.HTTP_200_OK)
+    # the etag is of the documents as they were read, in case one changed after its version was
+    return ModelResponse(response, status_code=status.HTTP_200_OK, headers={"ETag": generateDocumentsETag(documents, now_timestamp, stream)})
+
+
+class ListDocumentSummariesResponse(GenericResponse):
+    documents: list[DocumentSummary] = []
+    # the cursor of the next page, None if this is the last one
+    next_cursor: Optional[str] = None
+
+
+# the most document summaries returned in a page
+MAX_DOCUMENT_SUMMARIES_PER_PAGE = 100
+
+
+@document_router.get("/list-document-summaries", description="Get a page of summaries of the documents created by the current user, newest first, "
+                                                            "pass the next_cursor of a page to get the one after it",
+                     response_model=ListDocumentSummariesResponse)
+async def list_document_summaries(request: Request, cursor: Optional[str] = None, limit: int = 20):
+    user_id = request.state.user_id
+    if limit < 1 or limit > MAX_DOCUMENT_SUMMARIES_PER_PAGE:
+        response = ListDocumentSummariesResponse(is_successful=False, message=f"Invalid limit (1 - {MAX_DOCUMENT_SUMMARIES_PER_PAGE})")
+        return ModelResponse(response, status_code=status.HTTP_400_BAD_REQUEST)
+    if cursor is not None and not ObjectId.is_valid(cursor):
+        response = ListDocumentSummariesResponse(is_successful=False, message="Invalid cursor")
+        return ModelResponse(response, status_code=status.HTTP_400_BAD_REQUEST)
+
+    # the page starts right after the last document of the previous one, one more document is read to know if there is a next page
+    document_filter = {"creator_id": user_id}
+    if cursor is not None:
+        document_filter["_id"] = {"$lt": ObjectId(cursor)}
+    now_timestamp = datetime.now().timestamp()
+    if request.headers.get("if-none-match"):
+        # the versions of the page are read through the index alone, to answer a client that already has it
+        versions = await request.app.mongodb["documents"].find(document_filter, {"version": 1}) \
+            .sort("_id", DESCENDING).limit(limit + 1).to_list(length=limit + 1)
+        etag = generateDocumentsETag(versions, now_timestamp, cursor, limit)
+        if matchesETag(request, etag):
+            return notModifiedResponse(etag)
+    documents = await request.app.mongodb["documents"].aggregate([
+        {"$match": document_filter}, {"$sort": {"_id": DESCENDING}}, {"$limit": limit + 1}, *documentSummaryStages()
+    ]).to_list(length=limit + 1)
+    etag = generateDocumentsETag(documents, now_timestamp, cursor, limit)
+    next_cursor = str(documents[limit - 1]["_id"]) if len(documents) > limit else None
+    documents = documents[:limit]
+
+    for document in documents:
+        # the notes in the notes collection are joined in the order of their index, not of the document
+        document["notes"] = {note.pop("k"): note for note in sorted(document["notes"], key=lambda note: coordsSortKey(note["k"]))}
+    updateAllNotesRecallProbabilities([document["notes"] for document in documents], now_timestamp)
+
+    response = ListDocumentSummariesResponse(
+        documents=documents,
+        next_cursor=next_cursor,
+        is_successful=True,
+        message="Document summaries retrieved successfully"
+    )
+    return ModelResponse(response, status_code=status.HTTP_200_OK, headers={"ETag": etag})
+
+
+class GetDocumentResponse(GenericResponse):
+    document: Optional[Document] = None
+
+
+@document_router.get("/get-document", description="Get a document with all of its notes", response_model=GetDocumentResponse)
+async def get_document(request: Request, id: str):
+    user_id = request.state.user_id
+    now_timestamp = datetime.now().timestamp()
+    if request.headers.get("if-none-match") and ObjectId.is_valid(id):
+        # only the owner and version are read to answer a client that already has the document
+        version = await request.app.mongodb["documents"].find_one({"_id": ObjectId(id)}, {"creator_id": 1, "version": 1})
+        if version and version["creator_id"] == user_id:
+            etag = generateDocumentsETag([version], now_timestamp)
+            if matchesETag(request, etag):
+                return notModifiedResponse(etag)
+    document = await findDocument(request.app.mongodb, {"_id": ObjectId(id)}) if ObjectId.is_valid(id) else None
+    if not document:
+        response = GetDocumentResponse(message="Document not found", is_successful=False)
+        return ModelResponse(response, status_code=status.HTTP_404_NOT_FOUND)
+    # make sure that the user is the creator of the document
+    if document["creator_id"] != user_id:
+        response = GetDocumentResponse(message="Unauthorized", is_successful=False)
+        return ModelResponse(response, status_code=status.HTTP_401_UNAUTHORIZED)
+
+    updateAllNotesRecallProbabilities([document["notes"]], now_timestamp)
+
+    response = GetDocumentResponse(document=document, is_successful=True, message="Document retrieved successfully")
+    return ModelResponse(response, status_code=status.HTTP_200_OK, headers={"ETag": generateDocumentsETag([document], now_timestamp)})
 
 
 class UpdateDocumentRequest(BaseModel):
     id: str
     content: str
+    # the version of the document the edit was made to, the edit is rejected if the document changed since, None to not check
+    expected_version: Optional[int] = None
 
 
 class UpdateDocumentResponse(GenericResponse):
@@ -89,42 +208,64 @@ class UpdateDocumentResponse(GenericResponse):
 @document_router.put("/update-document", description="Update a document", response_model=CreateDocumentResponse)
 async def update_document(request: Request, document_params: UpdateDocumentRequest):
     user_id = request.state.user_id
-    document = await request.app.mongodb["documents"].find_one({"_id": ObjectId(document_params.id)})
+    document = await findDocument(request.app.mongodb, {"_id": ObjectId(document_params.id)})
     if not document:
         response = UpdateDocumentResponse(message="Document not found", is_successful=False)
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_404_NOT_FOUND)
+        return ModelResponse(response, status_code=status.HTTP_404_NOT_FOUND)
     # make sure that the user is the creator of the document
     if document["creator_id"] != user_id:
         response = UpdateDocumentResponse(message="Unauthorized", is_successful=False)
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_401_UNAUTHORIZED)
+        return ModelResponse(response, status_code=status.HTTP_401_UNAUTHORIZED)
+
+    if document_params.expected_version is not None and document_params.expected_version != document.get("version", 0):
+        response = UpdateDocumentResponse(message="Document was changed since it was read", is_successful=False, document=document)
+        return ModelResponse(response, status_code=status.HTTP_409_CONFLICT)
 
     # there is a limit of 10000 characters per document
     if len(document_params.content) > 10000:
         response = CreateDocumentResponse(is_successful=False, message="Document content is too long (max : 10000)")
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_400_BAD_REQUEST)
-
-    # check if there is a difference in content, if not, no need to update
-    added, deleted = calculateContentEdit(document['content'], document_params.content)
+        return ModelResponse(response, status_code=status.HTTP_400_BAD_REQUEST)
 
-    if added + deleted == 0:
+    # check if there is a difference in content through the fingerprints, if not, no need to update
+    content_hash = generateContentHash(document_params.content)
+    if content_hash == (document.get('content_hash') or generateContentHash(document['content'])):
         response = UpdateDocumentResponse(is_successful=True, message="No changes made to document", document=document)
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_200_OK)
+        return ModelResponse(response, status_code=status.HTTP_200_OK)
 
     edited_document = Document(**document)
+    current_notes = edited_document.notes
 
     edited_document.title = extractDocumentTitle(document_params.content)
-    print('title is ', edited_document.title)
     edited_document.content = document_params.content
-    edited_document.notes = generateUpdatedDocumentNotes({key: Note(**note) for key, note in document['notes'].items()}, document_params.content)
-
-    updated_document = await request.app.mongodb["documents"].update_one({"_id": ObjectId(document_params.id)},
-                                                                         {"$set": edited_document.dict(by_alias=True, exclude={"id"})})
-    if updated_document is None:
-        response = UpdateDocumentResponse(is_successful=False, message="Failed to update document")
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    edited_document.content_hash = content_hash
+    edited_document.updated_at = getCurrentTimestamp()
+    # only the sections touched by the edit are re-parsed if the previous content was parsed recently, and the notes of
+    # unchanged sections are carried over as they are
+    edit_opcodes = calculateContentEditOpcodes(document['content'], document_params.content)
+    edited_document.notes = generateUpdatedDocumentNotes(current_notes, document_params.content,
+                                                         current_markdown_content=document['content'], edit_opcodes=edit_opcodes)
+
+    # only the edited fields are written, and only if the document is still the version they were worked out from, so a review
+    # or another edit made in between isn't overwritten
+    edited_document.version = document.get("version", 0) + 1
+    edited_document_fields = edited_document.dict(by_alias=True, include={"title", "content", "content_hash", "updated_at", "notes"})
+    # notes stored in the notes collection are written on their own, only the ones the edit changed
+    edited_notes = edited_document_fields.pop("notes") if isNotesInCollection(document) else edited_document_fields["notes"]
+    updated_document = await request.app.mongodb["documents"].update_one(
+        {"_id": ObjectId(document_params.id), "version": document.get("version")},
+        {"$set": edited_document_fields, "$inc": {"version": 1}}
+    )
+    if updated_document.matched_count == 0:
+        response = UpdateDocumentResponse(is_successful=False, message="Document was changed since it was read")
+        return ModelResponse(response, status_code=status.HTTP_409_CONFLICT)
+    if isNotesInCollection(document):
+        await updateDocumentNoteItems(request.app.mongodb, document, edited_notes)
+    # only the schedule entries of the notes the edit changed the title or recall of, or moved, are written
+    await updateEditedNoteSchedule(request.app.mongodb, {"_id": ObjectId(document_params.id), "creator_id": user_id,
+                                                         "version": edited_document.version, "notes": edited_notes}, document["notes"])
 
     response = UpdateDocumentResponse(is_successful=True, message="Document updated successfully", document=edited_document)
-    return JSONResponse(content=response.dict(), status_code=status.HTTP_200_OK)
+    return ModelResponse(response, status_code=status.HTTP_200_OK)
 
 
 class DeleteDocumentRequest(BaseModel):
@@ -138,22 +279,19 @@ class DeleteDocumentResponse(GenericResponse):
 @document_router.delete("/delete-document", description="Delete a document", response_model=CreateDocumentResponse)
 async def delete_document(request: Request, document_params: DeleteDocumentRequest):
     user_id = request.state.user_id
-    document = await request.app.mongodb["documents"].find_one({"_id": ObjectId(document_params.id)})
-    if not document:
-        response = DeleteDocumentResponse(message="Document not found", is_successful=False)
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_404_NOT_FOUND)
-    # make sure that the user is the creator of the document
-    if document["creator_id"] != user_id:
+    # only the creator of the document can delete it, the document is only read to find out why if it isn't deleted
+    document_id = ObjectId(document_params.id)
+    if not await deleteDocument(request.app.mongodb, document_id, user_id):
+        if await findCreatorId(request.app.mongodb["documents"], document_id) is None:
+            response = DeleteDocumentResponse(message="Document not found", is_successful=False)
+            return ModelResponse(response, status_code=status.HTTP_404_NOT_FOUND)
         response = DeleteDocumentResponse(message="Unauthorized", is_successful=False)
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_401_UNAUTHORIZED)
-
-    deleted_document = await request.app.mongodb["documents"].delete_one({"_id": ObjectId(document_params.id)})
-    if deleted_document is None:
-        response = DeleteDocumentResponse(is_successful=False, message="Failed to delete document")
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return ModelResponse(response, status_code=status.HTTP_401_UNAUTHORIZED)
+    await asyncio.gather(deleteNoteSchedule(request.app.mongodb, str(document_id)),
+                         recordTombstone(request.app.mongodb, user_id, "document", str(document_id), getCurrentTimestamp()))
 
     response = DeleteDocumentResponse(is_successful=True, message="Document deleted successfully")
-    return JSONResponse(content=response.dict(), status_code=status.HTTP_200_OK)
+    return ModelResponse(response, status_code=status.HTTP_200_OK)
 
 
 class RecordNoteReviewRequest(BaseModel):
@@ -170,43 +308,215 @@ class RecordNoteReviewResponse(GenericResponse):
 @document_router.post("/record-note-review", description="Record the reviewing of a note", response_model=RecordNoteReviewResponse)
 async def record_note_review(request: Request, review_params: RecordNoteReviewRequest):
     user_id = request.state.user_id
-    document = await request.app.mongodb["documents"].find_one({"_id": ObjectId(review_params.document_id)})
+
+    # check that the review type is one of the valid review types
+    valid_review_types = [ReviewType.FLASH_CARDS.value, ReviewType.MULTIPLE_CHOICE_QUESTION.value, ReviewType.OPEN_ENDED_QUESTION.value, ReviewType.CHAT.value]
+    is_valid_review = 0 <= review_params.score <= 1 and review_params.review_type in valid_review_types
+
+    # the review is appended to the note in a single atomic update, the ownership and note checks are part of the filter
+    # so concurrent reviews of the same document can't overwrite each other
+    if is_valid_review:
+        review = NoteReview(review_type=review_params.review_type, score=review_params.score, timestamp=getCurrentTimestamp())
+        updated_document = await appendNoteReviews(request.app.mongodb, ObjectId(review_params.document_id), user_id, review_params.note_id,
+                                                   [review.dict()], review.timestamp, settings.NOTES_IN_COLLECTION)
+        if updated_document is not None:
+            await updateNoteSchedule(request.app.mongodb, updated_document, {review_params.note_id})
+            response = RecordNoteReviewResponse(is_successful=True, message="Note review recorded successfully")
+            return ModelResponse(response, status_code=status.HTTP_200_OK)
+
+    # otherwise find out why, only the owner and the ids of the notes are fetched
+    document = (await findDocumentsNoteIds(request.app.mongodb, [ObjectId(review_params.document_id)])).get(str(ObjectId(review_params.document_id)))
     if not document:
         response = RecordNoteReviewResponse(message="Document not found", is_successful=False)
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_404_NOT_FOUND)
+        return ModelResponse(response, status_code=status.HTTP_404_NOT_FOUND)
     # make sure that the user is the creator of the document
     if document["creator_id"] != user_id:
         response = RecordNoteReviewResponse(message="Unauthorized", is_successful=False)
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_401_UNAUTHORIZED)
+        return ModelResponse(response, status_code=status.HTTP_401_UNAUTHORIZED)
 
-    note = document["notes"].get(review_params.note_id)
-    if not note:
+    if review_params.note_id not in document["note_ids"]:
         response = RecordNoteReviewResponse(message="Note not found", is_successful=False)
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_404_NOT_FOUND)
+        return ModelResponse(response, status_code=status.HTTP_404_NOT_FOUND)
 
     if review_params.score < 0 or review_params.score > 1:
         response = RecordNoteReviewResponse(message="Invalid score", is_successful=False)
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_400_BAD_REQUEST)
+        return ModelResponse(response, status_code=status.HTTP_400_BAD_REQUEST)
 
-    # check that the review type is one of the valid review types
-    valid_review_types = [ReviewType.FLASH_CARDS.value, ReviewType.MULTIPLE_CHOICE_QUESTION.value, ReviewType.OPEN_ENDED_QUESTION.value, ReviewType.CHAT.value]
-    print('valid review types are', valid_review_types)
     if review_params.review_type not in valid_review_types:
         response = RecordNoteReviewResponse(is_successful=False, message="Invalid review type")
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_400_BAD_REQUEST)
+        return ModelResponse(response, status_code=status.HTTP_400_BAD_REQUEST)
+
+    response = RecordNoteReviewResponse(is_successful=False, message="Failed to record note review")
+    return ModelResponse(response, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class NoteReviewEntry(BaseModel):
+    document_id: str
+    note_id: str
+    review_type: str
+    score: float
+
+
+class RecordNoteReviewsRequest(BaseModel):
+    reviews: list[NoteReviewEntry]
+
+
+class NoteReviewResult(BaseModel):
+    document_id: str
+    note_id: str
+    is_successful: bool
+    message: str
+
+
+class RecordNoteReviewsResponse(GenericResponse):
+    results: list[NoteReviewResult] = []
+
 
-    note["reviews"].append(
-        NoteReview(review_type=review_params.review_type, score=review_params.score, timestamp=datetime.now().isoformat()).dict()
+# the most reviews that can be recorded in one request
+MAX_NOTE_REVIEWS_PER_REQUEST = 500
+
+
+@document_router.post("/record-note-reviews", description="Record the reviewing of many notes at once, like at the end of a quiz",
+                      response_model=RecordNoteReviewsResponse)
+async def record_note_reviews(request: Request, reviews_params: RecordNoteReviewsRequest):
+    user_id = request.state.user_id
+    if len(reviews_params.reviews) > MAX_NOTE_REVIEWS_PER_REQUEST:
+        response = RecordNoteReviewsResponse(is_successful=False, message=f"Too many reviews (max : {MAX_NOTE_REVIEWS_PER_REQUEST})")
+        return ModelResponse(response, status_code=status.HTTP_400_BAD_REQUEST)
+
+    # the message of every entry that can't be recorded, by its index
+    errors = {}
+    valid_review_types = {review_type.value for review_type in ReviewType}
+    for index, entry in enumerate(reviews_params.reviews):
+        if not ObjectId.is_valid(entry.document_id):
+            errors[index] = "Document not found"
+        elif entry.score < 0 or entry.score > 1:
+            errors[index] = "Invalid score"
+        elif entry.review_type not in valid_review_types:
+            errors[index] = "Invalid review type"
+
+    # a single read of the owner and note ids of every document reviewed
+    entry_document_ids = {index: str(ObjectId(entry.document_id)) for index, entry in enumerate(reviews_params.reviews) if index not in errors}
+    document_ids = {ObjectId(document_id) for document_id in entry_document_ids.values()}
+    documents = await findDocumentsNoteIds(request.app.mongodb, list(document_ids)) if document_ids else {}
+
+    timestamp = getCurrentTimestamp()
+    reviews_by_document = {}
+    for index, entry in enumerate(reviews_params.reviews):
+        if index in errors:
+            continue
+        document = documents.get(entry_document_ids[index])
+        if document is None:
+            errors[index] = "Document not found"
+        elif document["creator_id"] != user_id:
+            errors[index] = "Unauthorized"
+        elif entry.note_id not in document["note_ids"]:
+            errors[index] = "Note not found"
+        else:
+            review = NoteReview(review_type=entry.review_type, score=entry.score, timestamp=timestamp)
+            reviews_by_document.setdefault(entry_document_ids[index], {}).setdefault(entry.note_id, []).append(review.dict())
+
+    # one atomic append per document with its notes inside it, and one per note stored in the notes collection, made all at once
+    if reviews_by_document:
+        in_collection_ids = {document_id for document_id in reviews_by_document if isNotesInCollection(documents[document_id])}
+        failed_document_ids, reviewed_documents = await appendDocumentsNoteReviews(request.app.mongodb, user_id, reviews_by_document,
+                                                                                   in_collection_ids, timestamp)
+        if failed_document_ids:
+            for index in range(len(reviews_params.reviews)):
+                if index not in errors and entry_document_ids[index] in failed_document_ids:
+                    errors[index] = "Failed to record note review"
+
+        # the reviewed notes are due again later, rescheduled from the documents as the appends left them
+        await asyncio.gather(*[updateNoteSchedule(request.app.mongodb, document, set(reviews_by_document[str(document["_id"])].keys()))
+                               for document in reviewed_documents])
+
+    results = [
+        NoteReviewResult(document_id=entry.document_id, note_id=entry.note_id, is_successful=index not in errors,
+                         message=errors.get(index, "Note review recorded successfully"))
+        for index, entry in enumerate(reviews_params.reviews)
+    ]
+    response = RecordNoteReviewsResponse(
+        is_successful=not errors,
+        message="Note reviews recorded successfully" if not errors else f"Failed to record {len(errors)} of {len(results)} note reviews",
+        results=results
     )
+    return ModelResponse(response, status_code=status.HTTP_200_OK)
+
+
+class StudyQueueNote(BaseModel):
+    document_id: str
+    note_id: str
+    title: str
+    recall_probability: float
+    next_due: float
+
+
+class GetStudyQueueResponse(GenericResponse):
+    notes: list[StudyQueueNote] = []
 
-    updated_document = await request.app.mongodb["documents"].update_one({"_id": ObjectId(review_params.document_id)},
-                                                                         {"$set": {"notes": document["notes"]}})
-    if updated_document is None:
-        response = RecordNoteReviewResponse(is_successful=False, message="Failed to record note review")
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    response = RecordNoteReviewResponse(is_successful=True, message="Note review recorded successfully")
-    return JSONResponse(content=response.dict(), status_code=status.HTTP_200_OK)
+# the most notes the study queue returns at once
+MAX_STUDY_QUEUE_LENGTH = 100
+
+
+@document_router.get("/study-queue", description="Get the notes of the current user that are most in need of review, across all of their documents",
+                     response_model=GetStudyQueueResponse)
+async def get_study_queue(request: Request, limit: int = 20):
+    user_id = request.state.user_id
+    if limit < 1 or limit > MAX_STUDY_QUEUE_LENGTH:
+        response = GetStudyQueueResponse(is_successful=False, message=f"Invalid limit (1 - {MAX_STUDY_QUEUE_LENGTH})")
+        return ModelResponse(response, status_code=status.HTTP_400_BAD_REQUEST)
+
+    study_queue = await getStudyQueue(request.app.mongodb, user_id, limit, datetime.now().timestamp())
+    response = GetStudyQueueResponse(
+        is_successful=True,
+        message="Study queue retrieved successfully",
+        notes=[StudyQueueNote(document_id=entry["document_id"], note_id=entry["note_id"], title=entry["title"],
+                              recall_probability=recall_probability, next_due=entry["next_due"])
+               for recall_probability, entry in study_queue]
+    )
+    return ModelResponse(response, status_code=status.HTTP_200_OK)
+
+
+class SyncResponse(GenericResponse):
+    documents: list[Document] = []
+    folders: list[Folder] = []
+    deleted_document_ids: list[str] = []
+    deleted_folder_ids: list[str] = []
+    # whether these are all the documents and folders of the user, to replace the copy of the client instead of updating it
+    is_full_sync: bool = False
+    # the token to get the changes after this sync with
+    token: Optional[str] = None
+
+
+@document_router.get("/sync", description="Get the documents and folders of the current user created, updated or deleted since the sync "
+                                          "of the given token, or all of them without one, and the token of the next sync",
+                     response_model=SyncResponse)
+async def sync(request: Request, token: Optional[str] = None):
+    user_id = request.state.user_id
+    since = parseSyncToken(token) if token is not None else None
+    if token is not None and since is None:
+        response = SyncResponse(is_successful=False, message="Invalid sync token")
+        return ModelResponse(response, status_code=status.HTTP_400_BAD_REQUEST)
+
+    sync_timestamp = getCurrentTimestamp()
+    # the deletions since a token older than the tombstones may be gone, so the client gets everything again
+    if since is not None and since < sync_timestamp - TOMBSTONE_TTL:
+        since = None
+    documents, folders, tombstones = await getSyncChanges(request.app.mongodb, user_id, since)
+    updateAllNotesRecallProbabilities([document['notes'] for document in documents])
+
+    response = SyncResponse(
+        documents=documents,
+        folders=folders,
+        deleted_document_ids=[tombstone["item_id"] for tombstone in tombstones if tombstone["item_type"] == "document"],
+        deleted_folder_ids=[tombstone["item_id"] for tombstone in tombstones if tombstone["item_type"] == "folder"],
+        is_full_sync=since is None,
+        token=generateSyncToken(sync_timestamp),
+        is_successful=True,
+        message="Changes retrieved successfully"
+    )
+    return ModelResponse(response, status_code=status.HTTP_200_OK)
 
 
 # region FOLDERS
@@ -219,16 +529,21 @@ class ListFoldersResponse(GenericResponse):
     folders: list[Folder]
 
 
-@document_router.get("/list-folders", description="Get and return a list of all the folders created by the current user", response_model=ListFoldersResponse)
-async def list_folders(request: Request):
+@document_router.get("/list-folders", description="Get and return a list of all the folders created by the current user, "
+                                                 "or all of them as newline delimited json with stream=true", response_model=ListFoldersResponse)
+async def list_folders(request: Request, stream: bool = False):
     user_id = request.state.user_id
+    if stream:
+        cursor = request.app.mongodb["folders"].find({"creator_id": user_id})
+        return StreamingResponse(generateNdjsonLines(cursor, Folder), media_type=NDJSON_MEDIA_TYPE)
+
     folders = await request.app.mongodb["folders"].find({"creator_id": user_id}).to_list(length=100)
     response = ListFoldersResponse(
         folders=folders,
         is_successful=True,
         message="Folders retrieved successfully"
     )
-    return JSONResponse(content=response.dict(), status_code=status.HTTP_200_OK)
+    return ModelResponse(response, status_code=status.HTTP_200_OK)
 
 
 class CreateFolderRequest(BaseModel):
@@ -242,25 +557,23 @@ class CreateFolderResponse(GenericResponse):
 @document_router.post("/create-folder", description="Create a folder", response_model=CreateFolderResponse)
 async def create_folder(request: Request, folder_params: CreateFolderRequest):
     user_id = request.state.user_id
+    timestamp = getCurrentTimestamp()
     folder = Folder(
         creator_id=user_id,
-        name=folder_params.folder_name,
-        created_at=datetime.now().isoformat()
+        name=folder_params.name,
+        created_at=timestamp,
+        updated_at=timestamp,
     )
-    # first check if the folder name is already in use
-    folder_exists = await request.app.mongodb["folders"].find_one({"creator_id": user_id, "name": folder_params.folder_name})
-    if folder_exists:
+    # the names of the folders of a user are unique through the index on them, so the folder is inserted without looking for
+    # one with its name first
+    try:
+        await request.app.mongodb["folders"].insert_one(folder.dict(by_alias=True, exclude={"id"}))
+    except DuplicateKeyError:
         response = CreateFolderResponse(is_successful=False, message="Folder name already in use")
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_400_BAD_REQUEST)
-
-    new_folder = await request.app.mongodb["folders"].insert_one(folder.dict(by_alias=True, exclude={"id"}))
-
-    if new_folder is None:
-        response = CreateFolderResponse(is_successful=False, message="Failed to create folder")
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return ModelResponse(response, status_code=status.HTTP_400_BAD_REQUEST)
 
     response = CreateFolderResponse(is_successful=True, message="Folder created successfully")
-    return JSONResponse(content=response.dict(), status_code=status.HTTP_201_CREATED)
+    return ModelResponse(response, status_code=status.HTTP_201_CREATED)
 
 
 # add a document to a folder
@@ -276,39 +589,34 @@ class AddDocumentToFolderResponse(GenericResponse):
 @document_router.post("/add-document-to-folder", description="Add a document to a folder", response_model=AddDocumentToFolderResponse)
 async def add_document_to_folder(request: Request, folder_params: AddDocumentToFolderRequest):
     user_id = request.state.user_id
-    folder = await request.app.mongodb["folders"].find_one({"_id": ObjectId(folder_params.folder_id)})
-    if not folder:
-        response = AddDocumentToFolderResponse(message="Folder not found", is_successful=False)
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_404_NOT_FOUND)
     # make sure that the user is the creator of the folder
-    if folder["creator_id"] != user_id:
-        response = AddDocumentToFolderResponse(message="Unauthorized", is_successful=False)
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_401_UNAUTHORIZED)
-
-    document = await request.app.mongodb["documents"].find_one({"_id": ObjectId(folder_params.document_id)})
-    if not document:
-        response = AddDocumentToFolderResponse(message="Document not found", is_successful=False)
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_404_NOT_FOUND)
-
-    # check that the user is the creator of the document
-    if document["creator_id"] != user_id:
+    folder_creator_id = await findCreatorId(request.app.mongodb["folders"], ObjectId(folder_params.folder_id))
+    if folder_creator_id is None:
+        response = AddDocumentToFolderResponse(message="Folder not found", is_successful=False)
+        return ModelResponse(response, status_code=status.HTTP_404_NOT_FOUND)
+    if folder_creator_id != user_id:
         response = AddDocumentToFolderResponse(message="Unauthorized", is_successful=False)
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_401_UNAUTHORIZED)
+        return ModelResponse(response, status_code=status.HTTP_401_UNAUTHORIZED)
 
-    # check if the document is already in the folder
-    if folder_params.document_id in folder["documents"]:
+    # the document is moved only if the user created it and it isn't in the folder already, and only read to find out why if not
+    document_id = ObjectId(folder_params.document_id)
+    updated_document = await request.app.mongodb["documents"].update_one(
+        {"_id": document_id, "creator_id": user_id, "folder_id": {"$ne": folder_params.folder_id}},
+        {"$set": {"folder_id": folder_params.folder_id, "updated_at": getCurrentTimestamp()}, "$inc": {"version": 1}}
+    )
+    if updated_document.matched_count == 0:
+        document_creator_id = await findCreatorId(request.app.mongodb["documents"], document_id)
+        if document_creator_id is None:
+            response = AddDocumentToFolderResponse(message="Document not found", is_successful=False)
+            return ModelResponse(response, status_code=status.HTTP_404_NOT_FOUND)
+        if document_creator_id != user_id:
+            response = AddDocumentToFolderResponse(message="Unauthorized", is_successful=False)
+            return ModelResponse(response, status_code=status.HTTP_401_UNAUTHORIZED)
         response = AddDocumentToFolderResponse(message="Document already in folder", is_successful=False)
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_400_BAD_REQUEST)
-
-    updated_document = await request.app.mongodb["documents"].update_one({"_id": ObjectId(folder_params.document_id)},
-                                                                         {"$set": {"folder_id": folder_params.folder_id}})
-
-    if updated_document is None:
-        response = AddDocumentToFolderResponse(is_successful=False, message="Failed to add document to folder")
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return ModelResponse(response, status_code=status.HTTP_400_BAD_REQUEST)
 
     response = AddDocumentToFolderResponse(is_successful=True, message="Document added to folder successfully")
-    return JSONResponse(content=response.dict(), status_code=status.HTTP_200_OK)
+    return ModelResponse(response, status_code=status.HTTP_200_OK)
 
 
 class UpdateFolderRequest(BaseModel):
@@ -324,23 +632,23 @@ class UpdateFolderResponse(GenericResponse):
 async def update_folder(request: Request, folder_params: UpdateFolderRequest):
     user_id = request.state.user_id
 
-    folder = await request.app.mongodb["folders"].find_one({"_id": ObjectId(folder_params.folder_id)})
-    if not folder:
-        response = AddDocumentToFolderResponse(message="Folder not found", is_successful=False)
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_404_NOT_FOUND)
-    # make sure that the user is the creator of the folder
-    if folder["creator_id"] != user_id:
-        response = AddDocumentToFolderResponse(message="Unauthorized", is_successful=False)
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_401_UNAUTHORIZED)
-
-    updated_folder = await request.app.mongodb["folders"].update_one({"_id": ObjectId(folder_params.folder_id)},
-                                                                     {"$set": {"name": folder_params.name}})
-
-    if updated_folder is None:
-        response = UpdateFolderResponse(is_successful=False, message="Failed to update folder")
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    # only the creator of the folder can rename it, the folder is only read to find out why if it isn't renamed
+    folder_id = ObjectId(folder_params.id)
+    try:
+        updated_folder = await request.app.mongodb["folders"].update_one(
+            {"_id": folder_id, "creator_id": user_id}, {"$set": {"name": folder_params.name, "updated_at": getCurrentTimestamp()}})
+    except DuplicateKeyError:
+        response = UpdateFolderResponse(is_successful=False, message="Folder name already in use")
+        return ModelResponse(response, status_code=status.HTTP_400_BAD_REQUEST)
+    if updated_folder.matched_count == 0:
+        if await findCreatorId(request.app.mongodb["folders"], folder_id) is None:
+            response = UpdateFolderResponse(message="Folder not found", is_successful=False)
+            return ModelResponse(response, status_code=status.HTTP_404_NOT_FOUND)
+        response = UpdateFolderResponse(message="Unauthorized", is_successful=False)
+        return ModelResponse(response, status_code=status.HTTP_401_UNAUTHORIZED)
 
     response = UpdateFolderResponse(is_successful=True, message="Folder updated successfully")
+    return ModelResponse(response, status_code=status.HTTP_200_OK)
 
 
 class DeleteFolderRequest(BaseModel):
@@ -354,23 +662,18 @@ class DeleteFolderResponse(GenericResponse):
 @document_router.delete("/delete-folder", description="Delete a folder", response_model=DeleteFolderResponse)
 async def delete_folder(request: Request, folder_params: DeleteFolderRequest):
     user_id = request.state.user_id
-    folder = await request.app.mongodb["folders"].find_one({"_id": ObjectId(folder_params.id)})
-    if not folder:
-        response = DeleteFolderResponse(message="Folder not found", is_successful=False)
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_404_NOT_FOUND)
-
-    # make sure that the user is the creator of the document
-    if folder["creator_id"] != user_id:
+    # only the creator of the folder can delete it, the folder is only read to find out why if it isn't deleted
+    folder_id = ObjectId(folder_params.id)
+    deleted_folder = await request.app.mongodb["folders"].delete_one({"_id": folder_id, "creator_id": user_id})
+    if deleted_folder.deleted_count == 0:
+        if await findCreatorId(request.app.mongodb["folders"], folder_id) is None:
+            response = DeleteFolderResponse(message="Folder not found", is_successful=False)
+            return ModelResponse(response, status_code=status.HTTP_404_NOT_FOUND)
         response = DeleteFolderResponse(message="Unauthorized", is_successful=False)
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_401_UNAUTHORIZED)
-
-    deleted_folder = await request.app.mongodb["folders"].delete_one({"_id": ObjectId(folder_params.id)})
-
-    if deleted_folder is None:
-        response = DeleteFolderResponse(is_successful=False, message="Failed to delete folder")
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return ModelResponse(response, status_code=status.HTTP_401_UNAUTHORIZED)
+    await recordTombstone(request.app.mongodb, user_id, "folder", str(folder_id), getCurrentTimestamp())
 
     response = DeleteFolderResponse(is_successful=True, message="Folder deleted successfully")
-    return JSONResponse(content=response.dict(), status_code=status.HTTP_200_OK)
+    return ModelResponse(response, status_code=status.HTTP_200_OK)
 
 # endregion
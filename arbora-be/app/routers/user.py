@@ -3,13 +3,15 @@ from typing import Optional
 from bson import ObjectId
 from fastapi import APIRouter, Request, Depends
 from pydantic import BaseModel, EmailStr
+from pymongo.errors import DuplicateKeyError
 from starlette import status
-from starlette.responses import JSONResponse
 
 from auth_bearer import JWTBearer
+from executor_utils import ExecutorBusyError
+from model_utils import getCurrentTimestamp
 from models.user import User
-from utils.auth_utils import hashPassword, JWTPayload
-from datetime import datetime
+from response_utils import ModelResponse
+from utils.auth_utils import PASSWORD_HASHING_RETRY_AFTER, hashPassword, JWTPayload
 
 user_router = APIRouter()
 
@@ -31,36 +33,32 @@ async def createUser(request: Request, user_params: CreateUserRequest):
     # check that the password and the password confirmation are the same
     if user_params.password != user_params.password_confirmation:
         response = CreateUserResponse(is_successful=False, message="Passwords do not match")
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_400_BAD_REQUEST)
+        return ModelResponse(response, status_code=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        password_hash = await hashPassword(user_params.password)
+    except ExecutorBusyError:
+        response = CreateUserResponse(is_successful=False, message="Too many signups at the moment, try again in a few seconds")
+        return ModelResponse(response, status_code=status.HTTP_503_SERVICE_UNAVAILABLE, headers={"Retry-After": str(PASSWORD_HASHING_RETRY_AFTER)})
 
     user = User(
         name=user_params.name,
         email=user_params.email,
-        password_hash=hashPassword(user_params.password),
+        password_hash=password_hash,
         is_active=True,
         is_verified=False,
-        # the dates are in iso format
-        created_at=datetime.now().isoformat(),
-        updated_at="",
-        deleted_at="",
+        created_at=getCurrentTimestamp(),
     )
 
-    # we need to check that the email is unique
-    existing_user = await request.app.mongodb["users"].find_one({"email": user.email})
-    if existing_user is not None:
+    # the email is unique through the index on it, so the user is inserted without looking for one with it first
+    try:
+        await request.app.mongodb["users"].insert_one(user.dict(by_alias=True, exclude={"id"}))
+    except DuplicateKeyError:
         response = CreateUserResponse(is_successful=False, message="This email is already in use on this platform, use another one")
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_400_BAD_REQUEST)
-
-    new_user = await request.app.mongodb["users"].insert_one(user.dict(by_alias=True, exclude={"id"}))
-    # get the created user to check if it was created successfully
-    user = await request.app.mongodb["users"].find_one({"_id": new_user.inserted_id})
-
-    if user is None:
-        response = CreateUserResponse(is_successful=False, message="Failed to create user")
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return ModelResponse(response, status_code=status.HTTP_400_BAD_REQUEST)
 
     response = CreateUserResponse(is_successful=True, message="User created successfully")
-    return JSONResponse(content=response.dict(), status_code=status.HTTP_201_CREATED)
+    return ModelResponse(response, status_code=status.HTTP_201_CREATED)
 
 
 class GetUserResponse(BaseModel):
@@ -75,7 +73,7 @@ async def getCurrentUser(request: Request):
     user = await request.app.mongodb["users"].find_one({"_id": ObjectId(user_id)})
     if not user_id or not user:
         response = GetUserResponse(user=None, message="User not found", is_successful=False)
-        return JSONResponse(content=response.dict(), status_code=status.HTTP_404_NOT_FOUND)
+        return ModelResponse(response, status_code=status.HTTP_404_NOT_FOUND)
 
     response = GetUserResponse(user=user, message="User found", is_successful=True)
-    return JSONResponse(content=response.dict(), status_code=status.HTTP_200_OK)
+    return ModelResponse(response, status_code=status.HTTP_200_OK)
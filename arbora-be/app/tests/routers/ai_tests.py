@@ -0,0 +1,127 @@
+import asyncio
+import json
+import sys
+import time
+import types
+
+import pytest
+
+try:
+    import google.generativeai
+except ImportError:
+    # the model calls are faked, without the sdk only what gemini uses to configure and build its models is stubbed
+    google = sys.modules.setdefault('google', types.ModuleType('google'))
+    google.generativeai = types.ModuleType('google.generativeai')
+    google.generativeai.configure = lambda **kwargs: None
+    google.generativeai.GenerativeModel = lambda **kwargs: None
+    sys.modules['google.generativeai'] = google.generativeai
+
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from config import settings
+import gemini
+from utils.auth_utils import generateJWTToken
+from gemini.services import flash_cards, multiple_choice_questions
+from generation_cache_utils import GENERATION_CACHE
+from routers.ai import ai_router
+
+# the seconds the fake model takes to respond
+MODEL_LATENCY = 0.5
+
+
+class FakeSlowModel:
+    # a model that takes a while to respond with the given items, and keeps the number of calls and the most it had in flight at once
+    model_name = 'models/fake'
+
+    def __init__(self, items: list[dict]):
+        self.items = items
+        self.no_of_calls = 0
+        self.no_of_calls_in_flight = 0
+        self.max_calls_in_flight = 0
+
+    async def generate_content_async(self, model_input: str):
+        self.no_of_calls += 1
+        self.no_of_calls_in_flight += 1
+        self.max_calls_in_flight = max(self.max_calls_in_flight, self.no_of_calls_in_flight)
+        await asyncio.sleep(MODEL_LATENCY)
+        self.no_of_calls_in_flight -= 1
+        return type('Response', (), {'text': json.dumps(self.items)})()
+
+
+@pytest.fixture(autouse=True)
+def emptyCache():
+    GENERATION_CACHE.clear()
+    yield
+    GENERATION_CACHE.clear()
+
+
+async def requestConcurrently(path: str, params: list[dict]) -> tuple[list, float]:
+    app = FastAPI()
+    app.include_router(ai_router)
+    # without a database the generations are only kept in the process
+    app.mongodb = None
+    headers = {"Authorization": f"Bearer {generateJWTToken('user')}"}
+    async with AsyncClient(transport=ASGITransport(app=app), base_url='http://test') as client:
+        start = time.perf_counter()
+        responses = await asyncio.gather(*[client.post(path, headers=headers, json=request_params) for request_params in params])
+        return responses, time.perf_counter() - start
+
+
+async def requestFlashCards(no_of_requests: int) -> tuple[list, float]:
+    # every request bypasses the cache, so every one of them calls the model
+    return await requestConcurrently('/ai/get-flash-cards', [{'no_of_flash_cards': 1, 'content': 'content', 'bypass_cache': True}] * no_of_requests)
+
+
+def test_concurrent_ai_requests_are_served_in_parallel(monkeypatch):
+    model = FakeSlowModel([{'prompt': 'prompt', 'answer': 'answer'}])
+    monkeypatch.setattr(flash_cards, 'flash_cards_model', model)
+    monkeypatch.setattr(settings, 'GEMINI_MAX_CONCURRENT_CALLS', 16)
+
+    responses, duration = asyncio.run(requestFlashCards(16))
+    assert all(response.status_code == 200 for response in responses)
+    # one after the other they would take 16 times as long
+    assert model.max_calls_in_flight == 16
+    assert duration < 3 * MODEL_LATENCY
+
+
+def test_model_calls_in_flight_are_capped(monkeypatch):
+    model = FakeSlowModel([{'prompt': 'prompt', 'answer': 'answer'}])
+    monkeypatch.setattr(flash_cards, 'flash_cards_model', model)
+    monkeypatch.setattr(settings, 'GEMINI_MAX_CONCURRENT_CALLS', 4)
+
+    responses, duration = asyncio.run(requestFlashCards(8))
+    assert all(response.status_code == 200 for response in responses)
+    # the calls beyond the cap wait for a turn instead of failing
+    assert model.max_calls_in_flight == 4
+    assert duration >= 2 * MODEL_LATENCY
+
+
+def test_every_event_loop_waits_on_its_own_model_call_semaphore():
+    async def getSemaphores():
+        return gemini.getModelCallSemaphore(), gemini.getModelCallSemaphore()
+
+    semaphore, same_semaphore = asyncio.run(getSemaphores())
+    other_semaphore, _ = asyncio.run(getSemaphores())
+    # a semaphore made at import would be bound to the first loop that waited on it
+    assert semaphore is same_semaphore
+    assert other_semaphore is not semaphore
+
+
+def test_multiple_choice_questions_are_generated_once_and_shuffled_every_time(monkeypatch):
+    question = {'question': 'question', 'answer': 'answer', 'wrong_answers': [f'wrong answer {i}' for i in range(3)]}
+    model = FakeSlowModel([question])
+    monkeypatch.setattr(multiple_choice_questions, 'mcq_model', model)
+
+    async def requestQuestions():
+        params = {'no_of_questions': 1, 'content': 'Some content'}
+        first_responses, _ = await requestConcurrently('/ai/get-multiple-choice-questions', [params])
+        # the same content, up to whitespace, is served from the cache
+        responses, _ = await requestConcurrently('/ai/get-multiple-choice-questions', [{**params, 'content': ' Some  content\n'}] * 20)
+        return first_responses + responses
+    responses = asyncio.run(requestQuestions())
+
+    assert model.no_of_calls == 1
+    questions = [response.json()['questions'][0] for response in responses]
+    assert all(question['choices'][question['correct_choice']] == 'answer' for question in questions)
+    assert len({tuple(question['choices']) for question in questions}) > 1
@@ -0,0 +1,44 @@
+import asyncio
+
+import bcrypt
+from starlette.requests import Request
+
+from auth_bearer import JWTBearer
+from model_utils import getCurrentTimestamp
+from routers.auth import RefreshTokenRequest, refresh_token
+from utils import auth_utils
+
+
+def test_logins_rehash_passwords_hashed_at_another_cost(run_api, monkeypatch):
+    monkeypatch.setattr(auth_utils, 'password_hash_cost', 5)
+
+    async def scenario(api):
+        password_hash = bcrypt.hashpw(b'password', bcrypt.gensalt(4)).decode('utf-8')
+        new_user = await api.mongodb["users"].insert_one({"name": "Test User", "email": "test@test.com", "password_hash": password_hash,
+                                                          "is_active": True, "is_verified": False, "created_at": getCurrentTimestamp()})
+
+        response = await api.client.post('/login', json={'email': 'test@test.com', 'password': 'password'})
+        assert response.status_code == 200
+        user = await api.mongodb["users"].find_one({"_id": new_user.inserted_id})
+        assert auth_utils.getPasswordHashCost(user["password_hash"]) == 5
+        assert bcrypt.checkpw(b'password', user["password_hash"].encode('utf-8'))
+
+        # the new hash still logs the user in, and isn't hashed again
+        response = await api.client.post('/login', json={'email': 'test@test.com', 'password': 'password'})
+        assert response.status_code == 200
+        assert (await api.mongodb["users"].find_one({"_id": new_user.inserted_id}))["password_hash"] == user["password_hash"]
+
+    run_api(scenario)
+
+
+def test_the_bearer_and_refresh_token_share_the_verified_tokens():
+    token = auth_utils.generateJWTToken('user', seconds_to_expiry=60)
+    auth_utils.VERIFIED_TOKEN_CACHE.clear()
+    response = asyncio.run(refresh_token(RefreshTokenRequest(refresh_token=token)))
+    assert response.status_code == 200
+    assert token in auth_utils.VERIFIED_TOKEN_CACHE
+
+    # the request is authenticated by the payload verified to refresh, it isn't decoded again
+    verified_payload = auth_utils.VERIFIED_TOKEN_CACHE[token]
+    request = Request({'type': 'http', 'headers': [(b'authorization', f'Bearer {token}'.encode())]})
+    assert asyncio.run(JWTBearer()(request)) is verified_payload
@@ -0,0 +1,88 @@
+import asyncio
+import os
+from typing import Awaitable, Callable, Sequence
+
+import pytest
+
+# the settings are read on import, the tests don't need real ones
+for name, value in {'JWT_SECRET_KEY': 'test-secret', 'JWT_ALGORITHM': 'HS256', 'MONGODB_URL': 'mongodb://localhost:27017',
+                    'DB_NAME': 'arbora', 'GOOGLE_AI_API_KEY': 'test-key'}.items():
+    os.environ.setdefault(name, value)
+
+from bson import ObjectId
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import MongoClient, monitoring
+from pymongo.errors import PyMongoError
+
+from utils.auth_utils import generateJWTToken
+from mongo_stats_utils import MongoStatsListener, MongoStatsMiddleware
+from index_utils import createIndexes
+from routers.auth import auth_router
+from routers.document import document_router
+from routers.user import user_router
+
+# the router tests run against a real mongodb, set TEST_MONGODB_URL to point them at one
+TEST_MONGODB_URL = os.environ.get('TEST_MONGODB_URL', 'mongodb://localhost:27017')
+TEST_DB_NAME = 'arbora_test_' + str(ObjectId())
+
+
+def isMongoAvailable() -> bool:
+    client = MongoClient(TEST_MONGODB_URL, serverSelectionTimeoutMS=1000)
+    try:
+        client.admin.command('ping')
+        return True
+    except PyMongoError:
+        return False
+    finally:
+        client.close()
+
+
+MONGO_AVAILABLE = isMongoAvailable()
+
+
+class ApiHarness:
+    """
+    An app with the routers under test on a throwaway database, and a client to call it with.
+    """
+
+    def __init__(self, mongodb_client: AsyncIOMotorClient, app: FastAPI, client: AsyncClient):
+        self.mongodb_client = mongodb_client
+        self.app = app
+        self.mongodb = app.mongodb
+        self.client = client
+
+    async def createUser(self) -> tuple[str, dict[str, str]]:
+        """
+        Inserts a user and returns their id and the headers to make requests as them.
+        """
+        new_user = await self.mongodb["users"].insert_one({"name": "Test User", "email": f"{ObjectId()}@test.com"})
+        user_id = str(new_user.inserted_id)
+        return user_id, {"Authorization": f"Bearer {generateJWTToken(user_id)}"}
+
+
+@pytest.fixture
+def run_api() -> Callable[..., object]:
+    if not MONGO_AVAILABLE:
+        pytest.skip(f'no mongodb at {TEST_MONGODB_URL}')
+
+    async def runScenario(scenario: Callable[[ApiHarness], Awaitable], event_listeners: Sequence[monitoring.CommandListener]) -> object:
+        # the mongo operations of every request are counted as they are in debug
+        mongodb_client = AsyncIOMotorClient(TEST_MONGODB_URL, event_listeners=[MongoStatsListener(), *event_listeners])
+        app = FastAPI()
+        app.add_middleware(MongoStatsMiddleware)
+        app.include_router(auth_router)
+        app.include_router(user_router)
+        app.include_router(document_router)
+        app.mongodb = mongodb_client[TEST_DB_NAME]
+        # the indexes are declared as they are on startup
+        await createIndexes(app.mongodb)
+        try:
+            async with AsyncClient(transport=ASGITransport(app=app), base_url='http://test') as client:
+                return await scenario(ApiHarness(mongodb_client, app, client))
+        finally:
+            await mongodb_client.drop_database(TEST_DB_NAME)
+            mongodb_client.close()
+
+    return lambda scenario, event_listeners=(): asyncio.run(runScenario(scenario, event_listeners))
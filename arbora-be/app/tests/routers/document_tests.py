@@ -0,0 +1,388 @@
+import asyncio
+import json
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from config import settings
+from markdown_utils import generateNewDocumentNotes
+from models.document import Document
+from note import NoteReview
+from note_review_utils import createRecallState
+from note_storage_utils import findDocument
+from study_queue_utils import NOTE_SCHEDULE_COLLECTION, generateNoteScheduleEntries, updateNoteSchedule
+
+
+async def insertDocument(api, user_id: str, content: str) -> str:
+    document = Document(creator_id=user_id, title='Test', notes=generateNewDocumentNotes(content), content=content)
+    new_document = await api.mongodb["documents"].insert_one(document.dict(by_alias=True, exclude={"id"}))
+    return str(new_document.inserted_id)
+
+
+def test_parallel_reviews_are_not_lost(run_api):
+    async def scenario(api):
+        user_id, headers = await api.createUser()
+        document_id = await insertDocument(api, user_id, '# Heading 1\nContent\n## Heading 1.1\nMore content\n# Heading 2\n')
+        note_ids = ['1', '1.1', '2']
+
+        responses = await asyncio.gather(*[
+            api.client.post('/record-note-review', headers=headers, json={
+                'document_id': document_id, 'note_id': note_ids[i % len(note_ids)], 'review_type': 'flash_cards', 'score': i / 60
+            }) for i in range(60)
+        ])
+        assert all(response.status_code == 200 for response in responses)
+
+        document = await api.mongodb["documents"].find_one({"_id": ObjectId(document_id)})
+        for note_id in note_ids:
+            note = document["notes"][note_id]
+            assert len(note["reviews"]) == 20
+            # the recall state kept up to date with every review is the same as one worked out from all of them
+            expected_state = createRecallState([NoteReview(**review) for review in note["reviews"]])
+            assert note["recall_state"]["reference_timestamp"] == pytest.approx(expected_state.reference_timestamp)
+            assert {review_type: accumulator for review_type, accumulator in note["recall_state"]["accumulators"].items() if accumulator} == \
+                   pytest.approx(expected_state.accumulators)
+        # the dotted note ids are not split into nested fields
+        assert set(document["notes"].keys()) == set(note_ids)
+
+    run_api(scenario)
+
+
+@pytest.mark.parametrize('overrides, expected_status, expected_message', [
+    ({'note_id': '3'}, 404, 'Note not found'),
+    ({'score': 2}, 400, 'Invalid score'),
+    ({'review_type': 'dancing'}, 400, 'Invalid review type'),
+    ({'document_id': '000000000000000000000000'}, 404, 'Document not found'),
+])
+def test_invalid_reviews_are_rejected(run_api, overrides, expected_status, expected_message):
+    async def scenario(api):
+        user_id, headers = await api.createUser()
+        document_id = await insertDocument(api, user_id, '# Heading 1\nContent\n')
+        response = await api.client.post('/record-note-review', headers=headers, json={
+            'document_id': document_id, 'note_id': '1', 'review_type': 'flash_cards', 'score': 0.5, **overrides
+        })
+        assert response.status_code == expected_status
+        assert response.json()['message'] == expected_message
+
+        document = await api.mongodb["documents"].find_one({})
+        assert document["notes"]["1"]["reviews"] == []
+
+    run_api(scenario)
+
+
+def test_reviews_of_another_users_document_are_unauthorized(run_api):
+    async def scenario(api):
+        owner_id, _ = await api.createUser()
+        _, headers = await api.createUser()
+        document_id = await insertDocument(api, owner_id, '# Heading 1\nContent\n')
+        response = await api.client.post('/record-note-review', headers=headers, json={
+            'document_id': document_id, 'note_id': '1', 'review_type': 'flash_cards', 'score': 0.5
+        })
+        assert response.status_code == 401
+
+    run_api(scenario)
+
+
+def test_batch_reviews_report_per_entry_results(run_api):
+    async def scenario(api):
+        user_id, headers = await api.createUser()
+        other_user_id, _ = await api.createUser()
+        document_id = await insertDocument(api, user_id, '# Heading 1\nContent\n## Heading 1.1\nMore content\n')
+        other_document_id = await insertDocument(api, user_id, '# Heading 1\nContent\n')
+        foreign_document_id = await insertDocument(api, other_user_id, '# Heading 1\nContent\n')
+
+        entries = [
+            (document_id, '1', 'multiple_choice_questions', 1),
+            (document_id, '1.1', 'multiple_choice_questions', 0.5),
+            (document_id, '1.1', 'flash_cards', 0),
+            (other_document_id, '1', 'flash_cards', 1),
+            (document_id, '2', 'flash_cards', 1),
+            (document_id, '1', 'dancing', 1),
+            (document_id, '1', 'flash_cards', 3),
+            (foreign_document_id, '1', 'flash_cards', 1),
+            ('not-an-id', '1', 'flash_cards', 1),
+        ]
+        response = await api.client.post('/record-note-reviews', headers=headers, json={'reviews': [
+            {'document_id': entry_document_id, 'note_id': note_id, 'review_type': review_type, 'score': score}
+            for entry_document_id, note_id, review_type, score in entries
+        ]})
+        assert response.status_code == 200
+        body = response.json()
+        assert not body['is_successful']
+        assert [result['message'] for result in body['results']] == ['Note review recorded successfully'] * 4 + [
+            'Note not found', 'Invalid review type', 'Invalid score', 'Unauthorized', 'Document not found']
+
+        document = await api.mongodb["documents"].find_one({"_id": ObjectId(document_id)})
+        assert [review['score'] for review in document["notes"]["1"]["reviews"]] == [1]
+        assert [review['score'] for review in document["notes"]["1.1"]["reviews"]] == [0.5, 0]
+        other_document = await api.mongodb["documents"].find_one({"_id": ObjectId(other_document_id)})
+        assert len(other_document["notes"]["1"]["reviews"]) == 1
+        foreign_document = await api.mongodb["documents"].find_one({"_id": ObjectId(foreign_document_id)})
+        assert foreign_document["notes"]["1"]["reviews"] == []
+
+    run_api(scenario)
+
+
+def test_study_queue_returns_the_least_recalled_notes_first(run_api):
+    async def scenario(api):
+        user_id, headers = await api.createUser()
+        document_ids = []
+        for content in ['# Heading 1\nContent\n## Heading 1.1\nMore content\n', '# Other heading\nOther content\n']:
+            response = await api.client.post('/create-document', headers=headers, json={'content': content})
+            document_ids.append(response.json()['document']['id'])
+
+        response = await api.client.post('/record-note-reviews', headers=headers, json={'reviews': [
+            {'document_id': document_ids[0], 'note_id': '1', 'review_type': 'chat', 'score': 1},
+            {'document_id': document_ids[1], 'note_id': '1', 'review_type': 'flash_cards', 'score': 0.6},
+        ]})
+        assert response.json()['is_successful']
+
+        response = await api.client.get('/study-queue', headers=headers, params={'limit': 3})
+        assert response.status_code == 200
+        notes = response.json()['notes']
+        # the note reviewed in chat is recalled the best, and its child better than the note barely reviewed with flash cards
+        assert [(note['document_id'], note['note_id']) for note in notes] == [
+            (document_ids[1], '1'), (document_ids[0], '1.1'), (document_ids[0], '1')]
+        assert [note['recall_probability'] for note in notes] == sorted(note['recall_probability'] for note in notes)
+
+        response = await api.client.get('/study-queue', headers=headers, params={'limit': 1000})
+        assert response.status_code == 400
+
+    run_api(scenario)
+
+
+def test_stale_note_schedules_do_not_overwrite_later_ones(run_api):
+    async def scenario(api):
+        user_id, headers = await api.createUser()
+        document_id = await insertDocument(api, user_id, '# Heading 1\nContent\n')
+        document = await api.mongodb["documents"].find_one({"_id": ObjectId(document_id)})
+        reviewed_document = {**document, "version": 3, "notes": {"1": {**document["notes"]["1"], "recall_state": createRecallState(
+            [NoteReview(review_type='chat', score=1, timestamp=datetime.now())]).model_dump()}}}
+
+        # the schedule of the review is written before the one of the edit it was made after
+        await updateNoteSchedule(api.mongodb, reviewed_document, {"1"})
+        await updateNoteSchedule(api.mongodb, {**document, "version": 2})
+        entry = await api.mongodb[NOTE_SCHEDULE_COLLECTION].find_one({"_id": f"{document_id}/1"})
+        assert entry["version"] == 3 and entry["next_due"] > 0
+
+    run_api(scenario)
+
+
+@pytest.mark.parametrize('notes_in_collection', [False, True])
+def test_reviewed_notes_are_rescheduled_from_the_notes_the_reviews_left(run_api, monkeypatch, notes_in_collection):
+    monkeypatch.setattr(settings, 'NOTES_IN_COLLECTION', notes_in_collection)
+
+    async def scenario(api):
+        user_id, headers = await api.createUser()
+        content = '# Heading 1\nContent\n## Heading 1.1\n### Heading 1.1.1\n## Heading 1.2\n# Heading 2\n## Heading 2.1\n'
+        response = await api.client.post('/create-document', headers=headers, json={'content': content})
+        document_id = response.json()['document']['id']
+
+        response = await api.client.post('/record-note-review', headers=headers, json={
+            'document_id': document_id, 'note_id': '1', 'review_type': 'chat', 'score': 1})
+        assert response.status_code == 200
+        response = await api.client.post('/record-note-reviews', headers=headers, json={'reviews': [
+            {'document_id': document_id, 'note_id': '1.1', 'review_type': 'flash_cards', 'score': 0.5},
+            {'document_id': document_id, 'note_id': '2', 'review_type': 'multiple_choice_questions', 'score': 1},
+        ]})
+        assert response.json()['is_successful']
+
+        # only the reviewed notes and their branches are read back from the writes, the schedule is the one of the whole document
+        document = await findDocument(api.mongodb, {"_id": ObjectId(document_id)})
+        expected_entries = {entry.pop("_id"): entry for entry in generateNoteScheduleEntries(document)}
+        entries = {entry.pop("_id"): entry async for entry in api.mongodb[NOTE_SCHEDULE_COLLECTION].find({"document_id": document_id})}
+        # the entries of the notes that weren't rescheduled keep the version of the review before
+        assert {note_id: entry.pop("version") for note_id, entry in entries.items()} == {
+            f"{document_id}/{note_id}": 2 if note_id in {'1.1', '1.1.1', '2', '2.1'} else 1 for note_id in document["notes"]}
+        for entry in expected_entries.values():
+            del entry["version"]
+        assert entries == expected_entries
+
+    run_api(scenario)
+
+
+def test_document_summaries_are_paginated_newest_first(run_api):
+    async def scenario(api):
+        user_id, headers = await api.createUser()
+        other_user_id, _ = await api.createUser()
+        document_ids = [await insertDocument(api, user_id, f'# Heading {i}\nContent\n## Subheading\nMore content\n') for i in range(5)]
+        await insertDocument(api, other_user_id, '# Heading\nContent\n')
+
+        pages = []
+        cursor = None
+        while True:
+            response = await api.client.get('/list-document-summaries', headers=headers,
+                                            params={'limit': 2, **({'cursor': cursor} if cursor else {})})
+            assert response.status_code == 200
+            body = response.json()
+            pages.append([document['id'] for document in body['documents']])
+            cursor = body['next_cursor']
+            if cursor is None:
+                break
+        assert pages == [document_ids[4:2:-1], document_ids[2:0:-1], document_ids[:1]]
+
+        # only the structure and recall of the notes are given, not their content or history
+        summary = body['documents'][0]
+        assert set(summary['notes'].keys()) == {'1', '1.1'}
+        assert summary['notes']['1'] == {'title': 'Heading 0', 'level': 1, 'children': ['1.1'], 'recall_probability': 0}
+        assert 'content' not in summary
+
+        response = await api.client.get('/list-document-summaries', headers=headers, params={'cursor': 'not-an-id'})
+        assert response.status_code == 400
+
+    run_api(scenario)
+
+
+def test_get_document_returns_the_full_document_of_its_owner(run_api):
+    async def scenario(api):
+        user_id, headers = await api.createUser()
+        _, other_headers = await api.createUser()
+        document_id = await insertDocument(api, user_id, '# Heading 1\nContent\n')
+
+        response = await api.client.get('/get-document', headers=headers, params={'id': document_id})
+        assert response.status_code == 200
+        document = response.json()['document']
+        assert document['content'] == '# Heading 1\nContent\n'
+        assert document['notes']['1']['reviews'] == []
+
+        response = await api.client.get('/get-document', headers=other_headers, params={'id': document_id})
+        assert response.status_code == 401
+        response = await api.client.get('/get-document', headers=headers, params={'id': '000000000000000000000000'})
+        assert response.status_code == 404
+
+    run_api(scenario)
+
+
+def test_streamed_document_listing_has_a_line_per_document(run_api):
+    async def scenario(api):
+        user_id, headers = await api.createUser()
+        document_ids = [await insertDocument(api, user_id, f'# Heading {i}\nContent\n') for i in range(3)]
+
+        response = await api.client.get('/list-documents', headers=headers, params={'stream': True})
+        assert response.status_code == 200
+        assert response.headers['content-type'].startswith('application/x-ndjson')
+        documents = [json.loads(line) for line in response.text.splitlines()]
+        assert [document['id'] for document in documents] == document_ids
+        assert all('recall_probability' in document['notes']['1'] for document in documents)
+
+    run_api(scenario)
+
+
+def test_unchanged_documents_are_not_modified(run_api):
+    async def scenario(api):
+        user_id, headers = await api.createUser()
+        document_id = await insertDocument(api, user_id, '# Heading 1\nContent\n')
+
+        for url, params in [('/get-document', {'id': document_id}), ('/list-documents', {}), ('/list-documents', {'stream': True}),
+                            ('/list-document-summaries', {'limit': 10})]:
+            response = await api.client.get(url, headers=headers, params=params)
+            assert response.status_code == 200
+            etag = response.headers['etag']
+            response = await api.client.get(url, headers={**headers, 'If-None-Match': etag}, params=params)
+            assert response.status_code == 304
+            assert response.content == b''
+
+        # a review changes the version of the document, and so its etag
+        response = await api.client.get('/get-document', headers=headers, params={'id': document_id})
+        etag = response.headers['etag']
+        await api.client.post('/record-note-review', headers=headers, json={
+            'document_id': document_id, 'note_id': '1', 'review_type': 'flash_cards', 'score': 0.5})
+        response = await api.client.get('/get-document', headers={**headers, 'If-None-Match': etag}, params={'id': document_id})
+        assert response.status_code == 200
+        assert response.json()['document']['version'] == 1
+        assert response.headers['etag'] != etag
+
+    run_api(scenario)
+
+
+def test_edits_of_a_changed_document_are_rejected(run_api):
+    async def scenario(api):
+        _, headers = await api.createUser()
+        response = await api.client.post('/create-document', headers=headers, json={'content': '# Heading 1\nContent\n'})
+        document = response.json()['document']
+        assert document['version'] == 1
+
+        response = await api.client.put('/update-document', headers=headers, json={
+            'id': document['id'], 'content': '# Heading 1\nNew content\n', 'expected_version': 1})
+        assert response.status_code == 200
+        assert response.json()['document']['version'] == 2
+
+        # an edit made to the version before is rejected, and the document isn't changed
+        response = await api.client.put('/update-document', headers=headers, json={
+            'id': document['id'], 'content': '# Heading 1\nOther content\n', 'expected_version': 1})
+        assert response.status_code == 409
+        stored_document = await api.mongodb["documents"].find_one({"_id": ObjectId(document['id'])})
+        assert stored_document['content'] == '# Heading 1\nNew content\n'
+        assert stored_document['version'] == 2
+
+    run_api(scenario)
+
+
+def test_sync_returns_only_the_changes_since_the_last_one(run_api):
+    async def scenario(api):
+        user_id, headers = await api.createUser()
+        document_ids = [await insertDocument(api, user_id, f'# Heading {i}\nContent\n') for i in range(3)]
+
+        response = await api.client.get('/sync', headers=headers)
+        assert response.status_code == 200
+        body = response.json()
+        assert body['is_full_sync']
+        assert [document['id'] for document in body['documents']] == document_ids
+
+        # the changes of the last few seconds are sent again, so the documents are made older as they would be a while later
+        token = body['token']
+        await api.mongodb["documents"].update_many({}, {"$set": {"updated_at": datetime(2024, 1, 1)}})
+        await api.client.post('/record-note-review', headers=headers, json={
+            'document_id': document_ids[0], 'note_id': '1', 'review_type': 'flash_cards', 'score': 0.5})
+        await api.client.request('DELETE', '/delete-document', headers=headers, json={'id': document_ids[1]})
+
+        response = await api.client.get('/sync', headers=headers, params={'token': token})
+        assert response.status_code == 200
+        body = response.json()
+        assert not body['is_full_sync']
+        assert [document['id'] for document in body['documents']] == [document_ids[0]]
+        assert len(body['documents'][0]['notes']['1']['reviews']) == 1
+        assert body['deleted_document_ids'] == [document_ids[1]]
+
+        response = await api.client.get('/sync', headers=headers, params={'token': 'not-a-token'})
+        assert response.status_code == 400
+
+    run_api(scenario)
+
+
+def test_documents_with_their_notes_in_the_notes_collection_are_read_and_written_whole(run_api, monkeypatch):
+    monkeypatch.setattr(settings, 'NOTES_IN_COLLECTION', True)
+
+    async def scenario(api):
+        user_id, headers = await api.createUser()
+        response = await api.client.post('/create-document', headers=headers, json={'content': '# Heading 1\nContent\n# Heading 2\nContent\n'})
+        document_id = response.json()['document']['id']
+        stored_document = await api.mongodb["documents"].find_one({"_id": ObjectId(document_id)})
+        assert stored_document['notes'] == {}
+        assert await api.mongodb["notes"].count_documents({"document_id": ObjectId(document_id)}) == 2
+
+        response = await api.client.post('/record-note-review', headers=headers, json={
+            'document_id': document_id, 'note_id': '2', 'review_type': 'flash_cards', 'score': 0.5})
+        assert response.status_code == 200
+        response = await api.client.post('/record-note-reviews', headers=headers, json={'reviews': [
+            {'document_id': document_id, 'note_id': note_id, 'review_type': 'flash_cards', 'score': 1} for note_id in ['1', '3']]})
+        assert [result['message'] for result in response.json()['results']] == ['Note review recorded successfully', 'Note not found']
+
+        # the edit only writes the note it changed, the reviews of the others are kept
+        response = await api.client.put('/update-document', headers=headers, json={
+            'id': document_id, 'content': '# Heading 1\nNew content\n# Heading 2\nContent\n'})
+        assert response.status_code == 200
+        response = await api.client.get('/get-document', headers=headers, params={'id': document_id})
+        document = response.json()['document']
+        assert [note['content'] for note in document['notes'].values()] == ['New content', 'Content']
+        assert [len(note['reviews']) for note in document['notes'].values()] == [1, 1]
+        assert document['version'] == 4
+
+        response = await api.client.get('/list-document-summaries', headers=headers)
+        assert [note['title'] for note in response.json()['documents'][0]['notes'].values()] == ['Heading 1', 'Heading 2']
+
+        response = await api.client.request('DELETE', '/delete-document', headers=headers, json={'id': document_id})
+        assert response.status_code == 200
+        assert await api.mongodb["notes"].count_documents({}) == 0
+
+    run_api(scenario)
@@ -0,0 +1,71 @@
+from mongo_stats_utils import MONGO_OPERATIONS_HEADER
+
+
+def test_endpoints_make_the_fewest_round_trips(run_api):
+    async def scenario(api):
+        user_id, headers = await api.createUser()
+        _, other_headers = await api.createUser()
+
+        async def request(method: str, url: str, expected_status: int, request_headers: dict = None, **kwargs) -> dict:
+            response = await api.client.request(method, url, headers=request_headers or headers, **kwargs)
+            assert response.status_code == expected_status, (url, response.text)
+            no_of_operations[url if url not in no_of_operations else f'{url} again'] = int(response.headers[MONGO_OPERATIONS_HEADER])
+            return response
+
+        no_of_operations = {}
+        await request('POST', '/create-user', 201, json={'name': 'Test User', 'email': 'round.trips@test.com', 'password': 'password',
+                                                         'password_confirmation': 'password'})
+        await request('POST', '/create-user', 400, json={'name': 'Test User', 'email': 'round.trips@test.com', 'password': 'password',
+                                                         'password_confirmation': 'password'})
+        await request('POST', '/login', 200, json={'email': 'round.trips@test.com', 'password': 'password'})
+        await request('GET', '/get-user', 200)
+
+        response = await request('POST', '/create-document', 201, json={'content': '# Heading 1\nContent\n## Heading 1.1\nMore content\n'})
+        document_id = response.json()['document']['id']
+        response = await request('GET', '/get-document', 200, params={'id': document_id})
+        await request('GET', '/get-document', 304, request_headers={**headers, 'If-None-Match': response.headers['etag']},
+                      params={'id': document_id})
+        await request('PUT', '/update-document', 200, json={'id': document_id, 'content': '# Heading 1\nNew content\n', 'expected_version': 1})
+        await request('POST', '/record-note-review', 200, json={'document_id': document_id, 'note_id': '1', 'review_type': 'chat', 'score': 1})
+
+        await request('POST', '/create-folder', 201, json={'name': 'Folder'})
+        folder_id = str((await api.mongodb["folders"].find_one({"creator_id": user_id}))["_id"])
+        await request('PUT', '/update-folder', 200, json={'id': folder_id, 'name': 'Renamed folder'})
+        await request('POST', '/add-document-to-folder', 200, json={'folder_id': folder_id, 'document_id': document_id})
+        await request('POST', '/add-document-to-folder', 400, json={'folder_id': folder_id, 'document_id': document_id})
+        await request('DELETE', '/delete-folder', 200, json={'id': folder_id})
+
+        await request('DELETE', '/delete-document', 401, request_headers=other_headers, json={'id': document_id})
+        await request('DELETE', '/delete-document', 200, json={'id': document_id})
+
+        assert no_of_operations == {
+            # a single insert, the unique index on the email rejects the second
+            '/create-user': 1,
+            '/create-user again': 1,
+            '/login': 1,
+            '/get-user': 1,
+            # the insert and the note schedule of the new document
+            '/create-document': 2,
+            '/get-document': 1,
+            # only the version is read
+            '/get-document again': 1,
+            # the read of the content to diff against, the write, and the removal of the schedule entry of the removed note, the
+            # note that is left only had its content changed and keeps its entry
+            '/update-document': 3,
+            # the review appended in place, and the schedule of the note reviewed
+            '/record-note-review': 2,
+            '/create-folder': 1,
+            '/update-folder': 1,
+            # the owner of the folder, and the move filtered by the owner of the document
+            '/add-document-to-folder': 2,
+            # and the read of why the move didn't match
+            '/add-document-to-folder again': 3,
+            # the deletion and its tombstone
+            '/delete-folder': 2,
+            # the deletion filtered by the owner, and the read of why it didn't match
+            '/delete-document': 2,
+            # the deletion, the note schedule entries and the tombstone
+            '/delete-document again': 3,
+        }
+
+    run_api(scenario)
@@ -0,0 +1,111 @@
+import copy
+
+from typing import Optional
+
+from pymongo import monitoring
+
+# the commands that read or write existing items, the ones a collection scan can be planned for
+EXPLAINABLE_COMMANDS = {"find", "update", "delete", "findAndModify", "aggregate", "count", "distinct"}
+# the fields added to every command by the driver, that explain doesn't take
+DRIVER_FIELDS = {"lsid", "$db", "$clusterTime", "$readPreference", "txnNumber", "writeConcern", "apiVersion", "apiStrict",
+                 "apiDeprecationErrors"}
+
+
+class CommandRecorder(monitoring.CommandListener):
+    """
+    Records the commands sent to a database, to explain them once a scenario has run.
+    """
+
+    def __init__(self):
+        self.database_name: Optional[str] = None
+        self.commands = []
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        if event.database_name == self.database_name and event.command_name in EXPLAINABLE_COMMANDS:
+            self.commands.append({field: value for field, value in copy.deepcopy(dict(event.command)).items() if field not in DRIVER_FIELDS})
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        pass
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        pass
+
+
+def splitStatements(command: dict) -> list[dict]:
+    # explain takes a single statement of an update or delete, bulk writes send many at once
+    for statements_field in ("updates", "deletes"):
+        if statements_field in command:
+            return [{**command, statements_field: [statement]} for statement in command[statements_field]]
+    return [command]
+
+
+def findCollectionScans(plan, path: str = '') -> list[str]:
+    """
+    Returns the paths of the COLLSCAN stages of the winning plan of an explain, the plans it rejected aren't looked at.
+    """
+    if isinstance(plan, list):
+        return [scan for index, item in enumerate(plan) for scan in findCollectionScans(item, f'{path}[{index}]')]
+    if not isinstance(plan, dict):
+        return []
+    scans = [path] if plan.get('stage') == 'COLLSCAN' else []
+    return scans + [scan for field, value in plan.items() if field != 'rejectedPlans'
+                    for scan in findCollectionScans(value, f'{path}.{field}')]
+
+
+def test_no_router_query_scans_a_collection(run_api):
+    recorder = CommandRecorder()
+
+    async def scenario(api):
+        recorder.database_name = api.mongodb.name
+        # a user signs up and logs in
+        email = 'query.plans@test.com'
+        response = await api.client.post('/create-user', json={'name': 'Test User', 'email': email, 'password': 'password',
+                                                                'password_confirmation': 'password'})
+        assert response.status_code == 201
+        response = await api.client.post('/login', json={'email': email, 'password': 'password'})
+        assert response.status_code == 200
+        headers = {'Authorization': f'Bearer {response.json()["access_token"]}'}
+        assert (await api.client.get('/get-user', headers=headers)).status_code == 200
+
+        # and uses every document and folder endpoint
+        document_ids = []
+        for content in ['# Heading 1\nContent\n## Heading 1.1\nMore content\n', '# Other heading\nOther content\n']:
+            response = await api.client.post('/create-document', headers=headers, json={'content': content})
+            document_ids.append(response.json()['document']['id'])
+        response = await api.client.get('/list-documents', headers=headers)
+        await api.client.get('/list-documents', headers={**headers, 'If-None-Match': response.headers['etag']})
+        await api.client.get('/list-documents', headers=headers, params={'stream': True})
+        response = await api.client.get('/list-document-summaries', headers=headers, params={'limit': 1})
+        await api.client.get('/list-document-summaries', headers={**headers, 'If-None-Match': response.headers['etag']},
+                             params={'limit': 1, 'cursor': response.json()['next_cursor']})
+        response = await api.client.get('/get-document', headers=headers, params={'id': document_ids[0]})
+        await api.client.get('/get-document', headers={**headers, 'If-None-Match': response.headers['etag']}, params={'id': document_ids[0]})
+        await api.client.put('/update-document', headers=headers, json={'id': document_ids[0], 'content': '# Heading 1\nNew content\n',
+                                                                        'expected_version': 1})
+        await api.client.post('/record-note-review', headers=headers, json={
+            'document_id': document_ids[0], 'note_id': '1', 'review_type': 'flash_cards', 'score': 0.5})
+        await api.client.post('/record-note-review', headers=headers, json={
+            'document_id': document_ids[0], 'note_id': '9', 'review_type': 'flash_cards', 'score': 0.5})
+        await api.client.post('/record-note-reviews', headers=headers, json={'reviews': [
+            {'document_id': document_id, 'note_id': '1', 'review_type': 'chat', 'score': 1} for document_id in document_ids]})
+        await api.client.get('/study-queue', headers=headers)
+        response = await api.client.get('/sync', headers=headers)
+        await api.client.get('/sync', headers=headers, params={'token': response.json()['token']})
+
+        await api.client.post('/create-folder', headers=headers, json={'name': 'Folder'})
+        response = await api.client.get('/list-folders', headers=headers)
+        folder_id = response.json()['folders'][0]['id']
+        await api.client.put('/update-folder', headers=headers, json={'id': folder_id, 'name': 'Renamed folder'})
+        await api.client.post('/add-document-to-folder', headers=headers, json={'folder_id': folder_id, 'document_id': document_ids[1]})
+        await api.client.request('DELETE', '/delete-folder', headers=headers, json={'id': folder_id})
+        await api.client.request('DELETE', '/delete-document', headers=headers, json={'id': document_ids[1]})
+
+        assert recorder.commands
+        collection_scans = []
+        for command in recorder.commands:
+            for statement in splitStatements(command):
+                explanation = await api.mongodb.command({'explain': statement, 'verbosity': 'queryPlanner'})
+                collection_scans += [f'{statement} scans at {path}' for path in findCollectionScans(explanation)]
+        assert not collection_scans, '\n'.join(collection_scans)
+
+    run_api(scenario, [recorder])
@@ -0,0 +1,57 @@
+import os
+
+# the settings are read on import, the tests don't need real ones
+for name, value in {'JWT_SECRET_KEY': 'test-secret', 'JWT_ALGORITHM': 'HS256', 'MONGODB_URL': 'mongodb://localhost:27017',
+                    'DB_NAME': 'arbora', 'GOOGLE_AI_API_KEY': 'test-key'}.items():
+    os.environ.setdefault(name, value)
+
+from unittest import mock
+
+import bcrypt
+
+from utils import auth_utils
+from utils.auth_utils import MAX_PASSWORD_HASH_COST, MIN_PASSWORD_HASH_COST, VERIFIED_TOKEN_CACHE, calibratePasswordHashCost, generateJWTToken, \
+    getPasswordHashCost, needsRehash, verifyJWTToken
+
+
+def test_tokens_are_only_decoded_the_first_time_they_are_verified():
+    token = generateJWTToken('user')
+    with mock.patch.object(auth_utils, 'decodeJWTToken', wraps=auth_utils.decodeJWTToken) as decodeJWTToken:
+        assert verifyJWTToken(token).user_id == 'user'
+        assert verifyJWTToken(token).user_id == 'user'
+    assert decodeJWTToken.call_count == 1
+
+
+def test_invalid_and_expired_tokens_are_not_verified():
+    assert verifyJWTToken(generateJWTToken('user')[:-2]) is None
+    assert verifyJWTToken(generateJWTToken('user', seconds_to_expiry=-1)) is None
+
+    # a token that expires after it was verified is dropped from the cache
+    token = generateJWTToken('user', seconds_to_expiry=60)
+    assert verifyJWTToken(token) is not None
+    with mock.patch.object(auth_utils.time, 'time', return_value=VERIFIED_TOKEN_CACHE[token].expires):
+        assert verifyJWTToken(token) is None
+    assert token not in VERIFIED_TOKEN_CACHE
+
+
+def test_verified_token_cache_keeps_the_most_recent_tokens(monkeypatch):
+    monkeypatch.setattr(auth_utils, 'VERIFIED_TOKEN_CACHE_SIZE', 4)
+    VERIFIED_TOKEN_CACHE.clear()
+    tokens = [generateJWTToken(f'user-{i}') for i in range(5)]
+    for token in tokens:
+        verifyJWTToken(token)
+    assert len(VERIFIED_TOKEN_CACHE) == 4
+    assert tokens[0] not in VERIFIED_TOKEN_CACHE and tokens[-1] in VERIFIED_TOKEN_CACHE
+
+
+def test_passwords_hashed_at_another_cost_need_rehashing(monkeypatch):
+    monkeypatch.setattr(auth_utils, 'password_hash_cost', 5)
+    password_hash = auth_utils._hashPassword('password')
+    assert getPasswordHashCost(password_hash) == 5
+    assert not needsRehash(password_hash)
+    assert needsRehash(bcrypt.hashpw(b'password', bcrypt.gensalt(4)).decode('utf-8'))
+
+
+def test_calibrated_cost_is_within_bounds():
+    assert calibratePasswordHashCost(0) == MIN_PASSWORD_HASH_COST
+    assert calibratePasswordHashCost(10 ** 9) == MAX_PASSWORD_HASH_COST
@@ -0,0 +1,85 @@
+import difflib
+import random
+
+import pytest
+from utils.document_utils import calculateContentEdit, calculateContentEditOpcodes, countContentEdit
+
+PARAGRAPH = "Photosynthesis is the process plants use to turn light, water and carbon dioxide into glucose and oxygen."
+DOCUMENT = "# Cells\nThe cell is the basic unit of life.\n## Organelles\nMitochondria produce energy for the cell.\nRibosomes build proteins.\n"
+
+# (before, after, (added, deleted)) as counted by the SequenceMatcher implementation calculateContentEdit used before, which
+# the smallest edit counts the same
+GOLDEN_EDITS = [
+    ("", "", (0, 0)),
+    (PARAGRAPH, PARAGRAPH, (0, 0)),
+    ("", PARAGRAPH, (105, 0)),
+    (PARAGRAPH, "", (0, 105)),
+    ("abc", "xyz", (3, 3)),
+    (PARAGRAPH, PARAGRAPH.replace("process", "mechanism"), (7, 5)),
+    (PARAGRAPH, PARAGRAPH.replace("glucose", "glucos"), (0, 1)),
+    (PARAGRAPH, PARAGRAPH.replace("plants", "green plants"), (6, 0)),
+    (PARAGRAPH, PARAGRAPH + " It happens in the chloroplasts.", (32, 0)),
+    (PARAGRAPH, "Note: " + PARAGRAPH, (6, 0)),
+    (PARAGRAPH, PARAGRAPH.replace(" and carbon dioxide", ""), (0, 19)),
+    (DOCUMENT, DOCUMENT.replace("basic", "fundamental"), (10, 4)),
+    (DOCUMENT, DOCUMENT.replace("Ribosomes build proteins.\n", ""), (0, 26)),
+    (DOCUMENT, DOCUMENT + "## Nucleus\nThe nucleus stores DNA.\n", (35, 0)),
+    (DOCUMENT, DOCUMENT.replace("## Organelles", "## Organelles of the cell"), (12, 0)),
+    (DOCUMENT, DOCUMENT.replace("\n## Organelles\n", "\n\n## Organelles\n"), (1, 0)),
+    (DOCUMENT * 20, (DOCUMENT * 20).replace("Mitochondria produce energy for the cell.", "Mitochondria make energy.", 1), (3, 19)),
+]
+
+# edits SequenceMatcher counted larger than the smallest edit, EDIT_COUNT_VERSION 2 counts them as the smallest
+DIVERGENT_EDITS = [
+    ("abcbdab", "bdcaba", (2, 3)),
+    ("kitten sitting on the mat", "sitting kitten on a mat", (6, 8)),
+    # the junk heuristic ignores characters in more than 1% of a text of 200 or more
+    ("abcd" * 60, "abce" * 60, (60, 60)),
+    (PARAGRAPH * 3, (PARAGRAPH * 3).replace("e", "E"), (24, 24)),
+    ("- item\n" * 40, "- item\n" * 20 + "- thing\n" + "- item\n" * 20, (8, 0)),
+    # the longest block is matched first, and everything around it is replaced
+    ("xyz" + "a" * 300, "a" * 300 + "xyz", (3, 3)),
+]
+
+
+def sequenceMatcherEditSize(before, after):
+    return sum((i2 - i1) + (j2 - j1) for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, before, after).get_opcodes() if tag != 'equal')
+
+
+@pytest.mark.parametrize("before, after, expected_edit", GOLDEN_EDITS + DIVERGENT_EDITS)
+def test_golden_edits(before, after, expected_edit):
+    assert calculateContentEdit(before, after) == expected_edit
+
+
+@pytest.mark.parametrize("before, after, expected_edit", GOLDEN_EDITS + DIVERGENT_EDITS)
+def test_max_cost_cutoff(before, after, expected_edit):
+    assert calculateContentEdit(before, after, max_cost=sum(expected_edit)) == expected_edit
+    if sum(expected_edit):
+        assert calculateContentEdit(before, after, max_cost=sum(expected_edit) - 1) is None
+
+
+def test_opcodes_cover_both_texts():
+    rng = random.Random(0)
+    for _ in range(200):
+        before = ''.join(rng.choices('ab \n#', k=rng.randint(0, 60)))
+        after = ''.join(rng.choices('ab \n#', k=rng.randint(0, 60)))
+        before_end, after_end = 0, 0
+        for tag, i1, i2, j1, j2 in calculateContentEditOpcodes(before, after):
+            assert (i1, j1) == (before_end, after_end)
+            if tag == 'equal':
+                assert before[i1:i2] == after[j1:j2]
+            before_end, after_end = i2, j2
+        assert (before_end, after_end) == (len(before), len(after))
+        # the edit is never larger than the one SequenceMatcher finds
+        assert sum(calculateContentEdit(before, after)) <= sequenceMatcherEditSize(before, after)
+
+
+def test_divergent_edits_are_counted_smaller_than_by_sequence_matcher():
+    for before, after, expected_edit in DIVERGENT_EDITS:
+        assert sum(expected_edit) < sequenceMatcherEditSize(before, after)
+        # the edit worked out as opcodes is counted the same
+        assert countContentEdit(calculateContentEditOpcodes(before, after)) == expected_edit
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,55 @@
+import asyncio
+import threading
+
+import pytest
+
+from utils.executor_utils import BoundedExecutor, ExecutorBusyError
+
+
+def test_calls_run_off_the_event_loop():
+    executor = BoundedExecutor(2, 2, 1)
+
+    async def runCalls():
+        return await asyncio.gather(*[executor.run(threading.get_ident) for _ in range(4)])
+    assert threading.get_ident() not in asyncio.run(runCalls())
+    executor.shutdown()
+
+
+def test_calls_beyond_the_queue_are_turned_away():
+    executor = BoundedExecutor(1, 1, 5)
+    release = threading.Event()
+
+    async def runCalls():
+        calls = [asyncio.ensure_future(executor.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0)
+        # one call runs and one waits for it, a third has no room
+        with pytest.raises(ExecutorBusyError):
+            await executor.run(release.wait)
+        release.set()
+        return await asyncio.gather(*calls)
+    assert asyncio.run(runCalls()) == [True, True]
+    assert executor.no_of_pending == 0
+    executor.shutdown()
+
+
+def test_queued_calls_time_out_but_running_ones_are_waited_for():
+    executor = BoundedExecutor(1, 1, 0.1)
+    release = threading.Event()
+    ran = []
+
+    def blockThenRecord(name):
+        release.wait()
+        ran.append(name)
+        return name
+
+    async def runCalls():
+        running = asyncio.ensure_future(executor.run(blockThenRecord, 'running'))
+        queued = asyncio.ensure_future(executor.run(blockThenRecord, 'queued'))
+        with pytest.raises(ExecutorBusyError):
+            await queued
+        release.set()
+        return await running
+    # the call that had a thread finished after the timeout, the one that didn't was never run
+    assert asyncio.run(runCalls()) == 'running'
+    assert ran == ['running']
+    executor.shutdown()
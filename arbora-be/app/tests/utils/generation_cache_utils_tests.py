@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+from pymongo.errors import ServerSelectionTimeoutError
+
+from utils import generation_cache_utils
+from utils.generation_cache_utils import GENERATION_CACHE, GENERATION_CACHE_COLLECTION, generateGenerationCacheKey, getCachedGeneration, \
+    getGenerationCacheStats
+
+
+class UnavailableCollection:
+    # a collection of a database that can't be reached
+    async def find_one(self, item_filter):
+        raise ServerSelectionTimeoutError('unavailable')
+
+    async def replace_one(self, item_filter, item, upsert=False):
+        raise ServerSelectionTimeoutError('unavailable')
+
+
+class FakeCollection:
+    # a collection of generations kept in a dict by their _id
+    def __init__(self):
+        self.items = {}
+
+    async def find_one(self, item_filter):
+        return self.items.get(item_filter["_id"])
+
+    async def replace_one(self, item_filter, item, upsert=False):
+        self.items[item_filter["_id"]] = {"_id": item_filter["_id"], **item}
+
+
+@pytest.fixture(autouse=True)
+def emptyCache(monkeypatch):
+    monkeypatch.setattr(generation_cache_utils, 'GENERATION_CACHE_STATS', generation_cache_utils.Counter())
+    GENERATION_CACHE.clear()
+    yield
+    GENERATION_CACHE.clear()
+
+
+def generateItems(calls: list):
+    async def generate():
+        calls.append(len(calls))
+        return [{"prompt": f"prompt {len(calls)}", "answer": "answer"}]
+    return generate
+
+
+def test_keys_ignore_whitespace_but_not_what_was_generated():
+    key = generateGenerationCacheKey("flash_cards", "model", 1, "Some  content\n", 3)
+    assert generateGenerationCacheKey("flash_cards", "model", 1, " Some content", 3) == key
+    assert generateGenerationCacheKey("flash_cards", "model", 1, "Some other content", 3) != key
+    assert generateGenerationCacheKey("flash_cards", "model", 2, "Some content", 3) != key
+    assert generateGenerationCacheKey("flash_cards", "model", 1, "Some content", 4) != key
+    assert generateGenerationCacheKey("open_ended_questions", "model", 1, "Some content", 3) != key
+
+
+def test_generations_are_read_from_the_process_then_from_mongo():
+    calls = []
+    mongodb = {GENERATION_CACHE_COLLECTION: FakeCollection()}
+
+    async def lookUp(bypass_cache=False):
+        return await getCachedGeneration(mongodb, "flash_cards", "key", generateItems(calls), bypass_cache)
+
+    first_items = asyncio.run(lookUp())
+    assert asyncio.run(lookUp()) == first_items
+    # another process only has them in mongo
+    GENERATION_CACHE.clear()
+    assert asyncio.run(lookUp()) == first_items
+    assert len(calls) == 1
+
+    # a bypass generates them again, and they replace the ones kept
+    bypassed_items = asyncio.run(lookUp(bypass_cache=True))
+    assert bypassed_items != first_items
+    assert asyncio.run(lookUp()) == bypassed_items
+    assert getGenerationCacheStats() == {"flash_cards": {"memory_hit": 2, "in_flight_hit": 0, "mongo_hit": 1, "miss": 1, "bypass": 1}}
+
+
+def test_the_process_keeps_the_most_recently_used_generations(monkeypatch):
+    monkeypatch.setattr(generation_cache_utils, 'GENERATION_CACHE_SIZE', 2)
+    calls = []
+    for key in ["a", "b", "a", "c"]:
+        asyncio.run(getCachedGeneration(None, "flash_cards", key, generateItems(calls)))
+    assert list(GENERATION_CACHE.keys()) == ["a", "c"]
+    assert len(calls) == 3
+
+
+def test_concurrent_lookups_of_a_key_share_its_generation():
+    calls = []
+
+    async def generate():
+        await asyncio.sleep(0.05)
+        return await generateItems(calls)()
+
+    async def lookUp():
+        return await asyncio.gather(*[getCachedGeneration(None, "flash_cards", "key", generate) for _ in range(5)])
+
+    first_items, *other_items = asyncio.run(lookUp())
+    assert all(items is first_items for items in other_items)
+    assert len(calls) == 1
+    assert getGenerationCacheStats() == {"flash_cards": {"memory_hit": 0, "in_flight_hit": 4, "mongo_hit": 0, "miss": 1, "bypass": 0}}
+
+
+def test_generations_are_still_returned_when_mongo_is_unavailable():
+    calls = []
+    mongodb = {GENERATION_CACHE_COLLECTION: UnavailableCollection()}
+    items = asyncio.run(getCachedGeneration(mongodb, "flash_cards", "key", generateItems(calls)))
+    assert items == [{"prompt": "prompt 1", "answer": "answer"}]
+    # and are kept in the process
+    assert asyncio.run(getCachedGeneration(mongodb, "flash_cards", "key", generateItems(calls))) == items
+    assert len(calls) == 1
@@ -1,5 +1,8 @@
 import pytest
-from utils.markdown_utils import parseMarkdownHeadings, HeadingNode
+from utils.diff_utils import EDIT_COUNT_VERSION
+from utils.document_utils import calculateContentEditOpcodes
+from utils.markdown_utils import parseMarkdownHeadings, reparseMarkdownHeadings, generateNewDocumentNotes, generateUpdatedDocumentNotes, \
+    HeadingNode
 
 
 def generateMarkdown(level, title, content=''):
@@ -83,5 +86,59 @@ def test_mismatched_headings_levels():
     check_heading(structure['1.2'], 'Heading 1.2', '1.2', 'Content for heading 1.2')
 
 
+def test_indented_headings_and_stray_hashes():
+    markdown = "preamble is ignored\n" + \
+               "   # Heading 1   \n" + \
+               "  Content with a # inside  \n" + \
+               "####### not a heading\n" + \
+               "\t## Heading 1.1\n" + \
+               "#not a heading either\n"
+    structure = parseMarkdownHeadings(markdown)
+    assert len(structure) == 2
+    check_heading(structure['1'], 'Heading 1', '1', 'Content with a # inside\n####### not a heading', ['1.1'])
+    check_heading(structure['1.1'], 'Heading 1.1', '1.1', '#not a heading either')
+
+
+def test_reparse_matches_full_parse():
+    markdown = generateMarkdown(1, "Heading 1", "Content for heading 1") + \
+               generateMarkdown(2, "Heading 1.1", "Content for heading 1.1") + \
+               generateMarkdown(2, "Heading 1.2", "Content for heading 1.2") + \
+               generateMarkdown(1, "Heading 2", "Content for heading 2")
+    edits = [
+        markdown.replace("Content for heading 1.1", "Edited content for heading 1.1"),
+        markdown.replace("## Heading 1.2", "## Renamed heading"),
+        markdown.replace("Content for heading 1.2\n", "Content for heading 1.2\n### Heading 1.2.1\n"),
+        markdown.replace("## Heading 1.1\n", ""),
+        "intro\n" + markdown,
+    ]
+    previous_structure = parseMarkdownHeadings(markdown)
+    for node in previous_structure.values():
+        assert node.content
+    for edited_markdown in edits:
+        structure = reparseMarkdownHeadings(previous_structure, edited_markdown, calculateContentEditOpcodes(markdown, edited_markdown))
+        expected_structure = parseMarkdownHeadings(edited_markdown)
+        assert list(structure.keys()) == list(expected_structure.keys())
+        for coords, expected_heading in expected_structure.items():
+            check_heading(structure[coords], expected_heading.title, coords, expected_heading.content, expected_heading.children or None)
+
+
+def test_unchanged_notes_are_carried_over():
+    markdown = generateMarkdown(1, "Heading 1", "Content for heading 1") + \
+               generateMarkdown(2, "Heading 1.1", "Content for heading 1.1") + \
+               generateMarkdown(1, "Heading 2", "Content for heading 2")
+    edited_markdown = markdown.replace("Content for heading 2", "Edited content for heading 2")
+    notes = generateNewDocumentNotes(markdown)
+    assert all(note.content_hash and note.title_hash for note in notes.values())
+
+    updated_notes = generateUpdatedDocumentNotes(notes, edited_markdown, current_markdown_content=markdown,
+                                                 edit_opcodes=calculateContentEditOpcodes(markdown, edited_markdown))
+    assert updated_notes['1'] is notes['1']
+    assert updated_notes['1.1'] is notes['1.1']
+    assert updated_notes['2'] is not notes['2']
+    assert notes['2'].edits == []
+    assert [(edit.added, edit.deleted, edit.version) for edit in updated_notes['2'].edits] == [(8, 1, EDIT_COUNT_VERSION)]
+    assert updated_notes['2'].content_hash != notes['2'].content_hash
+
+
 if __name__ == "__main__":
     pytest.main()
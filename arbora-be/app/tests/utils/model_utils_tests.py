@@ -0,0 +1,45 @@
+from datetime import datetime
+
+from models.document import Document
+from models.user import User
+from note import NoteReview
+from utils.markdown_utils import generateNewDocumentNotes
+from utils.model_utils import getCurrentTimestamp, toEpochSeconds
+from utils.note_review_utils import createRecallState
+
+
+def test_legacy_iso_timestamps_are_read_as_utc_datetimes():
+    timestamp = '2024-05-01T12:30:00.250000'
+    review = NoteReview(review_type='chat', score=1, timestamp=timestamp)
+    assert review.timestamp.tzinfo is None
+    assert toEpochSeconds(review.timestamp) == datetime.fromisoformat(timestamp).timestamp()
+    # the recall state is the same whichever format the review was read from
+    stored_review = {**review.model_dump(), 'timestamp': review.timestamp}
+    assert createRecallState([review]) == createRecallState([NoteReview(**stored_review)])
+
+
+def test_stored_timestamps_are_naive_utc():
+    timestamp = getCurrentTimestamp()
+    assert timestamp.tzinfo is None
+    assert timestamp.microsecond % 1000 == 0
+    assert abs(toEpochSeconds(timestamp) - datetime.now().timestamp()) < 5
+
+
+def test_documents_are_stored_with_datetimes_and_given_as_iso_strings():
+    document = Document(creator_id='user', title='Heading', content='# Heading\ncontent', notes=generateNewDocumentNotes('# Heading\ncontent'))
+    stored_note = document.model_dump(by_alias=True, exclude={'id'})['notes']['1']
+    assert isinstance(stored_note['created_at'], datetime)
+
+    api_note = Document(**document.model_dump(by_alias=True)).model_dump(mode='json')['notes']['1']
+    # with their offset, so clients don't read them in their local time
+    assert api_note['created_at'] == stored_note['created_at'].isoformat() + '+00:00'
+    assert datetime.fromisoformat(api_note['created_at']).timestamp() == toEpochSeconds(stored_note['created_at'])
+
+
+def test_unset_user_dates_are_empty_strings():
+    user = User(name='name', email='name@test.com', password_hash='hash', is_active=True, is_verified=False,
+                created_at=getCurrentTimestamp(), updated_at='', deleted_at='')
+    assert user.updated_at is None
+    api_user = user.model_dump(mode='json')
+    assert api_user['created_at'] == user.created_at.isoformat() + '+00:00'
+    assert api_user['updated_at'] == '' and api_user['deleted_at'] == ''
@@ -0,0 +1,43 @@
+import asyncio
+import contextvars
+
+from httpx import ASGITransport, AsyncClient
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+from utils.mongo_stats_utils import MONGO_DURATION_HEADER, MONGO_OPERATIONS_HEADER, MongoStatsListener, MongoStatsMiddleware
+
+
+class FakeCommandEvent:
+    def __init__(self, duration_micros: int):
+        self.duration_micros = duration_micros
+
+
+async def makeOperations(request: Request) -> PlainTextResponse:
+    # motor completes every operation in a thread with a copy of the context it was made in
+    listener = MongoStatsListener()
+    loop = asyncio.get_running_loop()
+    no_of_operations = int(request.query_params['operations'])
+    await asyncio.gather(*[loop.run_in_executor(None, contextvars.copy_context().run, listener.succeeded, FakeCommandEvent(1500))
+                           for _ in range(no_of_operations)])
+    return PlainTextResponse('done')
+
+
+def test_the_operations_of_each_request_are_counted_separately():
+    app = Starlette(routes=[Route('/operations', makeOperations)])
+    app.add_middleware(MongoStatsMiddleware)
+
+    async def scenario():
+        async with AsyncClient(transport=ASGITransport(app=app), base_url='http://test') as client:
+            return await asyncio.gather(*[client.get('/operations', params={'operations': operations}) for operations in [3, 0, 5]])
+
+    responses = asyncio.run(scenario())
+    assert [response.headers[MONGO_OPERATIONS_HEADER] for response in responses] == ['3', '0', '5']
+    assert [response.headers[MONGO_DURATION_HEADER] for response in responses] == ['4.50', '0.00', '7.50']
+
+
+def test_operations_outside_of_a_request_are_not_counted():
+    # nothing to count them against, the listener of a client used outside of requests does nothing
+    contextvars.Context().run(MongoStatsListener().failed, FakeCommandEvent(1000))
@@ -0,0 +1,46 @@
+import pytest
+from utils.markdown_utils import parseMarkdownHeadings
+from utils.note_matching_utils import matchNotes
+from note import Note
+
+
+def generateNotes(sections):
+    """Generate root notes for a list of (title, content) sections."""
+    return {str(i + 1): Note(created_at=0, title=title, content=content, level=1) for i, (title, content) in enumerate(sections)}
+
+
+def generateMarkdown(sections):
+    return ''.join(f'# {title}\n{content}\n' for title, content in sections)
+
+
+def test_unchanged_sections_match_without_edits():
+    sections = [('Heading 1', 'Content for heading 1'), ('Heading 2', 'Content for heading 2')]
+    matches = matchNotes(generateNotes(sections), parseMarkdownHeadings(generateMarkdown(list(reversed(sections)))))
+    assert matches == {'1': ('2', 0, 0), '2': ('1', 0, 0)}
+
+
+def test_renamed_and_edited_sections_match_closest_note():
+    notes = generateNotes([('Heading 1', 'The quick brown fox jumps over the lazy dog'), ('Heading 2', 'Lorem ipsum dolor sit amet')])
+    structure = parseMarkdownHeadings(generateMarkdown([('Renamed heading', 'Lorem ipsum dolor sit amet!'),
+                                                        ('Heading 1', 'The quick brown cat jumps over the lazy dog')]))
+    matches = matchNotes(notes, structure)
+    assert matches == {'1': ('2', 1, 0), '2': ('1', 3, 3)}
+
+
+def test_note_is_inherited_by_one_section_only():
+    notes = generateNotes([('Heading 1', 'The quick brown fox jumps over the lazy dog')])
+    structure = parseMarkdownHeadings(generateMarkdown([('Copy', 'The quick brown fox jumps over the lazy cat'),
+                                                       ('Heading 1', 'The quick brown fox jumps over a lazy dog')]))
+    matches = matchNotes(notes, structure)
+    assert list(matches.keys()) == ['2']
+    assert matches['2'][0] == '1'
+
+
+def test_sections_past_the_threshold_are_new():
+    notes = generateNotes([('Heading 1', 'The quick brown fox jumps over the lazy dog')])
+    structure = parseMarkdownHeadings(generateMarkdown([('Heading 2', 'Something else entirely')]))
+    assert matchNotes(notes, structure, content_change_threshold=0.5) == {}
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,92 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from utils.note_review_utils import DEPTH_DECAY, HALF_LIFE, createRecallState, evaluateRecallState, \
+    mergeRecallStates, updateAllNotesRecallProbabilities
+from note import NoteReview
+
+
+def generateNotes(rng, no_of_roots=3, max_depth=3):
+    """Generate a random notes dict with random reviews, in the shape stored in the database."""
+    notes = {}
+    now = datetime.now()
+
+    def addNote(coords, depth):
+        reviews = [{'review_type': rng.choice(list(HALF_LIFE)), 'score': rng.random(),
+                    'timestamp': (now - timedelta(days=rng.random() * 60)).isoformat()} for _ in range(rng.randint(0, 4))]
+        children = [f'{coords}.{i + 1}' for i in range(rng.randint(0, 3))] if depth < max_depth else []
+        notes[coords] = {'title': coords, 'content': '', 'level': depth + 1, 'children': children, 'reviews': reviews,
+                         'edits': [], 'created_at': now.isoformat(), 'recall_probability': 0}
+        for child_coords in children:
+            addNote(child_coords, depth + 1)
+
+    for i in range(no_of_roots):
+        addNote(str(i + 1), 0)
+    return notes
+
+
+def calculateExpectedRecalls(notes, now_timestamp):
+    # the recursive per note computation list-documents did before, replaying every review of every note
+    recalls = {}
+
+    def updateRecall(note_id, parent_recall):
+        recall = evaluateRecallState(createRecallState([NoteReview(**review) for review in notes[note_id]['reviews']]), now_timestamp)
+        recalls[note_id] = recall + (parent_recall * DEPTH_DECAY) * (1 - recall)
+        for child_id in notes[note_id]['children']:
+            updateRecall(child_id, recalls[note_id])
+
+    for note_id in notes:
+        if '.' not in note_id:
+            updateRecall(note_id, 0)
+    return recalls
+
+
+def test_batched_recall_matches_per_note_recall():
+    rng = random.Random(0)
+    notes_list = [generateNotes(rng) for _ in range(20)] + [{}]
+    # half of the notes carry their recall state, the rest are worked out from their reviews
+    for notes in notes_list:
+        for note in notes.values():
+            if rng.random() < 0.5:
+                note['recall_state'] = createRecallState([NoteReview(**review) for review in note['reviews']]).model_dump()
+    now_timestamp = datetime.now().timestamp()
+    expected_recalls = [calculateExpectedRecalls(notes, now_timestamp) for notes in notes_list]
+    updateAllNotesRecallProbabilities(notes_list, now_timestamp)
+    for notes, expected in zip(notes_list, expected_recalls):
+        assert {note_id: note['recall_probability'] for note_id, note in notes.items()} == pytest.approx(expected, abs=1e-9)
+
+
+def test_incremental_state_matches_replayed_state():
+    rng = random.Random(1)
+    now = datetime.now()
+    reviews = [NoteReview(review_type=rng.choice(list(HALF_LIFE)), score=rng.random(),
+                          timestamp=(now - timedelta(days=rng.random() * 60)).isoformat()) for _ in range(50)]
+    # reviews added one at a time, out of order, end up in the same state as all of them at once
+    state = createRecallState([])
+    for review in reviews:
+        state = mergeRecallStates(state, createRecallState([review]))
+    replayed_state = createRecallState(sorted(reviews, key=lambda review: review.timestamp))
+    assert state.reference_timestamp == replayed_state.reference_timestamp
+    assert state.accumulators == pytest.approx(replayed_state.accumulators)
+    assert evaluateRecallState(state, now.timestamp()) == pytest.approx(evaluateRecallState(replayed_state, now.timestamp()))
+
+
+def test_reviews_decay_from_their_own_timestamp():
+    now = datetime.now()
+    notes = {'1': {'children': ['1.1'], 'reviews': [
+        {'review_type': 'flash_cards', 'score': 1, 'timestamp': (now - timedelta(days=4)).isoformat()},
+        {'review_type': 'flash_cards', 'score': 0.5, 'timestamp': (now - timedelta(days=2)).isoformat()},
+        {'review_type': 'chat', 'score': 0.5, 'timestamp': now.isoformat()},
+    ]}, '1.1': {'children': [], 'reviews': []}}
+    updateAllNotesRecallProbabilities([notes], now_timestamp=now.timestamp())
+    expected_recall = 1 - (1 - (0.5 ** (4 / 2) + 0.5 * 0.5 ** (2 / 2))) * (1 - 0.5)
+    assert notes['1']['recall_probability'] == pytest.approx(expected_recall)
+    assert notes['1.1']['recall_probability'] == pytest.approx(expected_recall * DEPTH_DECAY)
+
+
+def test_type_recall_is_capped_at_one():
+    now = datetime.now()
+    reviews = [NoteReview(review_type='chat', score=1, timestamp=now.isoformat()) for _ in range(3)]
+    assert evaluateRecallState(createRecallState(reviews), now.timestamp()) == 1
@@ -0,0 +1,87 @@
+import asyncio
+
+from bson import ObjectId
+import pytest
+from pymongo import DeleteMany, ReturnDocument, UpdateOne
+from pymongo.errors import NetworkTimeout, WriteError
+
+from utils.markdown_utils import generateNewDocumentNotes
+from utils.mongo_utils import NOTES_COLLECTION, NOTES_IN_COLLECTION_FIELD
+from utils.note_storage_utils import assembleDocumentNotes, toNoteItems, updateDocumentNoteItems, updateEachItem
+
+
+class RecordingCollection:
+    # a collection that keeps the requests of its bulk writes
+    def __init__(self):
+        self.requests = []
+
+    async def bulk_write(self, requests, ordered=True):
+        self.requests.extend(requests)
+
+
+class UpdatingCollection:
+    # a collection that updates the items of the given ids, and fails the writes of the given errors by id
+    def __init__(self, item_ids: set[str], errors: dict[str, Exception] = None):
+        self.item_ids = item_ids
+        self.errors = errors or {}
+
+    async def find_one_and_update(self, item_filter, update, projection=None, return_document=ReturnDocument.BEFORE):
+        if item_filter["_id"] in self.errors:
+            raise self.errors[item_filter["_id"]]
+        return {"_id": item_filter["_id"]} if item_filter["_id"] in self.item_ids else None
+
+
+def generateNotes(content: str) -> dict[str, dict]:
+    return {coords: note.model_dump() for coords, note in generateNewDocumentNotes(content).items()}
+
+
+def test_documents_are_assembled_from_their_note_items():
+    document_id = ObjectId()
+    notes = generateNotes('# Heading 1\nContent\n## Heading 1.1\nMore content\n')
+    note_items = [{key: value for key, value in note_item.items() if key not in ("document_id", "creator_id")}
+                  for note_item in toNoteItems(document_id, "user", notes)]
+    documents = [
+        {"_id": document_id, "notes": {}, NOTES_IN_COLLECTION_FIELD: True, "note_items": note_items},
+        {"_id": ObjectId(), "notes": notes, "note_items": []},
+    ]
+    assembleDocumentNotes(documents)
+    assert [document["notes"] for document in documents] == [notes, notes]
+    assert all("note_items" not in document for document in documents)
+
+
+def test_only_the_notes_an_edit_changed_are_written():
+    notes_collection = RecordingCollection()
+    document = {"_id": ObjectId(), "creator_id": "user", "notes": generateNotes('# Heading 1\nContent\n# Heading 2\nContent\n# Heading 3\n')}
+    updated_notes = {
+        "1": document["notes"]["1"],
+        "2": {**document["notes"]["2"], "content": "New content"},
+        "4": generateNotes('# Heading 4\n')["1"],
+    }
+    asyncio.run(updateDocumentNoteItems({NOTES_COLLECTION: notes_collection}, document, updated_notes))
+
+    deletes = [request for request in notes_collection.requests if isinstance(request, DeleteMany)]
+    updates = [request for request in notes_collection.requests if isinstance(request, UpdateOne)]
+    assert [delete._filter["note_id"] for delete in deletes] == [{"$in": ["3"]}]
+    assert [update._filter["note_id"] for update in updates] == ["2", "4"]
+    # an unchanged field of a note is not written, so reviews recorded since the document was read are kept
+    assert updates[0]._doc["$set"] == {"content": "New content"}
+    assert updates[1]._doc["$set"] == updated_notes["4"]
+
+
+def test_note_items_are_assembled_in_the_order_of_the_document():
+    notes = generateNotes(''.join(f'# Heading {i}\n## Subheading {i}\n' for i in range(1, 12)))
+    note_items = sorted(toNoteItems(ObjectId(), "user", notes), key=lambda note_item: note_item["note_id"])
+    documents = [{"notes": {}, NOTES_IN_COLLECTION_FIELD: True, "note_items": note_items}]
+    assembleDocumentNotes(documents)
+    assert list(documents[0]["notes"].keys()) == list(notes.keys())
+
+
+def test_items_that_did_not_get_their_update_are_told_by_their_own_write():
+    collection = UpdatingCollection({"a", "c"}, {"b": WriteError("failed", code=2)})
+    filters = [{"_id": item_id} for item_id in ["a", "b", "c", "d"]]
+    assert asyncio.run(updateEachItem(collection, filters, [[]] * len(filters))) == [{"_id": "a"}, None, {"_id": "c"}, None]
+
+    # errors other than a failed write are raised
+    collection = UpdatingCollection({"a"}, {"b": NetworkTimeout("timed out")})
+    with pytest.raises(NetworkTimeout):
+        asyncio.run(updateEachItem(collection, filters, [[]] * len(filters)))
@@ -0,0 +1,34 @@
+from utils.markdown_utils import parseMarkdownHeadings, generateNewDocumentNotes
+from utils.note_tree_utils import NO_NOTE, NoteTree
+
+MARKDOWN = '# Heading 1\n## Heading 1.1\n### Heading 1.1.1\n## Heading 1.2\n# Heading 2\n## Heading 2.1\n'
+
+
+def test_tree_of_heading_structure():
+    tree = NoteTree.fromNotes(parseMarkdownHeadings(MARKDOWN))
+    assert tree.coords == ['1', '1.1', '1.1.1', '1.2', '2', '2.1']
+    assert list(tree.parents) == [NO_NOTE, 0, 1, 0, NO_NOTE, 4]
+    assert list(tree.depths) == [0, 1, 2, 1, 0, 1]
+    assert list(tree.roots()) == [0, 4]
+    assert list(tree.children(0)) == [1, 3]
+    assert list(tree.subtree(0)) == [0, 1, 2, 3]
+    assert list(tree.subtree(3)) == [3]
+    assert tree.branch(2) == [0, 1, 2]
+    assert tree.childrenCoords(tree.ids['1']) == ['1.1', '1.2']
+
+
+def test_tree_of_stored_notes_matches_their_children():
+    notes = {coords: note.model_dump() for coords, note in generateNewDocumentNotes(MARKDOWN).items()}
+    tree = NoteTree.fromNotes(notes)
+    assert set(tree.coords) == set(notes.keys())
+    for coords, note in notes.items():
+        assert tree.childrenCoords(tree.ids[coords]) == note['children']
+
+
+def test_missing_children_are_left_out():
+    notes = {'1': {'children': ['1.1', '1.2']}, '1.2': {'children': []}, '2': {'children': []}}
+    tree = NoteTree.fromNotes(notes)
+    assert tree.coords == ['1', '1.2', '2']
+    assert tree.childrenCoords(0) == ['1.2']
+    assert len(NoteTree.fromNotes({})) == 0
+    assert list(NoteTree.fromNotes({}).roots()) == []
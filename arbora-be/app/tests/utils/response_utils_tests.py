@@ -0,0 +1,51 @@
+import json
+
+from bson import ObjectId
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+
+from models.document import Document
+from routers import GenericResponse
+from utils.markdown_utils import generateNewDocumentNotes
+from utils.model_utils import formatTimestamp, getCurrentTimestamp
+from utils.response_utils import ModelResponse, generateETag, matchesETag
+
+
+class GetDocumentResponse(GenericResponse):
+    document: Document
+
+
+def test_model_responses_have_the_shape_of_json_responses():
+    content = '# Heading 1\nContent ✓\n## Heading 1.1\nMore content\n'
+    document = {'_id': ObjectId(), 'creator_id': 'user', 'title': 'Heading 1', 'content': content,
+                'notes': generateNewDocumentNotes(content), 'updated_at': getCurrentTimestamp()}
+    response = GetDocumentResponse(is_successful=True, message='Document retrieved successfully', document=document)
+
+    model_response = ModelResponse(response, status_code=201)
+    assert model_response.status_code == 201
+    assert model_response.headers['content-type'] == 'application/json'
+    assert json.loads(model_response.body) == json.loads(JSONResponse(content=response.model_dump(mode='json')).body)
+    assert json.loads(model_response.body)['document']['id'] == str(document['_id'])
+
+
+def test_other_content_is_encoded_with_object_ids_and_datetimes():
+    document_id = ObjectId()
+    timestamp = getCurrentTimestamp()
+    body = json.loads(ModelResponse({'id': document_id, 'updated_at': timestamp, 'items': [1, 'two']}).body)
+    assert body == {'id': str(document_id), 'updated_at': formatTimestamp(timestamp), 'items': [1, 'two']}
+
+
+def requestWithHeaders(headers: dict[str, str]) -> Request:
+    return Request({'type': 'http', 'headers': [(name.lower().encode(), value.encode()) for name, value in headers.items()]})
+
+
+def test_etags_match_any_of_the_if_none_match_tags():
+    etag = generateETag('document/1')
+    assert etag == generateETag('document/1') != generateETag('document/2')
+    assert etag.startswith('"') and etag.endswith('"')
+
+    assert not matchesETag(requestWithHeaders({}), etag)
+    assert matchesETag(requestWithHeaders({'If-None-Match': etag}), etag)
+    assert matchesETag(requestWithHeaders({'If-None-Match': f'"other", W/{etag}'}), etag)
+    assert matchesETag(requestWithHeaders({'If-None-Match': '*'}), etag)
+    assert not matchesETag(requestWithHeaders({'If-None-Match': generateETag('document/2')}), etag)
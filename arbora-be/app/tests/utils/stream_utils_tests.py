@@ -0,0 +1,43 @@
+import asyncio
+import json
+
+from models.document import Folder
+from utils.model_utils import formatTimestamp, getCurrentTimestamp
+from utils.stream_utils import generateNdjsonLines
+
+
+class ListCursor:
+    # iterates a list the way a motor cursor iterates its results
+    def __init__(self, items: list[dict]):
+        self.items = items
+        self.fetched_batch_size = None
+
+    def batch_size(self, batch_size: int) -> 'ListCursor':
+        self.fetched_batch_size = batch_size
+        return self
+
+    async def __aiter__(self):
+        for item in self.items:
+            yield item
+
+
+def collectChunks(cursor: ListCursor, **kwargs) -> list[bytes]:
+    async def collect() -> list[bytes]:
+        return [chunk async for chunk in generateNdjsonLines(cursor, Folder, **kwargs)]
+    return asyncio.run(collect())
+
+
+def test_items_are_written_a_line_each_a_batch_at_a_time():
+    folders = [{'_id': str(i), 'creator_id': 'user', 'name': f'folder {i}', 'created_at': getCurrentTimestamp()} for i in range(5)]
+    prepared_batches = []
+    chunks = collectChunks(ListCursor(folders), batch_size=2, prepare_batch=lambda batch: prepared_batches.append(len(batch)))
+
+    assert len(chunks) == 3 and prepared_batches == [2, 2, 1]
+    lines = b''.join(chunks).decode().splitlines()
+    assert [json.loads(line)['name'] for line in lines] == [folder['name'] for folder in folders]
+    # timestamps are given as iso strings, as in the listing that isn't streamed
+    assert json.loads(lines[0])['created_at'] == formatTimestamp(folders[0]['created_at'])
+
+
+def test_no_items_are_an_empty_stream():
+    assert collectChunks(ListCursor([])) == []
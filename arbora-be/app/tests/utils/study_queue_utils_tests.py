@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from utils.markdown_utils import generateNewDocumentNotes, generateUpdatedDocumentNotes
+from utils.note_review_utils import DUE_RECALL_PROBABILITY, calculateNextDueTimestamp, createRecallState, evaluateBranchRecall
+from utils.study_queue_utils import findChangedScheduleNoteIds, generateNoteScheduleEntries
+from note import NoteReview, RecallState
+
+
+def generateReviewState(days_ago, review_type='flash_cards', score=1.0):
+    timestamp = (datetime.now() - timedelta(days=days_ago)).isoformat()
+    return createRecallState([NoteReview(review_type=review_type, score=score, timestamp=timestamp)])
+
+
+def test_unreviewed_notes_are_due_right_away():
+    assert calculateNextDueTimestamp([RecallState()]) == 0
+
+
+def test_next_due_is_when_recall_drops_below_the_due_probability():
+    state = generateReviewState(0)
+    next_due = calculateNextDueTimestamp([state])
+    # a perfect flash card review halves in 2 days
+    assert next_due == pytest.approx(state.reference_timestamp + 2 * 24 * 60 * 60, abs=2)
+    assert evaluateBranchRecall([state], next_due - 2) >= DUE_RECALL_PROBABILITY > evaluateBranchRecall([state], next_due + 2)
+
+
+def test_parent_recall_delays_next_due():
+    parent_state = generateReviewState(0, review_type='chat')
+    child_state = generateReviewState(0)
+    assert calculateNextDueTimestamp([parent_state, child_state]) > calculateNextDueTimestamp([child_state])
+
+
+def test_schedule_entries_of_reviewed_notes_include_their_children():
+    document = {"_id": ObjectId(), "creator_id": "user",
+                "notes": {coords: note.model_dump() for coords, note in generateNewDocumentNotes(
+                    '# Heading 1\nContent\n## Heading 1.1\n### Heading 1.1.1\n## Heading 1.2\n# Heading 2\n').items()}}
+    assert [entry["note_id"] for entry in generateNoteScheduleEntries(document)] == ['1', '1.1', '1.1.1', '1.2', '2']
+    entries = generateNoteScheduleEntries(document, {'1.1'})
+    assert [entry["note_id"] for entry in entries] == ['1.1', '1.1.1']
+    assert [len(entry["branch_states"]) for entry in entries] == [2, 3]
+    assert entries[0]["_id"] == f'{document["_id"]}/1.1'
+
+
+def findEditChanges(markdown: str, edited_markdown: str, reviewed_note_id: str = None) -> tuple[set[str], set[str]]:
+    notes = generateNewDocumentNotes(markdown)
+    if reviewed_note_id is not None:
+        notes[reviewed_note_id] = notes[reviewed_note_id].model_copy(update={'recall_state': generateReviewState(0)})
+    updated_notes = generateUpdatedDocumentNotes(notes, edited_markdown, current_markdown_content=markdown)
+    return findChangedScheduleNoteIds({coords: note.model_dump() for coords, note in notes.items()},
+                                      {coords: note.model_dump() for coords, note in updated_notes.items()})
+
+
+def test_edits_only_change_the_schedule_of_the_notes_they_retitle_move_or_add():
+    markdown = '# Heading 1\nContent\n## Heading 1.1\nMore content\n### Heading 1.1.1\n## Heading 1.2\n# Heading 2\n'
+    assert findEditChanges(markdown, markdown.replace('More content', 'Other content')) == (set(), set())
+    # the title of a note isn't part of the entries of the notes under it
+    assert findEditChanges(markdown, markdown.replace('## Heading 1.1\n', '## Renamed heading\n')) == ({'1.1'}, set())
+    assert findEditChanges(markdown, markdown.replace('# Heading 2\n', '# Heading 2\n# Heading 3\n')) == ({'3'}, set())
+    assert findEditChanges(markdown, markdown.replace('## Heading 1.2\n', '')) == (set(), {'1.2'})
+    # a new note moves the ones after it to other coords, the entries of the coords left behind are removed
+    assert findEditChanges(markdown, markdown.replace('# Heading 1\nContent\n', '# Heading 0\n# Heading 1\nContent\n')) == (
+        {'1', '2', '2.1', '2.1.1', '2.2', '3'}, {'1.1', '1.1.1', '1.2'})
+
+
+def test_edits_change_the_schedule_under_a_note_whose_recall_changed():
+    markdown = '# Heading 1\nContent\n## Heading 1.1\n### Heading 1.1.1\n# Heading 2\n'
+    # a reviewed note that is replaced by a new one takes its recall with it
+    changed_ids, removed_ids = findEditChanges(markdown, markdown.replace('# Heading 1\nContent\n', '# Other heading\nOther\n'), '1')
+    assert changed_ids == {'1', '1.1', '1.1.1'} and removed_ids == set()
@@ -0,0 +1,19 @@
+from utils.model_utils import getCurrentTimestamp
+from utils.sync_utils import SYNC_TOKEN_OVERLAP, generateSyncToken, parseSyncToken
+
+
+def test_sync_tokens_start_a_little_before_the_sync():
+    sync_timestamp = getCurrentTimestamp()
+    since = parseSyncToken(generateSyncToken(sync_timestamp))
+    # tokens keep the millisecond precision mongo stores datetimes with
+    assert sync_timestamp - SYNC_TOKEN_OVERLAP - since < SYNC_TOKEN_OVERLAP / 10000
+    assert since <= sync_timestamp - SYNC_TOKEN_OVERLAP
+
+
+def test_invalid_sync_tokens_are_rejected():
+    assert parseSyncToken('') is None
+    assert parseSyncToken('-1') is None
+    assert parseSyncToken('not-a-token') is None
+    assert parseSyncToken('٣٤٥') is None
+    assert parseSyncToken('99999999999999999999') is None
+    assert parseSyncToken('253402300800000') is None
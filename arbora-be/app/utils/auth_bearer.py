@@ -1,5 +1,5 @@
 from fastapi import HTTPException, Request
-from auth_utils import decodeJWTToken, validateJWTToken
+from utils.auth_utils import verifyJWTToken
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
 
@@ -12,9 +12,10 @@ class JWTBearer(HTTPBearer):
         if credentials:
             if not credentials.scheme == "Bearer":
                 raise HTTPException(status_code=401, detail="Invalid authentication scheme.")
-            if not validateJWTToken(credentials.credentials):
+            # the token is decoded and verified once, and not at all if it was verified recently
+            token = verifyJWTToken(credentials.credentials)
+            if token is None:
                 raise HTTPException(status_code=401, detail="Invalid token or expired token.")
-            token = decodeJWTToken(credentials.credentials)
             request.state.user_id = token.user_id
             return token
         else:
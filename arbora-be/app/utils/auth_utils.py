@@ -1,4 +1,6 @@
+import math
 import time
+from collections import OrderedDict
 from typing import Optional
 
 import bcrypt
@@ -6,21 +8,88 @@ from pydantic import BaseModel
 
 import jwt
 from config import settings
+from executor_utils import BoundedExecutor
 
+# bcrypt takes around a second at the default cost, and releases the gil while it runs, so it is run on its own threads instead
+# of blocking the event loop, and every other request with it
+PASSWORD_HASHING_EXECUTOR = BoundedExecutor(settings.PASSWORD_HASHING_WORKERS, settings.PASSWORD_HASHING_QUEUE_SIZE,
+                                            settings.PASSWORD_HASHING_QUEUE_TIMEOUT, thread_name_prefix='password-hashing')
+# the seconds a login or signup turned away by it is told to wait before trying again
+PASSWORD_HASHING_RETRY_AFTER = 5
 
-def hashPassword(password: str):
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(14))
+# the bcrypt cost new hashes are made at, every step up doubles the time a hash takes. set on startup, see
+# setPasswordHashCost, and a password hashed at another cost is hashed again the next time its user logs in
+MIN_PASSWORD_HASH_COST = 10
+MAX_PASSWORD_HASH_COST = 18
+password_hash_cost = settings.PASSWORD_HASH_COST
 
 
-def verifyPassword(password: str, hashed_password: str):
+def setPasswordHashCost(cost: int) -> None:
+    global password_hash_cost
+    password_hash_cost = max(MIN_PASSWORD_HASH_COST, min(MAX_PASSWORD_HASH_COST, cost))
+
+
+def getPasswordHashCost(password_hash: str) -> int:
+    # a bcrypt hash is $<version>$<cost>$<salt and hash>
+    return int(password_hash.split('$')[2])
+
+
+def needsRehash(password_hash: str) -> bool:
+    return getPasswordHashCost(password_hash) != password_hash_cost
+
+
+def calibratePasswordHashCost(target_milliseconds: float) -> int:
+    """
+    Returns the bcrypt cost a hash takes closest to, without going over, the target time at on this machine, from the time a
+    hash takes at the lowest cost.
+
+    :param target_milliseconds: The time a hash should take
+    :return: The cost, between MIN_PASSWORD_HASH_COST and MAX_PASSWORD_HASH_COST
+    """
+    start = time.perf_counter()
+    bcrypt.hashpw(b'calibration', bcrypt.gensalt(MIN_PASSWORD_HASH_COST))
+    elapsed_milliseconds = (time.perf_counter() - start) * 1000
+    cost = MIN_PASSWORD_HASH_COST + math.floor(math.log2(max(target_milliseconds / elapsed_milliseconds, 1)))
+    return min(MAX_PASSWORD_HASH_COST, cost)
+
+
+def _hashPassword(password: str) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(password_hash_cost)).decode('utf-8')
+
+
+def _verifyPassword(password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
 
 
+async def hashPassword(password: str) -> str:
+    """
+    Hashes a password on the password hashing threads.
+
+    :raises ExecutorBusyError: If too many passwords are being hashed or checked already
+    """
+    return await PASSWORD_HASHING_EXECUTOR.run(_hashPassword, password)
+
+
+async def verifyPassword(password: str, hashed_password: str) -> bool:
+    """
+    Checks a password against its hash on the password hashing threads.
+
+    :raises ExecutorBusyError: If too many passwords are being hashed or checked already
+    """
+    return await PASSWORD_HASHING_EXECUTOR.run(_verifyPassword, password, hashed_password)
+
+
 class JWTPayload(BaseModel):
     user_id: str
     expires: int
 
 
+# the payloads of the most recently verified tokens keyed by the token, a client makes many requests with the same token and
+# only the first has its signature verified. a payload is dropped once its token expires
+VERIFIED_TOKEN_CACHE_SIZE = 1024
+VERIFIED_TOKEN_CACHE: OrderedDict[str, JWTPayload] = OrderedDict()
+
+
 def generateJWTToken(user_id: str, seconds_to_expiry: int = 60 * 60) -> str:
     payload = JWTPayload(user_id=user_id, expires=int(time.time()) + seconds_to_expiry)
 
@@ -38,8 +107,31 @@ def decodeJWTToken(token: str) -> Optional[JWTPayload]:
         return None
 
 
-def validateJWTToken(token: str) -> bool:
+def verifyJWTToken(token: str) -> Optional[JWTPayload]:
+    """
+    Returns the payload of a token if its signature is valid and it hasn't expired, decoding it only if it wasn't verified
+    recently.
+
+    :param token: The encoded token
+    :return: The payload of the token, None if it is invalid or expired
+    """
+    now = time.time()
+    payload = VERIFIED_TOKEN_CACHE.get(token)
+    if payload is not None:
+        if payload.expires > now:
+            VERIFIED_TOKEN_CACHE.move_to_end(token)
+            return payload
+        del VERIFIED_TOKEN_CACHE[token]
+        return None
+
     payload = decodeJWTToken(token)
-    if payload is not None and payload.expires > time.time():
-        return True
-    return False
+    if payload is None or payload.expires <= now:
+        return None
+    VERIFIED_TOKEN_CACHE[token] = payload
+    if len(VERIFIED_TOKEN_CACHE) > VERIFIED_TOKEN_CACHE_SIZE:
+        VERIFIED_TOKEN_CACHE.popitem(last=False)
+    return payload
+
+
+def validateJWTToken(token: str) -> bool:
+    return verifyJWTToken(token) is not None
@@ -0,0 +1,282 @@
+import difflib
+from typing import Optional, Sequence
+
+# (tag, before_start, before_end, after_start, after_end), the same format as SequenceMatcher.get_opcodes
+Opcode = tuple[str, int, int, int, int]
+
+# the myers diff of a single hunk is given up on past this many edits, the hunk is compared with SequenceMatcher instead
+MAX_HUNK_EDITS = 400
+# the same for the line by line diff of the whole text, past this many edits it is treated as a single hunk
+MAX_LINE_EDITS = 400
+# changed hunks separated by fewer unchanged characters than this, like a lone blank line, are diffed as one hunk
+MIN_EQUAL_HUNK_LENGTH = 32
+# common prefixes and suffixes are measured by comparing slices of growing size instead of character by character
+PREFIX_STEP = 64
+# edits are only counted, without their opcodes, through a bit-parallel LCS when the two texts are at most this many cells apart
+MAX_BIT_PARALLEL_CELLS = 4_000_000
+
+# how the characters added and deleted by an edit are counted, kept with every edit of a note. 1 is what SequenceMatcher counted,
+# 2 the smallest edit, which is the same on most edits but smaller on ones SequenceMatcher's junk heuristic or its matching of
+# the longest block first got wrong, like text with a character repeated all over it or moved words
+EDIT_COUNT_VERSION = 2
+
+
+def commonPrefixLength(a: str, b: str) -> int:
+    limit = min(len(a), len(b))
+    length = 0
+    step = PREFIX_STEP
+    while length < limit:
+        end = min(length + step, limit)
+        if a[length:end] != b[length:end]:
+            # the first difference is in this chunk, binary search for it
+            while length < end:
+                middle = (length + end + 1) // 2
+                if a[length:middle] == b[length:middle]:
+                    length = middle
+                else:
+                    end = middle - 1
+            return length
+        length = end
+        step *= 2
+    return length
+
+
+def commonSuffixLength(a: str, b: str, limit: Optional[int] = None) -> int:
+    limit = min(len(a), len(b)) if limit is None else limit
+    a_end, b_end = len(a), len(b)
+    length = 0
+    step = PREFIX_STEP
+    while length < limit:
+        end = min(length + step, limit)
+        if a[a_end - end:a_end - length] != b[b_end - end:b_end - length]:
+            while length < end:
+                middle = (length + end + 1) // 2
+                if a[a_end - middle:a_end - length] == b[b_end - middle:b_end - length]:
+                    length = middle
+                else:
+                    end = middle - 1
+            return length
+        length = end
+        step *= 2
+    return length
+
+
+def myersDiff(a: Sequence, b: Sequence, max_cost: Optional[int] = None) -> Optional[list[Opcode]]:
+    """
+    Returns a shortest edit from a to b as opcodes, using Myers' O(ND) algorithm.
+
+    :param a: Original sequence
+    :param b: Modified sequence
+    :param max_cost: The most insertions plus deletions to search for, None if unbounded
+    :return: The opcodes of the edit, or None if it takes more than max_cost insertions and deletions
+    """
+    n, m = len(a), len(b)
+    max_d = n + m if max_cost is None else min(max_cost, n + m)
+    if abs(n - m) > max_d:
+        return None
+
+    # v[offset + k] is the furthest x reached on diagonal k = x - y, trace[d] is v[-d..d] after d edits
+    offset = max_d + 1
+    v = [0] * (2 * max_d + 3)
+    trace = []
+    for d in range(max_d + 1):
+        for index in range(offset - d, offset + d + 1, 2):
+            if index == offset - d or (index != offset + d and v[index - 1] < v[index + 1]):
+                x = v[index + 1]
+            else:
+                x = v[index - 1] + 1
+            y = x - index + offset
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            v[index] = x
+            if x >= n and y >= m:
+                trace.append(v[offset - d:offset + d + 1])
+                return _backtrackOpcodes(trace, n, m)
+        trace.append(v[offset - d:offset + d + 1])
+    return None
+
+
+def _backtrackOpcodes(trace: list[list[int]], n: int, m: int) -> list[Opcode]:
+    # walk the trace back from (n, m), collecting the (x, y) -> (x, y) diagonals in between the edits
+    diagonals = []
+    x, y = n, m
+    for d in range(len(trace) - 1, 0, -1):
+        previous_v = trace[d - 1]
+        k = x - y
+        if k == -d or (k != d and previous_v[k - 1 + d - 1] < previous_v[k + 1 + d - 1]):
+            previous_k = k + 1
+        else:
+            previous_k = k - 1
+        previous_x = previous_v[previous_k + d - 1]
+        previous_y = previous_x - previous_k
+        # the edit moves from the previous point to the start of the diagonal that ends at (x, y)
+        diagonal_x = previous_x if previous_k == k + 1 else previous_x + 1
+        diagonals.append((diagonal_x, diagonal_x - k, x, y))
+        x, y = previous_x, previous_y
+    diagonals.append((0, 0, x, y))
+    diagonals.reverse()
+
+    opcodes = []
+    i, j = 0, 0
+    for x1, y1, x2, y2 in diagonals:
+        if i < x1 or j < y1:
+            opcodes.append(('replace' if i < x1 and j < y1 else 'delete' if i < x1 else 'insert', i, x1, j, y1))
+        if x1 < x2:
+            opcodes.append(('equal', x1, x2, y1, y2))
+        i, j = x2, y2
+    return _mergeOpcodes(opcodes)
+
+
+def _mergeOpcodes(opcodes: list[Opcode]) -> list[Opcode]:
+    # joins adjacent opcodes of the same kind, and adjacent insertions and deletions into replacements
+    merged = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        if i1 == i2 and j1 == j2:
+            continue
+        if merged and (merged[-1][0] == 'equal') == (tag == 'equal'):
+            previous_tag, previous_i1, _, previous_j1, _ = merged[-1]
+            if tag != 'equal' and tag != previous_tag:
+                tag = 'replace'
+            merged[-1] = (tag, previous_i1, i2, previous_j1, j2)
+        else:
+            merged.append((tag, i1, i2, j1, j2))
+    return merged
+
+
+def _costOf(opcodes: list[Opcode]) -> int:
+    return sum((i2 - i1) + (j2 - j1) for tag, i1, i2, j1, j2 in opcodes if tag != 'equal')
+
+
+def lcsLength(a: str, b: str) -> int:
+    """
+    Returns the length of the longest common subsequence of a and b, a bit-parallel LCS with a row of the table per integer.
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    if not b:
+        return 0
+    # bit i of the mask of a character is set where a has it
+    masks = {}
+    for index, char in enumerate(a):
+        masks[char] = masks.get(char, 0) | (1 << index)
+    row_mask = (1 << len(a)) - 1
+    row = row_mask
+    for char in b:
+        matches = row & masks.get(char, 0)
+        row = ((row + matches) | (row - matches)) & row_mask
+    # every cleared bit of the final row is a character of the subsequence
+    return len(a) - row.bit_count()
+
+
+def _diffHunk(before: str, after: str, max_cost: Optional[int]) -> Optional[list[Opcode]]:
+    # a character diff of a single changed hunk, falling back to SequenceMatcher when it is too different for myers
+    hunk_max_cost = MAX_HUNK_EDITS if max_cost is None else min(max_cost, MAX_HUNK_EDITS)
+    opcodes = myersDiff(before, after, hunk_max_cost)
+    if opcodes is None:
+        if max_cost is not None and max_cost <= MAX_HUNK_EDITS:
+            return None
+        opcodes = difflib.SequenceMatcher(None, before, after).get_opcodes()
+        if max_cost is not None and _costOf(opcodes) > max_cost:
+            return None
+    return opcodes
+
+
+def diffTexts(before: str, after: str, max_cost: Optional[int] = None) -> Optional[list[Opcode]]:
+    """
+    Returns the edit from before to after as SequenceMatcher style opcodes.
+
+    Identical texts are returned right away, the common prefix and suffix are trimmed, and the rest is compared line by line
+    first so that only the lines that changed are compared character by character.
+
+    :param before: Original text
+    :param after: Modified text
+    :param max_cost: The most added plus deleted characters to look for, None if unbounded
+    :return: List of (tag, before_start, before_end, after_start, after_end) covering both texts, or None if the edit
+             adds and deletes more than max_cost characters
+    """
+    if before == after:
+        return [('equal', 0, len(before), 0, len(after))] if before else []
+    if max_cost is not None and abs(len(before) - len(after)) > max_cost:
+        return None
+
+    prefix = commonPrefixLength(before, after)
+    suffix = commonSuffixLength(before, after, min(len(before), len(after)) - prefix)
+    before_middle = before[prefix:len(before) - suffix]
+    after_middle = after[prefix:len(after) - suffix]
+
+    # compare the lines as integers, every distinct line getting its own
+    line_ids = {}
+    before_lines = before_middle.splitlines(keepends=True)
+    after_lines = after_middle.splitlines(keepends=True)
+    line_opcodes = myersDiff([line_ids.setdefault(line, len(line_ids)) for line in before_lines],
+                             [line_ids.setdefault(line, len(line_ids)) for line in after_lines], MAX_LINE_EDITS)
+    if line_opcodes is None:
+        line_opcodes = [('replace', 0, len(before_lines), 0, len(after_lines))]
+
+    before_offsets = [0]
+    for line in before_lines:
+        before_offsets.append(before_offsets[-1] + len(line))
+    after_offsets = [0]
+    for line in after_lines:
+        after_offsets.append(after_offsets[-1] + len(line))
+
+    # short unchanged stretches between changes are folded into the hunks around them
+    hunks = []
+    for tag, i1, i2, j1, j2 in line_opcodes:
+        if hunks and hunks[-1][0] != 'equal' and (tag != 'equal' or before_offsets[i2] - before_offsets[i1] < MIN_EQUAL_HUNK_LENGTH):
+            hunks[-1] = ('replace', hunks[-1][1], i2, hunks[-1][3], j2)
+        else:
+            hunks.append((tag, i1, i2, j1, j2))
+
+    opcodes = [('equal', 0, prefix, 0, prefix)]
+    cost = 0
+    for tag, i1, i2, j1, j2 in hunks:
+        before_start, before_end = before_offsets[i1], before_offsets[i2]
+        after_start, after_end = after_offsets[j1], after_offsets[j2]
+        if tag == 'equal':
+            opcodes.append(('equal', prefix + before_start, prefix + before_end, prefix + after_start, prefix + after_end))
+            continue
+        hunk_opcodes = _diffHunk(before_middle[before_start:before_end], after_middle[after_start:after_end],
+                                 None if max_cost is None else max_cost - cost)
+        if hunk_opcodes is None:
+            return None
+        cost += _costOf(hunk_opcodes)
+        for hunk_tag, hunk_i1, hunk_i2, hunk_j1, hunk_j2 in hunk_opcodes:
+            opcodes.append((hunk_tag, prefix + before_start + hunk_i1, prefix + before_start + hunk_i2,
+                            prefix + after_start + hunk_j1, prefix + after_start + hunk_j2))
+    opcodes.append(('equal', len(before) - suffix, len(before), len(after) - suffix, len(after)))
+    return _mergeOpcodes(opcodes)
+
+
+def countTextEdit(before: str, after: str, max_cost: Optional[int] = None) -> Optional[tuple[int, int]]:
+    """
+    Returns the number of characters added and deleted by the smallest edit from before to after, without working out the edit.
+
+    :param before: Original text
+    :param after: Modified text
+    :param max_cost: The most added plus deleted characters to look for, None if unbounded
+    :return: Tuple of (added_chars, deleted_chars), or None if the edit adds and deletes more than max_cost characters
+    """
+    if before == after:
+        return 0, 0
+    if max_cost is not None and abs(len(before) - len(after)) > max_cost:
+        return None
+
+    prefix = commonPrefixLength(before, after)
+    suffix = commonSuffixLength(before, after, min(len(before), len(after)) - prefix)
+    before_middle = before[prefix:len(before) - suffix]
+    after_middle = after[prefix:len(after) - suffix]
+    if len(before_middle) * len(after_middle) > MAX_BIT_PARALLEL_CELLS:
+        opcodes = diffTexts(before_middle, after_middle, max_cost)
+        if opcodes is None:
+            return None
+        cost = _costOf(opcodes)
+        deleted = sum(i2 - i1 for tag, i1, i2, j1, j2 in opcodes if tag != 'equal')
+        return cost - deleted, deleted
+
+    common = lcsLength(before_middle, after_middle)
+    added, deleted = len(after_middle) - common, len(before_middle) - common
+    if max_cost is not None and added + deleted > max_cost:
+        return None
+    return added, deleted
@@ -1,23 +1,51 @@
-import difflib
 import secrets
+from typing import Optional
 
+from diff_utils import countTextEdit, diffTexts
+from response_utils import generateETag
 
-def calculateContentEdit(before: str, after: str) -> tuple[int, int]:
+# the recall probabilities of notes are worked out when they are read and decay with time, so the etag of a response with them
+# changes every period even if its documents don't, a client that revalidates gets recall at most this many seconds old
+RECALL_ETAG_PERIOD = 600
+
+
+def calculateContentEdit(before: str, after: str, max_cost: Optional[int] = None) -> Optional[tuple[int, int]]:
     """
     Returns the number of characters added and deleted in the edit from before to after.
 
     :param before: Original text
     :param after: Modified text
-    :return: Tuple of (added_chars, deleted_chars)
+    :param max_cost: The most added plus deleted characters the caller cares about, None if unbounded
+    :return: Tuple of (added_chars, deleted_chars), or None if more than max_cost characters were added and deleted
+    """
+    return countTextEdit(before, after, max_cost)
+
+
+def calculateContentEditOpcodes(before: str, after: str, max_cost: Optional[int] = None) -> Optional[list[tuple[str, int, int, int, int]]]:
+    """
+    Returns the edit from before to after as SequenceMatcher style opcodes.
+
+    :param before: Original text
+    :param after: Modified text
+    :param max_cost: The most added plus deleted characters the caller cares about, None if unbounded
+    :return: List of (tag, before_start, before_end, after_start, after_end) covering both texts, or None if more than
+             max_cost characters were added and deleted
     """
-    # Use SequenceMatcher to compare the strings
-    matcher = difflib.SequenceMatcher(None, before, after)
+    return diffTexts(before, after, max_cost)
 
+
+def countContentEdit(opcodes: list[tuple[str, int, int, int, int]]) -> tuple[int, int]:
+    """
+    Returns the number of characters added and deleted by the given edit opcodes.
+
+    :param opcodes: Opcodes as returned by calculateContentEditOpcodes
+    :return: Tuple of (added_chars, deleted_chars)
+    """
     added_chars = 0
     deleted_chars = 0
 
     # Iterate through the operations
-    for opcode, i1, i2, j1, j2 in matcher.get_opcodes():
+    for opcode, i1, i2, j1, j2 in opcodes:
         if opcode == 'insert':
             added_chars += j2 - j1
         elif opcode == 'delete':
@@ -49,3 +77,15 @@ def extractDocumentTitle(markdown_content: str) -> str:
             title += '...'
             break
     return title
+
+
+def generateDocumentsETag(documents: list[dict], now_timestamp: float, *parts) -> str:
+    """
+    Returns the etag of a response with the given documents, from their ids and versions and the current recall period.
+
+    :param documents: The documents as stored, only their _id and version are read
+    :param now_timestamp: The epoch timestamp the recall of their notes is worked out at
+    :param parts: Anything else the response depends on, like the page it is
+    """
+    return generateETag(int(now_timestamp // RECALL_ETAG_PERIOD), *parts,
+                        *(f"{document['_id']}/{document.get('version', 0)}" for document in documents))
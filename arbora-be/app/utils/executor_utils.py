@@ -0,0 +1,59 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+
+class ExecutorBusyError(Exception):
+    """
+    Raised when a call can't be run by a BoundedExecutor, its queue is full or the call waited in it for too long.
+    """
+
+
+class BoundedExecutor:
+    """
+    A pool of threads to run blocking calls on without blocking the event loop, with a bounded queue in front of it.
+
+    A call waits in the queue while every thread is busy. A call made when the queue is full, or that is still waiting when
+    its timeout runs out, raises ExecutorBusyError instead, so a burst of calls is turned away rather than piling up. A call
+    that has started is always waited for.
+    """
+
+    def __init__(self, no_of_workers: int, queue_size: int, queue_timeout: float, thread_name_prefix: str = ''):
+        """
+        :param no_of_workers: The most calls run at once
+        :param queue_size: The most calls waiting for a thread at once
+        :param queue_timeout: The seconds a call waits for a thread before it is turned away
+        :param thread_name_prefix: The prefix of the names of the threads
+        """
+        self.no_of_workers = no_of_workers
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        # the threads are only started by the first call
+        self.executor = ThreadPoolExecutor(max_workers=no_of_workers, thread_name_prefix=thread_name_prefix)
+        # the calls running or waiting for a thread, only changed from the event loop
+        self.no_of_pending = 0
+
+    async def run(self, function: Callable[..., Any], *args: Any) -> Any:
+        """
+        Runs a blocking call on the pool and returns its result.
+
+        :raises ExecutorBusyError: If the queue is full, or the call is still waiting for a thread after the queue timeout
+        """
+        if self.no_of_pending >= self.no_of_workers + self.queue_size:
+            raise ExecutorBusyError(f"{self.no_of_pending} calls are already running or waiting")
+        self.no_of_pending += 1
+        try:
+            future = self.executor.submit(function, *args)
+            result = asyncio.wrap_future(future)
+            try:
+                return await asyncio.wait_for(asyncio.shield(result), self.queue_timeout)
+            except asyncio.TimeoutError:
+                # a call that is still queued is dropped, one that started is waited for
+                if future.cancel():
+                    raise ExecutorBusyError(f"the call waited for a thread for over {self.queue_timeout}s")
+                return await result
+        finally:
+            self.no_of_pending -= 1
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
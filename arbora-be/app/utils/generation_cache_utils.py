@@ -0,0 +1,125 @@
+import asyncio
+import logging
+from collections import Counter, OrderedDict
+from datetime import timedelta
+from typing import Any, Awaitable, Callable
+
+from pymongo import ASCENDING
+from pymongo.errors import PyMongoError
+
+from model_utils import getCurrentTimestamp
+from string_utils import generateContentHash
+
+# the items gemini generated from content, flash cards or questions as parsed from its output before they are given ids, are
+# kept by what they were generated from, so studying the same content again doesn't generate them again. the most recently
+# used are kept in the process, and all of them in mongo until they expire
+GENERATION_CACHE_COLLECTION = "generation_cache"
+GENERATION_CACHE_TTL = timedelta(days=30)
+GENERATION_CACHE_SIZE = 256
+GENERATION_CACHE: OrderedDict[str, list[dict[str, Any]]] = OrderedDict()
+
+# the lookups of keys that aren't in the process yet, by key, for lookups of the same key made in the meantime to wait on
+GENERATIONS_IN_FLIGHT: dict[str, asyncio.Future[list[dict[str, Any]]]] = {}
+
+# how every lookup went, by service and outcome: a memory_hit, in_flight_hit, mongo_hit, miss or bypass
+GENERATION_CACHE_STATS: Counter[tuple[str, str]] = Counter()
+
+logger = logging.getLogger(__name__)
+
+
+async def createGenerationCacheIndexes(mongodb) -> None:
+    await mongodb[GENERATION_CACHE_COLLECTION].create_index([("created_at", ASCENDING)],
+                                                             expireAfterSeconds=int(GENERATION_CACHE_TTL.total_seconds()))
+
+
+def generateGenerationCacheKey(service: str, model_name: str, prompt_version: int, content: str, count: int) -> str:
+    """
+    Returns the key of what a service generates from content, content that only differs in whitespace has the same key.
+
+    :param service: The name of the service
+    :param model_name: The name of the model it generates with
+    :param prompt_version: The version of its prompt, changing the prompt changes the version so nothing is read from before it
+    :param content: The content it generates from
+    :param count: The number of items it generates
+    """
+    return f"{service}/{model_name}/{prompt_version}/{generateContentHash(' '.join(content.split()))}/{count}"
+
+
+def _rememberGeneration(key: str, items: list[dict[str, Any]]) -> None:
+    GENERATION_CACHE[key] = items
+    GENERATION_CACHE.move_to_end(key)
+    if len(GENERATION_CACHE) > GENERATION_CACHE_SIZE:
+        GENERATION_CACHE.popitem(last=False)
+
+
+async def getCachedGeneration(mongodb, service: str, key: str, generate: Callable[[], Awaitable[list[dict[str, Any]]]],
+                              bypass_cache: bool = False) -> list[dict[str, Any]]:
+    """
+    Returns the items generated for a key, from the process, then from mongo, and otherwise generates and keeps them. Lookups
+    of a key that is already being looked up share its result, so the same items aren't generated more than once at a time.
+
+    Mongo is only a cache, the items are generated if it can't be read and are still returned if it can't be written.
+
+    :param mongodb: The database, None to only keep them in the process
+    :param service: The name of the service, to count the lookup under
+    :param key: The key, from generateGenerationCacheKey
+    :param generate: Generates the items
+    :param bypass_cache: Whether to generate the items even if they are kept, the new ones replace them
+    :return: The items, shared with the cache so not to be changed
+    """
+    if bypass_cache:
+        GENERATION_CACHE_STATS[(service, "bypass")] += 1
+        return await _generateAndRemember(mongodb, key, generate)
+
+    items = GENERATION_CACHE.get(key)
+    if items is not None:
+        GENERATION_CACHE.move_to_end(key)
+        GENERATION_CACHE_STATS[(service, "memory_hit")] += 1
+        return items
+    lookup = GENERATIONS_IN_FLIGHT.get(key)
+    if lookup is not None:
+        GENERATION_CACHE_STATS[(service, "in_flight_hit")] += 1
+    else:
+        lookup = asyncio.ensure_future(_lookUpGeneration(mongodb, service, key, generate))
+        GENERATIONS_IN_FLIGHT[key] = lookup
+        lookup.add_done_callback(lambda _: GENERATIONS_IN_FLIGHT.pop(key, None))
+    # a request that is cancelled doesn't cancel the lookup the others are waiting on
+    return await asyncio.shield(lookup)
+
+
+async def _lookUpGeneration(mongodb, service: str, key: str,
+                            generate: Callable[[], Awaitable[list[dict[str, Any]]]]) -> list[dict[str, Any]]:
+    if mongodb is not None:
+        try:
+            cached_generation = await mongodb[GENERATION_CACHE_COLLECTION].find_one({"_id": key})
+        except PyMongoError:
+            logger.warning("the generation %s couldn't be read from mongo, it is generated again", key, exc_info=True)
+            cached_generation = None
+        if cached_generation is not None:
+            _rememberGeneration(key, cached_generation["items"])
+            GENERATION_CACHE_STATS[(service, "mongo_hit")] += 1
+            return cached_generation["items"]
+    GENERATION_CACHE_STATS[(service, "miss")] += 1
+    return await _generateAndRemember(mongodb, key, generate)
+
+
+async def _generateAndRemember(mongodb, key: str, generate: Callable[[], Awaitable[list[dict[str, Any]]]]) -> list[dict[str, Any]]:
+    items = await generate()
+    _rememberGeneration(key, items)
+    if mongodb is not None:
+        try:
+            await mongodb[GENERATION_CACHE_COLLECTION].replace_one({"_id": key}, {"items": items, "created_at": getCurrentTimestamp()},
+                                                                   upsert=True)
+        except PyMongoError:
+            logger.warning("the generation %s couldn't be written to mongo, it is only kept in the process", key, exc_info=True)
+    return items
+
+
+def getGenerationCacheStats() -> dict[str, dict[str, int]]:
+    """
+    Returns the number of lookups of every service by their outcome since the process started.
+    """
+    stats = {}
+    for (service, outcome), count in GENERATION_CACHE_STATS.items():
+        stats.setdefault(service, {"memory_hit": 0, "in_flight_hit": 0, "mongo_hit": 0, "miss": 0, "bypass": 0})[outcome] = count
+    return stats
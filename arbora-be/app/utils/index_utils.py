@@ -0,0 +1,18 @@
+from generation_cache_utils import createGenerationCacheIndexes
+from mongo_utils import createDocumentIndexes, createFolderIndexes, createNoteIndexes, createUserIndexes
+from study_queue_utils import createNoteScheduleIndexes
+from sync_utils import createSyncIndexes
+
+
+async def createIndexes(mongodb) -> None:
+    """
+    Declares the indexes of every query the api makes, run on startup. Indexes that already exist are left as they are, so it
+    can run on every startup.
+    """
+    await createUserIndexes(mongodb)
+    await createDocumentIndexes(mongodb)
+    await createFolderIndexes(mongodb)
+    await createNoteIndexes(mongodb)
+    await createNoteScheduleIndexes(mongodb)
+    await createSyncIndexes(mongodb)
+    await createGenerationCacheIndexes(mongodb)
@@ -1,131 +1,295 @@
-from datetime import datetime
+import bisect
+from collections import OrderedDict
 import re
-from typing import Optional
+from typing import Iterator, Optional
 
-from document_utils import calculateContentEdit
-from note import Note, NoteEdit
+from diff_utils import EDIT_COUNT_VERSION
+from model_utils import getCurrentTimestamp
+from note import Note, NoteEdit, RecallState
+from note_matching_utils import matchNotes
+from string_utils import generateContentHash
+
+
+# a heading is any line that, once stripped, is 1-6 '#'s followed by whitespace and a title.
+# the document is scanned once for headings instead of being split and matched line by line, the first line is
+# matched in place and every other heading is found through the line break before it, which the scanner can seek quickly
+HEADING_PATTERN = re.compile(r'[^\S\n]*(#{1,6})[^\S\n]+(\S(?:[^\n]*\S)?)[^\S\n]*$', re.MULTILINE)
+NEXT_HEADING_PATTERN = re.compile(r'\n' + HEADING_PATTERN.pattern, re.MULTILINE)
+
+# the most recently parsed documents keyed by their markdown, an update to one of them only re-parses the edited sections
+HEADING_STRUCTURE_CACHE_SIZE = 128
+HEADING_STRUCTURE_CACHE: OrderedDict[str, dict] = OrderedDict()
 
 
 class HeadingNode:
+    """
+    A single heading section of a markdown document.
+
+    The section body is kept as (body_start, body_end) offsets into the source markdown and is only
+    materialized, with every line stripped, the first time content is read.
+    """
+    __slots__ = ('title', 'coords', 'level', 'children', 'source', 'start', 'body_start', 'body_end', '_content',
+                 '_content_hash', '_title_hash')
+
     def __init__(self):
-        self.content = ""
         self.title = ""
         self.coords = ""
         self.level = 0
         self.children = []
+        self.source = ""
+        # offset of the heading line and the bounds of the section body in source
+        self.start = 0
+        self.body_start = 0
+        self.body_end = 0
+        self._content = None
+        self._content_hash = None
+        self._title_hash = None
+
+    @property
+    def content(self) -> str:
+        if self._content is None:
+            body = self.source[self.body_start:self.body_end]
+            self._content = '\n'.join([line.strip() for line in body.split('\n')]).strip()
+        return self._content
+
+    @content.setter
+    def content(self, content: str) -> None:
+        self._content = content
+        self._content_hash = None
+
+    @property
+    def content_hash(self) -> str:
+        if self._content_hash is None:
+            self._content_hash = generateContentHash(self.content)
+        return self._content_hash
+
+    @property
+    def title_hash(self) -> str:
+        if self._title_hash is None:
+            self._title_hash = generateContentHash(self.title)
+        return self._title_hash
+
+
+def scanMarkdownHeadings(markdown: str, start: int = 0, end: Optional[int] = None) -> Iterator[tuple[int, re.Match]]:
+    """
+    Yields the line offset and match of every heading line in markdown[start:end], start has to be the start of a line.
+    """
+    end = len(markdown) if end is None else end
+    first_match = HEADING_PATTERN.match(markdown, start, end)
+    if first_match:
+        yield start, first_match
+    for heading_match in NEXT_HEADING_PATTERN.finditer(markdown, start, end):
+        yield heading_match.start() + 1, heading_match
 
 
 def parseMarkdownHeadings(markdown: str) -> dict[str, HeadingNode]:
-    lines = markdown.split('\n')
     heading_structure = {}
+    # (level, node, is_root) of the currently open sections, root sections are never popped
     node_stack = []
-    current_content = []
-
-    for line in lines:
-        line = line.strip()
-        heading_match = re.match(r'^(#{1,6})\s+(.+)$', line)
-
-        if heading_match:
-            # Process previous heading's content
-            if node_stack:
-                last_coords = node_stack[-1][1]
-                heading_structure[last_coords].content = '\n'.join(current_content).strip()
-            current_content = []
-
-            level = len(heading_match.group(1))
-            title = heading_match.group(2)
-            coords = ''
-
-            # Pop sections of equal or higher level
-            while node_stack and node_stack[-1][0] >= level:
-                if node_stack[-1][1].count('.') == 0:
-                    break
-                node_stack.pop()
-
-            # calculate the note's coords
-            if len(node_stack) == 0:
-                coords = '1'
-            else:
-                if node_stack[-1][0] >= level:
-                    coords = str(int(node_stack[-1][1]) + 1)
-                else:
-                    coords = node_stack[-1][1] + '.' + str(len(heading_structure[node_stack[-1][1]].children) + 1)
+    root_count = 0
+    previous_node = None
+
+    for start, heading_match in scanMarkdownHeadings(markdown):
+        # the previous section's body ends where this heading's line starts
+        if previous_node is not None:
+            previous_node.body_end = start
+
+        level = heading_match.end(1) - heading_match.start(1)
 
+        # Pop sections of equal or higher level
+        while node_stack and node_stack[-1][0] >= level and not node_stack[-1][2]:
+            node_stack.pop()
+
+        # calculate the note's coords, only a root can be left on top with an equal or higher level
+        parent = None
+        if not node_stack or node_stack[-1][0] >= level:
+            root_count += 1
+            coords = str(root_count)
+        else:
+            parent = node_stack[-1][1]
+            coords = parent.coords + '.' + str(len(parent.children) + 1)
             # Add current section to its parent's children
-            if node_stack and coords.count('.') > 0:
-                parent_coords = '.'.join(coords.split('.')[:-1])
-                heading_structure[parent_coords].children.append(coords)
-
-            # Add current section to stack and structure
-            node_stack.append((level, coords))
-            node = HeadingNode()
-            node.title = title
-            node.coords = coords
-            node.level = level
-            heading_structure[coords] = node
+            parent.children.append(coords)
+
+        # Add current section to stack and structure
+        node = HeadingNode()
+        node.title = heading_match.group(2)
+        node.coords = coords
+        node.level = level
+        node.source = markdown
+        node.start = start
+        node.body_start = heading_match.end()
+        node.body_end = len(markdown)
+        node_stack.append((level, node, parent is None))
+        heading_structure[coords] = node
+        previous_node = node
+
+    return heading_structure
+
+
+def reparseMarkdownHeadings(previous_structure: dict[str, HeadingNode], new_markdown: str,
+                            edit_opcodes: list[tuple[str, int, int, int, int]]) -> dict[str, HeadingNode]:
+    """
+    Re-parses only the sections touched by an edit and splices them into the structure of the previous version.
+
+    Sections away from the edit are carried over with their offsets shifted, if the edit adds, removes or re-levels a heading
+    the coords of everything after it can change, so the whole document is parsed again instead.
+
+    :param previous_structure: Heading structure of the markdown before the edit, as returned by parseMarkdownHeadings
+    :param new_markdown: The markdown after the edit
+    :param edit_opcodes: Opcodes of the edit, as returned by calculateContentEditOpcodes
+    :return: The heading structure of new_markdown
+    """
+    previous_nodes = list(previous_structure.values())
+    if not previous_nodes or not edit_opcodes:
+        return parseMarkdownHeadings(new_markdown)
+    previous_length = edit_opcodes[-1][2]
+
+    # section 0 is the text before the first heading, section i is previous_nodes[i - 1]
+    section_bounds = [0] + [node.start for node in previous_nodes] + [previous_length]
+
+    def sectionAt(offset: int) -> int:
+        return min(bisect.bisect_right(section_bounds, offset) - 1, len(previous_nodes))
+
+    # a change can alter the line on either side of it, so the sections holding the characters next to it are affected too
+    affected_runs = []
+    for tag, i1, i2, j1, j2 in edit_opcodes:
+        if tag == 'equal':
+            continue
+        first_section = sectionAt(max(i1 - 1, 0))
+        last_section = sectionAt(max(min(i2, previous_length - 1), 0))
+        if affected_runs and first_section <= affected_runs[-1][1] + 1:
+            affected_runs[-1][1] = max(affected_runs[-1][1], last_section)
         else:
-            current_content.append(line)
+            affected_runs.append([first_section, last_section])
+
+    opcode_starts = [opcode[1] for opcode in edit_opcodes]
+
+    def newOffset(offset: int) -> int:
+        tag, i1, i2, j1, j2 = edit_opcodes[bisect.bisect_right(opcode_starts, offset) - 1]
+        return j1 + (offset - i1) if tag == 'equal' else j1
+
+    # (start, body_start, title) of every affected node in the new markdown, text in front of the first heading of a run
+    # belongs to the body of the section before it, so that section's content has to be materialized again as well
+    respliced = {}
+    stale_coords = set()
+    for first_section, last_section in affected_runs:
+        if first_section > 1:
+            stale_coords.add(previous_nodes[first_section - 2].coords)
+        region_start = 0 if section_bounds[first_section] == 0 else newOffset(section_bounds[first_section])
+        region_end = len(new_markdown) if section_bounds[last_section + 1] == previous_length else newOffset(section_bounds[last_section + 1])
+        affected_nodes = previous_nodes[max(first_section, 1) - 1:last_section]
+        heading_matches = list(scanMarkdownHeadings(new_markdown, region_start, region_end))
+        if len(heading_matches) != len(affected_nodes):
+            return parseMarkdownHeadings(new_markdown)
+        for node, (start, heading_match) in zip(affected_nodes, heading_matches):
+            if heading_match.end(1) - heading_match.start(1) != node.level:
+                return parseMarkdownHeadings(new_markdown)
+            respliced[node.coords] = (start, heading_match.end(), heading_match.group(2))
+
+    heading_structure = {}
+    previous_node = None
+    for node in previous_nodes:
+        new_node = HeadingNode()
+        new_node.coords = node.coords
+        new_node.level = node.level
+        new_node.children = node.children
+        new_node.source = new_markdown
+        if node.coords in respliced:
+            new_node.start, new_node.body_start, new_node.title = respliced[node.coords]
+        else:
+            offset = newOffset(node.start) - node.start
+            new_node.start = node.start + offset
+            new_node.body_start = node.body_start + offset
+            new_node.title = node.title
+            new_node._title_hash = node._title_hash
+            if node.coords not in stale_coords:
+                new_node._content = node._content
+                new_node._content_hash = node._content_hash
+        new_node.body_end = len(new_markdown)
+        if previous_node is not None:
+            previous_node.body_end = new_node.start
+        heading_structure[new_node.coords] = new_node
+        previous_node = new_node
+
+    return heading_structure
 
-    # Process content for the last heading
-    if node_stack:
-        last_coords = node_stack[-1][1]
-        heading_structure[last_coords].content = '\n'.join(current_content).strip()
 
+def getMarkdownHeadings(markdown: str, previous_markdown: Optional[str] = None,
+                        edit_opcodes: Optional[list[tuple[str, int, int, int, int]]] = None) -> dict[str, HeadingNode]:
+    """
+    Returns the heading structure of markdown, re-parsing only the edited sections when the previous version was parsed recently.
+
+    The returned structure is shared with later calls and should not be modified.
+
+    :param markdown: The markdown to parse
+    :param previous_markdown: The version of the markdown before the edit, if any
+    :param edit_opcodes: Opcodes of the edit from previous_markdown to markdown, as returned by calculateContentEditOpcodes
+    :return: The heading structure of markdown
+    """
+    heading_structure = HEADING_STRUCTURE_CACHE.get(markdown)
+    if heading_structure is not None:
+        HEADING_STRUCTURE_CACHE.move_to_end(markdown)
+        return heading_structure
+
+    previous_structure = None
+    if previous_markdown is not None and edit_opcodes is not None:
+        previous_structure = HEADING_STRUCTURE_CACHE.get(previous_markdown)
+    if previous_structure is not None:
+        heading_structure = reparseMarkdownHeadings(previous_structure, markdown, edit_opcodes)
+    else:
+        heading_structure = parseMarkdownHeadings(markdown)
+
+    HEADING_STRUCTURE_CACHE[markdown] = heading_structure
+    if len(HEADING_STRUCTURE_CACHE) > HEADING_STRUCTURE_CACHE_SIZE:
+        HEADING_STRUCTURE_CACHE.popitem(last=False)
     return heading_structure
 
 
 def generateNewDocumentNotes(new_markdown_content: str) -> dict[str, Note]:
-    new_heading_structure = parseMarkdownHeadings(new_markdown_content)
+    new_heading_structure = getMarkdownHeadings(new_markdown_content)
     new_document_notes = dict()
 
     for coords, node in new_heading_structure.items():
-        note = Note(created_at=datetime.now().isoformat(), edits=[], reviews=[], content=node.content,
-                    title=node.title, children=node.children, level=node.level)
+        note = Note(created_at=getCurrentTimestamp(), edits=[], reviews=[], content=node.content,
+                    title=node.title, children=node.children, level=node.level,
+                    content_hash=node.content_hash, title_hash=node.title_hash, recall_state=RecallState())
         new_document_notes[coords] = note
 
     return new_document_notes
 
 
-def generateUpdatedDocumentNotes(current_notes: dict[str, Note], new_markdown_content: str, content_change_threshold: float = 0.5) -> dict[str, Note]:
-    new_heading_structure = parseMarkdownHeadings(new_markdown_content)
+def generateUpdatedDocumentNotes(current_notes: dict[str, Note], new_markdown_content: str, content_change_threshold: float = 0.5,
+                                 current_markdown_content: Optional[str] = None,
+                                 edit_opcodes: Optional[list[tuple[str, int, int, int, int]]] = None) -> dict[str, Note]:
+    new_heading_structure = getMarkdownHeadings(new_markdown_content, current_markdown_content, edit_opcodes)
 
-    updated_document_notes = dict()
+    # every section inherits the attributes of the existing note it matches, if any, the rest become new notes
+    note_matches = matchNotes(current_notes, new_heading_structure, content_change_threshold)
 
-    new_notes_coords = set(new_heading_structure.keys())
-
-    # now we iterate through the potentially new notes again and compare them with all the potentially deleted notes
-    # if the closest content match is less than content_change_threshold different, we inherit the attributes of said note
-    for new_coords in list(new_notes_coords):
-        closest_match: Optional[tuple[str, float, int, int]] = None
-        for existing_coords in current_notes.keys():
-            added, deleted = calculateContentEdit(current_notes[existing_coords].content, new_heading_structure[new_coords].content)
-            change = (added + deleted) / (len(current_notes[existing_coords].content) + 1)
-
-            # if the headings are the same, set the closest match and break
-            if new_heading_structure[new_coords].title == current_notes[existing_coords].title:
-                closest_match = (existing_coords, change, added, deleted)
-                break
-
-            if closest_match is None or change < closest_match[1]:
-                closest_match = (existing_coords, change, added, deleted)
-
-        if closest_match and closest_match[1] < content_change_threshold:
-            note = Note(**current_notes[closest_match[0]].dict())
-            node = new_heading_structure[new_coords]
-            note.content = node.content
-            note.children = node.children
-            note.title = node.title
-            note.level = node.level
-            note.edits.append(NoteEdit(added=closest_match[2], deleted=closest_match[3], timestamp=datetime.now().isoformat()))
-            updated_document_notes[new_coords] = note
-
-            new_notes_coords.remove(new_coords)
-
-    # add the remaining potentially new notes
-    for new_coords in list(new_notes_coords):
-        node = new_heading_structure[new_coords]
-        note = Note(created_at=datetime.now().isoformat(), edits=[], reviews=[], content=node.content,
-                    title=node.title, level=node.level, children=node.children)
+    updated_document_notes = dict()
+    for new_coords, node in new_heading_structure.items():
+        if new_coords in note_matches:
+            existing_coords, added, deleted = note_matches[new_coords]
+            existing_note = current_notes[existing_coords]
+            if added == 0 and deleted == 0 and existing_note.title == node.title:
+                # an unchanged section keeps its note as it is, only its place in the tree can have moved
+                if existing_note.children == node.children and existing_note.level == node.level and existing_note.content_hash:
+                    note = existing_note
+                else:
+                    note = existing_note.model_copy(update={'children': node.children, 'level': node.level,
+                                                            'content_hash': node.content_hash, 'title_hash': node.title_hash})
+            else:
+                note = existing_note.model_copy(update={
+                    'content': node.content, 'children': node.children, 'title': node.title, 'level': node.level,
+                    'content_hash': node.content_hash, 'title_hash': node.title_hash,
+                    'edits': existing_note.edits + [NoteEdit(added=added, deleted=deleted, timestamp=getCurrentTimestamp(),
+                                                                  version=EDIT_COUNT_VERSION)],
+                })
+        else:
+            note = Note(created_at=getCurrentTimestamp(), edits=[], reviews=[], content=node.content,
+                        title=node.title, level=node.level, children=node.children,
+                        content_hash=node.content_hash, title_hash=node.title_hash, recall_state=RecallState())
         updated_document_notes[new_coords] = note
 
     return updated_document_notes
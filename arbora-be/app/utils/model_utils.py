@@ -1,5 +1,63 @@
-from typing import Annotated
+from datetime import datetime, timezone
+from typing import Annotated, Optional, Union
 
-from pydantic import BeforeValidator
+from pydantic import AfterValidator, BeforeValidator, PlainSerializer, WithJsonSchema
 
 PyObjectId = Annotated[str, BeforeValidator(str)]
+
+
+# timestamps are stored as bson datetimes, naive and in utc as mongo gives them back, and are given to the api as iso strings
+# with their utc offset by dumping responses with mode='json', so clients don't read them in their local time. everything saved before was stored as an iso string in the server's local time,
+# those are still read, until migrations/convert_timestamps.py converts them
+
+
+def getCurrentTimestamp() -> datetime:
+    """
+    Returns the current time as a naive utc datetime, the way timestamps are stored. It is to the millisecond, the precision
+    mongo stores datetimes with, so what is written is what is read back.
+    """
+    now = datetime.now(timezone.utc)
+    return now.replace(tzinfo=None, microsecond=now.microsecond // 1000 * 1000)
+
+
+def parseLegacyTimestamp(value: str) -> datetime:
+    """
+    Returns the naive utc datetime of a timestamp saved as an iso string, datetime.now().isoformat(), in the server's local time.
+    """
+    return datetime.fromisoformat(value).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def parseOptionalLegacyTimestamp(value: str) -> Optional[datetime]:
+    # unset dates of users were saved as empty strings
+    return parseLegacyTimestamp(value) if value else None
+
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def toEpochSeconds(timestamp: datetime) -> float:
+    """
+    Returns the epoch timestamp in seconds of a stored timestamp, naive timestamps are in utc.
+    """
+    if timestamp.tzinfo is not None:
+        return timestamp.timestamp()
+    return (timestamp - EPOCH).total_seconds()
+
+
+def formatTimestamp(timestamp: datetime) -> str:
+    """
+    Returns the iso string of a stored timestamp with its utc offset, naive timestamps are in utc.
+    """
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.astimezone(timezone.utc).isoformat()
+
+
+# datetimes, the stored format, are validated without going through python, only iso strings are parsed
+Timestamp = Annotated[Union[datetime, Annotated[str, AfterValidator(parseLegacyTimestamp)]],
+                      PlainSerializer(formatTimestamp, when_used='json'),
+                      WithJsonSchema({"type": "string", "format": "date-time"})]
+# a date that may not be set yet, given to the api as an empty string
+OptionalTimestamp = Annotated[Optional[Union[datetime, Annotated[str, AfterValidator(parseOptionalLegacyTimestamp)]]],
+                              PlainSerializer(lambda value: '' if value is None else formatTimestamp(value), when_used='json'),
+                              WithJsonSchema({"type": "string"})]
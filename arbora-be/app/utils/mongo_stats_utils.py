@@ -0,0 +1,89 @@
+import threading
+from contextvars import ContextVar
+from typing import Optional
+
+from pymongo import monitoring
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# the mongo operations of a request are counted by a command listener of the client, against the stats of the request the
+# operation was made in. motor runs operations in threads with a copy of the context of the request, so the stats are found
+# through a context variable
+
+MONGO_OPERATIONS_HEADER = "X-Mongo-Operations"
+MONGO_DURATION_HEADER = "X-Mongo-Duration-Ms"
+
+
+class MongoOperationStats:
+    """
+    The number of mongo operations, round trips to the database, made while handling a request and the time they took.
+    """
+
+    def __init__(self):
+        self.no_of_operations = 0
+        self.duration_micros = 0
+        # operations made at once complete in different threads
+        self._lock = threading.Lock()
+
+    def record(self, duration_micros: int) -> None:
+        with self._lock:
+            self.no_of_operations += 1
+            self.duration_micros += duration_micros
+
+
+_request_stats: ContextVar[Optional[MongoOperationStats]] = ContextVar("request_mongo_stats", default=None)
+
+
+def startMongoOperationStats() -> MongoOperationStats:
+    """
+    Starts counting the mongo operations made in the current context and the ones it starts, returns their stats.
+    """
+    stats = MongoOperationStats()
+    _request_stats.set(stats)
+    return stats
+
+
+class MongoStatsListener(monitoring.CommandListener):
+    """
+    Records every command that completes against the stats of the request it was made in, to pass to the client's event_listeners.
+    """
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        pass
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self._record(event.duration_micros)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._record(event.duration_micros)
+
+    @staticmethod
+    def _record(duration_micros: int) -> None:
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.record(duration_micros)
+
+
+class MongoStatsMiddleware:
+    """
+    Adds the number of mongo operations each request made, and the time they took, to its response headers. Streamed responses
+    only count the operations made before they start.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = startMongoOperationStats()
+
+        async def sendWithStats(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append(MONGO_OPERATIONS_HEADER, str(stats.no_of_operations))
+                headers.append(MONGO_DURATION_HEADER, f"{stats.duration_micros / 1000:.2f}")
+            await send(message)
+
+        await self.app(scope, receive, sendWithStats)
@@ -0,0 +1,243 @@
+import logging
+from datetime import datetime
+from typing import Any, Optional
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import DuplicateKeyError
+
+from note import NoteReview, RecallState
+from note_review_utils import HALF_LIFE, RECALL_FORMULA_VERSION, createRecallState
+
+# note ids are dotted coords like '1.2', which mongo would read as a path into nested fields, so single notes are
+# read and written through $getField/$setField in aggregation expressions and pipeline updates instead
+
+# the notes of a document are either stored inside it, keyed by note id, or, for documents with notes_in_collection set, as
+# items of the notes collection with the document's _id as document_id and their id as note_id, so a change to a note is
+# written to it alone. see note_storage_utils
+NOTES_COLLECTION = "notes"
+NOTES_IN_COLLECTION_FIELD = "notes_in_collection"
+
+logger = logging.getLogger(__name__)
+
+
+def noteFieldExpression(note_id: str) -> dict:
+    """
+    Returns an aggregation expression that evaluates to the note with the given id of the document.
+    """
+    return {"$getField": {"field": {"$literal": note_id}, "input": "$notes"}}
+
+
+def notesExistFilter(note_ids: list[str]) -> dict:
+    """
+    Returns a query filter that only matches documents that have every one of the given notes.
+
+    :param note_ids: Ids of the notes that have to exist
+    :return: A query filter to merge into the filter of a find or update
+    """
+    return {"$expr": {"$and": [{"$eq": [{"$type": noteFieldExpression(note_id)}, "object"]} for note_id in note_ids]}}
+
+
+def mergeRecallStateExpression(state: Any, other_state: RecallState) -> dict:
+    """
+    Returns an aggregation expression that merges a recall state into the recall state state evaluates to, the same as
+    note_review_utils.mergeRecallStates. A missing state is left missing, it is backfilled from the note's reviews instead.
+    """
+    accumulators = {}
+    for review_type, half_life in HALF_LIFE.items():
+        # accumulator * 0.5 ^ ((reference_timestamp - its reference timestamp) / seconds in a day / half life)
+        decayed = [
+            {"$multiply": [{"$ifNull": [f"$$state.accumulators.{review_type}", 0]},
+                           {"$pow": [0.5, {"$divide": [{"$subtract": ["$$reference_timestamp", "$$state.reference_timestamp"]},
+                                                       60 * 60 * 24 * half_life]}]}]},
+        ]
+        if other_state.accumulators.get(review_type):
+            decayed.append({"$multiply": [other_state.accumulators[review_type],
+                                          {"$pow": [0.5, {"$divide": [{"$subtract": ["$$reference_timestamp", other_state.reference_timestamp]},
+                                                                      60 * 60 * 24 * half_life]}]}]})
+        accumulators[review_type] = {"$add": decayed}
+
+    merged_state = {"$let": {
+        "vars": {"reference_timestamp": {"$max": ["$$state.reference_timestamp", other_state.reference_timestamp]}},
+        "in": {"version": other_state.version, "reference_timestamp": "$$reference_timestamp", "accumulators": accumulators},
+    }}
+    return {"$let": {
+        "vars": {"state": state},
+        "in": {"$cond": [{"$eq": [{"$type": "$$state"}, "object"]}, merged_state, "$$REMOVE"]},
+    }}
+
+
+def appendNoteReviewsUpdate(reviews_by_note: dict[str, list[dict[str, Any]]]) -> list[dict]:
+    """
+    Returns a pipeline update that appends reviews to the reviews of notes, and adds them to their recall state, in a single
+    atomic write.
+
+    :param reviews_by_note: Dict of note ids to the reviews to append to them
+    :return: The update pipeline to pass to update_one or an UpdateOne
+    """
+    # every note is set once on top of the previous ones, and read from the notes as they were before the update
+    notes = "$notes"
+    for note_id, reviews in reviews_by_note.items():
+        note = noteFieldExpression(note_id)
+        updated_reviews, updated_recall_state = appendReviewsExpressions(note, reviews)
+        updated_note = {"$setField": {"field": "recall_state", "input": {"$setField": {"field": "reviews", "input": note, "value": updated_reviews}},
+                                      "value": updated_recall_state}}
+        notes = {"$setField": {"field": {"$literal": note_id}, "input": notes, "value": updated_note}}
+    return [{"$set": {"notes": notes}}]
+
+
+def appendNoteItemReviewsUpdate(reviews: list[dict[str, Any]]) -> list[dict]:
+    """
+    Returns a pipeline update that appends reviews to the reviews of an item of the notes collection, and adds them to its
+    recall state, in a single atomic write.
+    """
+    updated_reviews, updated_recall_state = appendReviewsExpressions("$$ROOT", reviews)
+    return [{"$set": {"reviews": updated_reviews, "recall_state": updated_recall_state}}]
+
+
+def appendReviewsExpressions(note: Any, reviews: list[dict[str, Any]]) -> tuple[dict, dict]:
+    # the reviews of the note note evaluates to with the reviews appended, and its recall state with them merged in
+    updated_reviews = {"$concatArrays": [{"$ifNull": [{"$getField": {"field": "reviews", "input": note}}, []]}, {"$literal": reviews}]}
+    updated_recall_state = mergeRecallStateExpression({"$getField": {"field": "recall_state", "input": note}},
+                                                      createRecallState([NoteReview(**review) for review in reviews]))
+    return updated_reviews, updated_recall_state
+
+
+def recordDocumentChangeStage(timestamp: datetime) -> dict:
+    """
+    Returns the pipeline update stage that increments the version of a document and sets when it was last updated, for the
+    pipeline updates $inc can't be used in.
+    """
+    return {"$set": {"version": {"$add": [{"$ifNull": ["$version", 0]}, 1]}, "updated_at": {"$literal": timestamp}}}
+
+
+def setNoteFieldsUpdate(fields_by_note: dict[str, dict[str, Any]]) -> list[dict]:
+    """
+    Returns a pipeline update that sets fields of notes in a single atomic write.
+
+    :param fields_by_note: Dict of note ids to the values to set by field name
+    :return: The update pipeline to pass to update_one or an UpdateOne
+    """
+    notes = "$notes"
+    for note_id, fields in fields_by_note.items():
+        note = noteFieldExpression(note_id)
+        for field, value in fields.items():
+            note = {"$setField": {"field": field, "input": note, "value": {"$literal": value}}}
+        notes = {"$setField": {"field": {"$literal": note_id}, "input": notes, "value": note}}
+    return [{"$set": {"notes": notes}}]
+
+
+async def findCreatorId(collection, item_id: ObjectId) -> Optional[str]:
+    """
+    Returns the id of the creator of an item, None if it doesn't exist. Writes are filtered by the creator of what they change,
+    this finds out why one didn't change anything.
+    """
+    item = await collection.find_one({"_id": item_id}, {"creator_id": 1})
+    return item["creator_id"] if item is not None else None
+
+
+async def createUserIndexes(mongodb) -> None:
+    # users log in with their email, and no two users can have the same one
+    await createUniqueIndex(mongodb["users"], [("email", ASCENDING)])
+
+
+async def createDocumentIndexes(mongodb) -> None:
+    # the documents of a user are listed newest first, paginated by _id, and all of them through the same index
+    await mongodb["documents"].create_index([("creator_id", ASCENDING), ("_id", DESCENDING)])
+
+
+async def createNoteIndexes(mongodb) -> None:
+    # the notes of a document are read, and each of them written, through the index that keeps them unique
+    await mongodb[NOTES_COLLECTION].create_index([("document_id", ASCENDING), ("note_id", ASCENDING)], unique=True)
+
+
+async def createFolderIndexes(mongodb) -> None:
+    # the folders of a user are listed through the same index that keeps their names unique
+    await createUniqueIndex(mongodb["folders"], [("creator_id", ASCENDING), ("name", ASCENDING)])
+
+
+async def createUniqueIndex(collection, keys: list[tuple[str, int]]) -> None:
+    """
+    Creates a unique index. Nothing else keeps the keys unique, so if the collection already has duplicates the error is
+    logged and raised, and the api doesn't start until they are cleaned up.
+    """
+    try:
+        await collection.create_index(keys, unique=True)
+    except DuplicateKeyError:
+        logger.error("the %s collection has duplicate %s, clean them up so the unique index on them can be created",
+                     collection.name, ", ".join(key for key, _ in keys))
+        raise
+
+
+def lookupNoteItemsStage(projection: dict) -> dict:
+    """
+    Returns the aggregation stage that joins the items of the notes collection of every document into its note_items, a list
+    of the given projection of them. Documents with their notes inside them have none.
+    """
+    return {"$lookup": {"from": NOTES_COLLECTION, "localField": "_id", "foreignField": "document_id", "as": "note_items",
+                        "pipeline": [{"$project": projection}]}}
+
+
+def noteItemProjection() -> dict:
+    # the fields of an item of the notes collection that are the note's, without what it is stored with
+    return {"_id": 0, "document_id": 0, "creator_id": 0}
+
+
+def noteSummaryFields(note: str, note_id: str) -> dict:
+    # the fields of the summary of the note at the path note, like "$$note.v", with the id at the path note_id
+    return {
+        "k": note_id,
+        "title": f"{note}.title",
+        "level": f"{note}.level",
+        "children": f"{note}.children",
+        "recall_state": f"{note}.recall_state",
+        # the reviews are only needed to work out the recall state of notes that haven't got one of the current version
+        "reviews": {"$cond": [{"$eq": [f"{note}.recall_state.version", RECALL_FORMULA_VERSION]}, "$$REMOVE", f"{note}.reviews"]},
+    }
+
+
+def rescheduledNoteExpression(note_id: Any, reviewed_note_ids: list[str]) -> dict:
+    """
+    Returns an aggregation expression of whether the note with the id note_id evaluates to is needed to reschedule the given
+    reviewed notes, one of them, a note under them or a note above them. The coords of a note start with the coords of the
+    notes above it.
+    """
+    branch_ids = {'.'.join(coords.split('.')[:length]) for coords in reviewed_note_ids for length in range(1, coords.count('.') + 2)}
+    return {"$or": [
+        {"$in": [note_id, sorted(branch_ids)]},
+        *[{"$eq": [{"$indexOfCP": [note_id, f"{coords}."]}, 0]} for coords in reviewed_note_ids],
+    ]}
+
+
+def rescheduledNoteSummariesExpression(reviewed_note_ids: list[str]) -> dict:
+    """
+    Returns an aggregation expression that evaluates to the summaries of the notes of a document needed to reschedule the given
+    reviewed notes, as a list of {"k": note id, ...} as in documentSummaryStages.
+    """
+    return {"$map": {
+        "input": {"$filter": {"input": {"$objectToArray": "$notes"}, "as": "note",
+                              "cond": rescheduledNoteExpression("$$note.k", reviewed_note_ids)}},
+        "as": "note",
+        "in": noteSummaryFields("$$note.v", "$$note.k"),
+    }}
+
+
+def documentSummaryStages() -> list[dict]:
+    """
+    Returns the aggregation stages that project documents into their summaries, their title, folder, last update and the
+    structure and recall state of their notes, without their content or the contents, edits and reviews of their notes.
+
+    The notes are projected as a list of {"k": note id, ...} as mongo can't build an object with dotted keys.
+    """
+    embedded_notes = {"$map": {"input": {"$objectToArray": "$notes"}, "as": "note", "in": noteSummaryFields("$$note.v", "$$note.k")}}
+    return [
+        lookupNoteItemsStage({"_id": 0, **noteSummaryFields("$$ROOT", "$note_id")}),
+        {"$project": {
+            "title": 1,
+            "folder_id": 1,
+            "version": 1,
+            # documents saved before they kept their last update were last updated when they were created at the latest
+            "updated_at": {"$ifNull": ["$updated_at", {"$toDate": "$_id"}]},
+            "notes": {"$cond": [{"$eq": [f"${NOTES_IN_COLLECTION_FIELD}", True]}, "$note_items", embedded_notes]},
+        }},
+    ]
@@ -0,0 +1,179 @@
+import bisect
+import heapq
+import math
+from collections import Counter
+from typing import Any, Optional
+
+from document_utils import calculateContentEdit
+from note import Note
+from string_utils import generateContentHash
+
+# content is broken into overlapping character shingles, the shingles two notes share bound how small the edit between them can be,
+# and the smallest hashes of their shingles (bottom-k minhash) estimate how similar they are to decide which gets diffed first
+SHINGLE_SIZE = 4
+SKETCH_SIZE = 32
+
+
+class NoteProfile:
+    """
+    The cheap to compare summary of an existing note that the matcher prefilters candidates with.
+    """
+    __slots__ = ('position', 'coords', 'title', 'content', 'length', 'char_counts', 'shingle_counts', 'sketch')
+
+    def __init__(self, position: int, coords: str, title: str, content: str):
+        self.position = position
+        self.coords = coords
+        self.title = title
+        self.content = content
+        self.length = len(content)
+        self.char_counts = Counter(content)
+        self.shingle_counts = countShingles(content)
+        self.sketch = sketchShingles(self.shingle_counts)
+
+
+def countShingles(content: str) -> Counter:
+    return Counter(content[i:i + SHINGLE_SIZE] for i in range(len(content) - SHINGLE_SIZE + 1))
+
+
+def sketchShingles(shingle_counts: Counter) -> frozenset[int]:
+    return frozenset(heapq.nsmallest(SKETCH_SIZE, map(hash, shingle_counts)))
+
+
+def getFingerprint(item: Any) -> tuple[str, str]:
+    # (title_hash, content_hash) of a note or section, hashed here if it doesn't carry them
+    title_hash = getattr(item, 'title_hash', '') or generateContentHash(item.title)
+    content_hash = getattr(item, 'content_hash', '') or generateContentHash(item.content)
+    return title_hash, content_hash
+
+
+def estimateSimilarity(sketch: frozenset[int], other_sketch: frozenset[int]) -> float:
+    union_sketch = heapq.nsmallest(SKETCH_SIZE, sketch | other_sketch)
+    if not union_sketch:
+        return 1
+    return sum(1 for shingle in union_sketch if shingle in sketch and shingle in other_sketch) / len(union_sketch)
+
+
+def matchNotes(current_notes: dict[str, Note], new_sections: dict[str, Any], content_change_threshold: float = 0.5) -> dict[str, tuple[str, int, int]]:
+    """
+    Matches the sections of an updated document to the notes they continue, every note is inherited by at most one section.
+
+    Sections with an unchanged title and content are matched through an index of the notes' fingerprints. Every other section is matched to the
+    existing note it changed the least, preferring notes with the same title, as long as the change is less than
+    content_change_threshold. Candidates are pruned with bounds on the edit size before any diff is run.
+
+    :param current_notes: The notes of the previous version of the document by their coords
+    :param new_sections: The sections of the updated document by their coords, anything with a title and content
+    :param content_change_threshold: The largest (added + deleted) / (len(note content) + 1) a section can inherit a note with
+    :return: Dict of section coords to (note coords, added_chars, deleted_chars) for every section that inherits a note
+    """
+    matches = {}
+
+    # sections that are exactly the same as a note inherit it without a diff
+    exact_index = {}
+    for coords, note in current_notes.items():
+        exact_index.setdefault(getFingerprint(note), []).append(coords)
+    unmatched_sections = []
+    for coords, section in new_sections.items():
+        exact_matches = exact_index.get(getFingerprint(section))
+        if exact_matches:
+            matches[coords] = (exact_matches.pop(0), 0, 0)
+        else:
+            unmatched_sections.append(coords)
+
+    if not unmatched_sections:
+        return matches
+
+    matched_notes = {match[0] for match in matches.values()}
+    profiles = [NoteProfile(position, coords, current_notes[coords].title, current_notes[coords].content)
+                for position, coords in enumerate(current_notes.keys()) if coords not in matched_notes]
+    title_index = {}
+    for profile in profiles:
+        title_index.setdefault(profile.title, []).append(profile)
+    profiles_by_length = sorted(profiles, key=lambda profile: profile.length)
+    lengths = [profile.length for profile in profiles_by_length]
+    taken = set()
+
+    def measure(profile: NoteProfile, content: str, char_counts: Counter, shingle_counts: Counter, best: Optional[tuple]) -> Optional[tuple]:
+        # (added + deleted) can't be less than the difference in length, nor than the characters the two don't have in common
+        denominator = profile.length + 1
+        common_chars = sum((profile.char_counts & char_counts).values())
+        least_edit = max(abs(profile.length - len(content)), profile.length + len(content) - 2 * common_chars)
+        if least_edit / denominator >= content_change_threshold:
+            return best
+        # and every added or deleted character breaks at most SHINGLE_SIZE of the shingles the two would have in common
+        common_shingles = sum((profile.shingle_counts & shingle_counts).values())
+        missing_shingles = max(profile.length, len(content)) - SHINGLE_SIZE + 1 - common_shingles
+        least_edit = max(least_edit, math.ceil(missing_shingles / SHINGLE_SIZE))
+        least_change = least_edit / denominator
+        if least_change >= content_change_threshold:
+            return best
+        if best is not None and (least_change, profile.position) > (best[0], best[1].position):
+            return best
+        # the diff is given up on as soon as it is too large to be under the threshold or to beat the best match so far
+        max_cost = math.ceil(content_change_threshold * denominator) - 1
+        if best is not None:
+            max_cost = min(max_cost, math.floor(best[0] * denominator + 1e-9))
+        edit = calculateContentEdit(profile.content, content, max_cost=max_cost)
+        if edit is None:
+            return best
+        added, deleted = edit
+        change = (added + deleted) / denominator
+        if change >= content_change_threshold:
+            return best
+        if best is None or (change, profile.position) < (best[0], best[1].position):
+            return change, profile, added, deleted
+        return best
+
+    def proposeTitleMatch(coords: str) -> Optional[tuple]:
+        section = new_sections[coords]
+        best = None
+        for profile in title_index.get(section.title, ()):
+            if profile.position not in taken:
+                best = measure(profile, section.content, Counter(section.content), countShingles(section.content), best)
+        return best
+
+    def proposeContentMatch(coords: str) -> Optional[tuple]:
+        content = new_sections[coords].content
+        char_counts = Counter(content)
+        shingle_counts = countShingles(content)
+
+        # only notes with a length within the threshold of the section's can be close enough
+        threshold = content_change_threshold
+        lowest_length = (len(content) - threshold) / (1 + threshold)
+        highest_length = (len(content) + threshold) / (1 - threshold) if threshold < 1 else float('inf')
+        window = profiles_by_length[bisect.bisect_right(lengths, lowest_length):bisect.bisect_left(lengths, highest_length)]
+
+        # diff the most similar looking notes first so the bounds prune the rest
+        sketch = sketchShingles(shingle_counts)
+        candidates = sorted((profile for profile in window if profile.position not in taken),
+                            key=lambda profile: -estimateSimilarity(sketch, profile.sketch))
+        best = None
+        for profile in candidates:
+            best = measure(profile, content, char_counts, shingle_counts, best)
+        return best
+
+    # every title match is assigned before any content match, when two sections want the same note the one that changed it
+    # least gets it and the other falls back to its next best match
+    section_positions = {coords: position for position, coords in enumerate(new_sections.keys())}
+    for propose in (proposeTitleMatch, proposeContentMatch):
+        proposals = []
+        for coords in unmatched_sections:
+            proposal = propose(coords)
+            if proposal is not None:
+                change, profile, added, deleted = proposal
+                heapq.heappush(proposals, (change, section_positions[coords], profile.position, coords, profile, added, deleted))
+
+        while proposals:
+            change, _, position, coords, profile, added, deleted = heapq.heappop(proposals)
+            if position in taken:
+                proposal = propose(coords)
+                if proposal is not None:
+                    change, profile, added, deleted = proposal
+                    heapq.heappush(proposals, (change, section_positions[coords], profile.position, coords, profile, added, deleted))
+                continue
+            taken.add(position)
+            matches[coords] = (profile.coords, added, deleted)
+
+        unmatched_sections = [coords for coords in unmatched_sections if coords not in matches]
+
+    return matches
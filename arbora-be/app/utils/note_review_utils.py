@@ -1,4 +1,10 @@
-from note import NoteReview, Note
+from typing import Optional
+
+import numpy as np
+
+from model_utils import parseLegacyTimestamp, toEpochSeconds
+from note import NoteReview, Note, RecallState
+from note_tree_utils import NO_NOTE, NoteTree
 from datetime import datetime
 
 # the amount of time in days it takes for a user to forget 50% of the information given
@@ -12,38 +18,189 @@ HALF_LIFE = {
 
 DEPTH_DECAY = 0.9
 
+# a note is due for review once its recall probability, parents included, drops below this
+DUE_RECALL_PROBABILITY = 0.5
+
+# the half life of every review type, in the order of HALF_LIFE, for computing in bulk
+HALF_LIFE_ARRAY = np.array(list(HALF_LIFE.values()), dtype=float)
 
-# recall probability is calculated by iterating over every note review sorted by date and for each review,
 
-# calculating the probability that the user remembers the information and multiplying it by the
-# probability they have forgotten the information by that point, then adding this to the
-# cumulative recall probability
+# recall probability is calculated from the reviews of each type separately, every review adds its score to its type's
+# recall, halving every half life since the review was made, and the note is remembered unless every type's recall fails:
+#
+#   recall = 1 - (1 - min(1, S_flash_cards)) * (1 - min(1, S_multiple_choice_questions)) * ...
+#   S_type = sum of score * 0.5 ^ (days since the review / HALF_LIFE[type]) over the reviews of that type
+#
+# as each S_type decays at a single rate it is kept as an accumulator at a reference timestamp in the note's recall state, so
+# adding a review or reading the recall never has to go through the note's earlier reviews.
+#
+# version 1 decayed every review from the note's first review and combined them one by one, it could only be computed by
+# replaying the whole review history.
 #
 # todo: use note content size and edits made made to make this more accurate
-def calculateRecallProbability(note_reviews: list[NoteReview]) -> float:
+RECALL_FORMULA_VERSION = 2
+
+
+def _decay(review_type: str, seconds: float) -> float:
+    return 0.5 ** ((seconds / (60 * 60 * 24)) / HALF_LIFE[review_type])
+
+
+def mergeRecallStates(state: RecallState, other_state: RecallState) -> RecallState:
+    """
+    Returns the recall state of the reviews of both states, both are decayed to the later of their reference timestamps.
+    """
+    reference_timestamp = max(state.reference_timestamp, other_state.reference_timestamp)
+    accumulators = {}
+    for review_type in HALF_LIFE:
+        accumulator = (state.accumulators.get(review_type, 0) * _decay(review_type, reference_timestamp - state.reference_timestamp) +
+                       other_state.accumulators.get(review_type, 0) * _decay(review_type, reference_timestamp - other_state.reference_timestamp))
+        if accumulator:
+            accumulators[review_type] = accumulator
+    return RecallState(version=RECALL_FORMULA_VERSION, reference_timestamp=reference_timestamp, accumulators=accumulators)
+
+
+def _createRecallState(reviews: list[tuple[str, float, float]]) -> RecallState:
+    # the recall state of (review_type, score, epoch timestamp) reviews
+    if not reviews:
+        return RecallState(version=RECALL_FORMULA_VERSION)
+    reference_timestamp = max(review_timestamp for _, _, review_timestamp in reviews)
+    accumulators = {}
+    for review_type, score, review_timestamp in reviews:
+        accumulators[review_type] = accumulators.get(review_type, 0) + score * _decay(review_type, reference_timestamp - review_timestamp)
+    return RecallState(version=RECALL_FORMULA_VERSION, reference_timestamp=reference_timestamp, accumulators=accumulators)
+
+
+def createRecallState(note_reviews: list[NoteReview]) -> RecallState:
+    """
+    Returns the recall state of the given reviews, in any order.
+    """
+    return _createRecallState([(review.review_type, review.score, toEpochSeconds(review.timestamp)) for review in note_reviews])
+
+
+def evaluateRecallState(state: RecallState, now_timestamp: Optional[float] = None) -> float:
+    """
+    Returns the recall probability of a note with the given recall state at now_timestamp, now if None.
+    """
+    now_timestamp = datetime.now().timestamp() if now_timestamp is None else now_timestamp
+    forgotten = 1
+    for review_type, accumulator in state.accumulators.items():
+        forgotten *= 1 - min(1, accumulator * _decay(review_type, now_timestamp - state.reference_timestamp))
+    return 1 - forgotten
+
+
+def evaluateBranchRecall(branch_states: list[RecallState], now_timestamp: float) -> float:
+    """
+    Returns the recall probability of a note with its parent notes' recall added, the same as updateAllNotesRecallProbabilities.
+
+    :param branch_states: The recall states of the root note, its child, and so on down to the note
+    :param now_timestamp: The epoch timestamp to compute the recall at
+    """
     recall = 0
-    now_timestamp = datetime.now().timestamp()
-    # convert the iso timestamp strings to datetime objects
-    note_reviews.sort(key=lambda x: datetime.fromisoformat(x.timestamp).timestamp())
-    for review in note_reviews:
-        review_recall = (0.5 ** (
-                ((now_timestamp - datetime.fromisoformat(note_reviews[0].timestamp).timestamp()) / (60 * 60 * 24)) / HALF_LIFE[review.review_type]) *
-                         review.score)
-        recall += (1 - recall) * review_recall
+    for state in branch_states:
+        note_recall = evaluateRecallState(state, now_timestamp)
+        recall = note_recall + (recall * DEPTH_DECAY) * (1 - note_recall)
     return recall
 
 
+def calculateNextDueTimestamp(branch_states: list[RecallState], due_recall_probability: float = DUE_RECALL_PROBABILITY) -> float:
+    """
+    Returns the epoch timestamp at which the recall of a note, parents included, drops below due_recall_probability.
+
+    Past the latest review of the branch every recall only decays, so the timestamp is found by tripling the time waited until
+    the recall is below due_recall_probability and then bisecting.
+
+    :param branch_states: The recall states of the root note, its child, and so on down to the note
+    :param due_recall_probability: The recall probability the note is due at
+    """
+    latest_timestamp = max(state.reference_timestamp for state in branch_states)
+    if evaluateBranchRecall(branch_states, latest_timestamp) < due_recall_probability:
+        return latest_timestamp
+
+    # the recall is above due_recall_probability at low and below it at high
+    low, high = latest_timestamp, latest_timestamp + 60 * 60 * 24
+    while evaluateBranchRecall(branch_states, high) >= due_recall_probability:
+        low, high = high, high + 2 * (high - latest_timestamp)
+    # to the second
+    while high - low > 1:
+        middle = (low + high) / 2
+        if evaluateBranchRecall(branch_states, middle) >= due_recall_probability:
+            low = middle
+        else:
+            high = middle
+    return high
+
+
+def calculateRecallProbability(note_reviews: list[NoteReview]) -> float:
+    return evaluateRecallState(createRecallState(note_reviews))
+
+
 # the recall of each note is influenced by its parent notes
 # the parent recall is multiplied by the probability that the note has been forgotten and added to the current note recall
 def updateNotesRecallProbabilities(notes: dict[str, Note]) -> None:
-    root_note_ids = [key for key in notes.keys() if '.' not in key]
+    updateAllNotesRecallProbabilities([notes])
+
+
+def getNoteRecallState(note: dict) -> dict:
+    """
+    Returns the recall state stored on a note as a dict, or works it out from its reviews if it hasn't got one of the current version.
+    """
+    state = note.get('recall_state')
+    if state and state.get('version') == RECALL_FORMULA_VERSION:
+        return state
+    # the reviews are read as they are stored, their timestamps are datetimes unless they were saved before timestamps were
+    return _createRecallState([
+        (review['review_type'], review['score'],
+         toEpochSeconds(review['timestamp'] if isinstance(review['timestamp'], datetime) else parseLegacyTimestamp(review['timestamp'])))
+        for review in (note.get('reviews') or [])
+    ]).model_dump()
+
+
+def updateAllNotesRecallProbabilities(notes_list: list[dict[str, Note]], now_timestamp: Optional[float] = None) -> None:
+    """
+    Updates the recall probability of every note of every notes dict in place, all of them computed at once.
+
+    The recall states of the notes are laid out as arrays of reference timestamps and accumulators, so the recall of all the
+    notes is worked out with a handful of array operations, and the parent recall is then propagated one depth at a time.
+    Notes that haven't got a recall state yet have it worked out from their reviews.
+
+    :param notes_list: The notes dicts, keyed by note id, of every document to update
+    :param now_timestamp: The epoch timestamp to compute the recall at, now if None
+    """
+    now_timestamp = datetime.now().timestamp() if now_timestamp is None else now_timestamp
+
+    # every note reachable from a root, the notes of each document after the ones of the documents before it
+    notes = []
+    parent_indices = []
+    depths = []
+    reference_timestamps = []
+    accumulators = []
+    for document_notes in notes_list:
+        tree = NoteTree.fromNotes(document_notes)
+        offset = len(notes)
+        tree_parents = np.frombuffer(tree.parents, dtype=np.int32)
+        parent_indices.append(np.where(tree_parents == NO_NOTE, NO_NOTE, tree_parents + offset))
+        depths.append(np.frombuffer(tree.depths, dtype=np.int32))
+        for coords in tree.coords:
+            note = document_notes[coords]
+            notes.append(note)
+            state = getNoteRecallState(note)
+            reference_timestamps.append(state['reference_timestamp'])
+            accumulators.append([state['accumulators'].get(review_type, 0) for review_type in HALF_LIFE])
+
+    if not notes:
+        return
+
+    # a row of accumulators per note and a column per review type, decayed from each note's reference timestamp to now
+    elapsed_days = (now_timestamp - np.array(reference_timestamps, dtype=float)) / (60 * 60 * 24)
+    type_recalls = np.array(accumulators, dtype=float) * 0.5 ** (elapsed_days[:, np.newaxis] / HALF_LIFE_ARRAY[np.newaxis, :])
+    recalls = 1 - np.prod(1 - np.minimum(type_recalls, 1), axis=1)
 
-    def updateRecallProbabilities(note_id: str, parent_recall: float) -> None:
-        note = notes[note_id]
-        note['recall_probability'] = calculateRecallProbability([NoteReview(**review) for review in (note['reviews'] if note['reviews'] else [])])
-        note['recall_probability'] += (parent_recall * DEPTH_DECAY) * (1 - note['recall_probability'])
-        for child_id in note['children']:
-            updateRecallProbabilities(child_id, note['recall_probability'])
+    # a parent's recall is final before its children's is updated, as it is one depth lower
+    parent_indices = np.concatenate(parent_indices)
+    depths = np.concatenate(depths)
+    for depth in range(1, depths.max() + 1):
+        at_depth = np.flatnonzero(depths == depth)
+        recalls[at_depth] += (recalls[parent_indices[at_depth]] * DEPTH_DECAY) * (1 - recalls[at_depth])
 
-    for root_note_id in root_note_ids:
-        updateRecallProbabilities(root_note_id, 0)
+    for note, recall in zip(notes, recalls.tolist()):
+        note['recall_probability'] = recall
@@ -0,0 +1,318 @@
+import asyncio
+from datetime import datetime
+from typing import Any, Optional
+
+from bson import ObjectId
+from pymongo import DeleteMany, ReturnDocument, UpdateOne
+from pymongo.errors import WriteError
+
+from mongo_utils import NOTES_COLLECTION, NOTES_IN_COLLECTION_FIELD, appendNoteItemReviewsUpdate, appendNoteReviewsUpdate, \
+    lookupNoteItemsStage, noteItemProjection, noteSummaryFields, notesExistFilter, recordDocumentChangeStage, rescheduledNoteExpression, \
+    rescheduledNoteSummariesExpression
+from note_tree_utils import coordsSortKey
+
+# documents are read and written through these whichever layout their notes are stored in, see mongo_utils. new documents are
+# saved in the layout of settings.NOTES_IN_COLLECTION, and migrations/normalize_notes.py moves the notes of saved ones
+
+
+def isNotesInCollection(document: dict) -> bool:
+    return document.get(NOTES_IN_COLLECTION_FIELD) is True
+
+
+def toNoteItems(document_id: ObjectId, creator_id: str, notes: dict[str, dict]) -> list[dict]:
+    """
+    Returns the items of the notes collection of the notes of a document.
+    """
+    return [{"document_id": document_id, "creator_id": creator_id, "note_id": note_id, **note} for note_id, note in notes.items()]
+
+
+async def insertDocument(mongodb, document: dict, notes_in_collection: bool) -> None:
+    """
+    Inserts a document, with its notes inside it or in the notes collection, and sets its _id.
+
+    :param mongodb: The database
+    :param document: The document as stored, with its notes
+    :param notes_in_collection: Whether its notes are stored in the notes collection
+    """
+    if not notes_in_collection:
+        await mongodb["documents"].insert_one(document)
+        return
+    # the notes are inserted first, so the document is never read without them
+    document.setdefault("_id", ObjectId())
+    if document["notes"]:
+        await mongodb[NOTES_COLLECTION].insert_many(toNoteItems(document["_id"], document["creator_id"], document["notes"]))
+    await mongodb["documents"].insert_one({**document, "notes": {}, NOTES_IN_COLLECTION_FIELD: True})
+
+
+def findDocumentsCursor(mongodb, document_filter: dict, projection: Optional[dict] = None, limit: Optional[int] = None):
+    """
+    Returns a cursor of the documents that match a filter with the items of their notes joined in, to pass through
+    assembleDocumentNotes.
+
+    :param mongodb: The database
+    :param document_filter: The query filter of the documents
+    :param projection: The fields of the documents to read, all of them if None
+    :param limit: The most documents to read, all of them if None
+    """
+    stages = [{"$match": document_filter}]
+    if limit is not None:
+        stages.append({"$limit": limit})
+    if projection is not None:
+        stages.append({"$project": {**projection, NOTES_IN_COLLECTION_FIELD: 1}})
+    stages.append(lookupNoteItemsStage(noteItemProjection()))
+    return mongodb["documents"].aggregate(stages)
+
+
+def assembleDocumentNotes(documents: list[dict]) -> None:
+    """
+    Sets the notes of documents read through findDocumentsCursor that are stored in the notes collection, in place, in the
+    order they are in the document.
+    """
+    for document in documents:
+        note_items = document.pop("note_items", [])
+        if isNotesInCollection(document):
+            note_items.sort(key=lambda note_item: coordsSortKey(note_item["note_id"]))
+            document["notes"] = {note_item.pop("note_id"): note_item for note_item in note_items}
+
+
+async def findDocuments(mongodb, document_filter: dict, projection: Optional[dict] = None, limit: Optional[int] = None) -> list[dict]:
+    """
+    Returns the documents that match a filter with their notes, whichever layout they are stored in, in a single round trip.
+    """
+    documents = await findDocumentsCursor(mongodb, document_filter, projection, limit).to_list(length=None)
+    assembleDocumentNotes(documents)
+    return documents
+
+
+async def findDocument(mongodb, document_filter: dict, projection: Optional[dict] = None) -> Optional[dict]:
+    documents = await findDocuments(mongodb, document_filter, projection, limit=1)
+    return documents[0] if documents else None
+
+
+async def findDocumentsNoteIds(mongodb, document_ids: list[ObjectId]) -> dict[str, dict]:
+    """
+    Returns the creator and note ids of documents, to check reviews of their notes against.
+
+    :return: Dict of the ids of the documents that exist to their creator_id and note_ids
+    """
+    cursor = mongodb["documents"].find(
+        {"_id": {"$in": document_ids}},
+        {"creator_id": 1, NOTES_IN_COLLECTION_FIELD: 1, "note_ids": {"$map": {"input": {"$objectToArray": "$notes"}, "as": "note", "in": "$$note.k"}}}
+    )
+    documents = {str(document["_id"]): document async for document in cursor}
+    # the ids of the notes in the notes collection are read through the index alone
+    in_collection_ids = [document["_id"] for document in documents.values() if isNotesInCollection(document)]
+    if in_collection_ids:
+        note_items = mongodb[NOTES_COLLECTION].find({"document_id": {"$in": in_collection_ids}}, {"_id": 0, "document_id": 1, "note_id": 1})
+        async for note_item in note_items:
+            documents[str(note_item["document_id"])]["note_ids"].append(note_item["note_id"])
+    return documents
+
+
+async def updateDocumentNoteItems(mongodb, document: dict, updated_notes: dict[str, dict]) -> None:
+    """
+    Writes the notes of a document stored in the notes collection that an edit changed, the ones it didn't aren't written.
+
+    Reviews recorded since the document was read are kept, the reviews of a note are only written if the edit carried other
+    reviews over onto it.
+
+    :param mongodb: The database
+    :param document: The document as it was read, with its _id, creator_id and its notes before the edit
+    :param updated_notes: The notes of the document after the edit, as stored
+    """
+    current_notes = document["notes"]
+    requests = []
+    removed_note_ids = [note_id for note_id in current_notes if note_id not in updated_notes]
+    if removed_note_ids:
+        requests.append(DeleteMany({"document_id": document["_id"], "note_id": {"$in": removed_note_ids}}))
+    for note_id, note in updated_notes.items():
+        current_note = current_notes.get(note_id)
+        changed_fields = {field: value for field, value in note.items()
+                          if current_note is None or value != current_note.get(field)}
+        if not changed_fields:
+            continue
+        requests.append(UpdateOne({"document_id": document["_id"], "note_id": note_id},
+                                  {"$set": changed_fields, "$setOnInsert": {"creator_id": document["creator_id"]}}, upsert=True))
+    if requests:
+        await mongodb[NOTES_COLLECTION].bulk_write(requests, ordered=True)
+
+
+async def appendNoteReviews(mongodb, document_id: ObjectId, creator_id: str, note_id: str, reviews: list[dict[str, Any]],
+                            timestamp: datetime, notes_in_collection: bool) -> Optional[dict]:
+    """
+    Appends reviews to a note of a document of the given user, and adds them to its recall state, in a single atomic write.
+
+    :param mongodb: The database
+    :param document_id: The id of the document
+    :param creator_id: The id of the user, the reviews are only appended to their document
+    :param note_id: The id of the note
+    :param reviews: The reviews as stored
+    :param timestamp: When the reviews were made
+    :param notes_in_collection: Whether the notes of the document are more likely stored in the notes collection, the layout
+        tried first
+    :return: The document after the reviews, with its _id, creator_id, version and the summaries of the notes needed to reschedule
+        the note, see findRescheduledNoteItems, None if the user has no such document or it hasn't got the note
+    """
+    appends = [_appendNoteItemReviews, _appendEmbeddedNoteReviews]
+    for append in appends if notes_in_collection else reversed(appends):
+        document = await append(mongodb, document_id, creator_id, note_id, reviews, timestamp)
+        if document is not None:
+            return document
+    return None
+
+
+async def _appendEmbeddedNoteReviews(mongodb, document_id: ObjectId, creator_id: str, note_id: str, reviews: list[dict[str, Any]],
+                                     timestamp: datetime) -> Optional[dict]:
+    document = await mongodb["documents"].find_one_and_update(
+        {"_id": document_id, "creator_id": creator_id, **notesExistFilter([note_id])},
+        appendNoteReviewsUpdate({note_id: reviews}) + [recordDocumentChangeStage(timestamp)],
+        projection=rescheduledDocumentProjection([note_id]), return_document=ReturnDocument.AFTER
+    )
+    return assembleRescheduledNotes(document) if document is not None else None
+
+
+async def _appendNoteItemReviews(mongodb, document_id: ObjectId, creator_id: str, note_id: str, reviews: list[dict[str, Any]],
+                                 timestamp: datetime) -> Optional[dict]:
+    result = await mongodb[NOTES_COLLECTION].update_one({"document_id": document_id, "note_id": note_id, "creator_id": creator_id},
+                                                        appendNoteItemReviewsUpdate(reviews))
+    if result.matched_count == 0:
+        return None
+    # the notes needed to reschedule the note are read after the review, with the version the review changed the document to
+    rescheduled_notes, changed_document = await asyncio.gather(
+        findRescheduledNoteItems(mongodb, {document_id: [note_id]}),
+        mongodb["documents"].find_one_and_update({"_id": document_id}, [recordDocumentChangeStage(timestamp)],
+                                                 projection={"creator_id": 1, "version": 1}, return_document=ReturnDocument.AFTER),
+    )
+    if changed_document is not None:
+        changed_document["notes"] = rescheduled_notes.get(document_id, {})
+    return changed_document
+
+
+def rescheduledDocumentProjection(reviewed_note_ids: list[str]) -> dict:
+    # the projection of a document with its notes inside it, with only the notes needed to reschedule the reviewed notes
+    return {"creator_id": 1, "version": 1, "notes": rescheduledNoteSummariesExpression(reviewed_note_ids)}
+
+
+def assembleRescheduledNotes(document: dict) -> dict:
+    # the summaries of the notes are projected as a list of {"k": note id, ...}, see documentSummaryStages
+    document["notes"] = {note.pop("k"): note for note in document["notes"]}
+    return document
+
+
+async def findRescheduledNoteItems(mongodb, reviewed_note_ids_by_document: dict[ObjectId, list[str]]) -> dict[ObjectId, dict[str, dict]]:
+    """
+    Finds the summaries of the notes needed to reschedule the reviewed notes of documents with their notes stored in the notes
+    collection, the reviewed notes, the notes under them and the notes above them, in a single read.
+
+    :param mongodb: The database
+    :param reviewed_note_ids_by_document: Dict of document ids to the ids of their reviewed notes
+    :return: Dict of document ids to dicts of note ids to the summaries of their notes, as in documentSummaryStages
+    """
+    note_items = await mongodb[NOTES_COLLECTION].find(
+        {"document_id": {"$in": list(reviewed_note_ids_by_document.keys())}, "$expr": {"$or": [
+            {"$and": [{"$eq": ["$document_id", document_id]}, rescheduledNoteExpression("$note_id", note_ids)]}
+            for document_id, note_ids in reviewed_note_ids_by_document.items()
+        ]}},
+        {"_id": 0, "document_id": 1, **noteSummaryFields("$$ROOT", "$note_id")}
+    ).to_list(length=None)
+    notes_by_document = {}
+    for note_item in note_items:
+        notes_by_document.setdefault(note_item.pop("document_id"), {})[note_item.pop("k")] = note_item
+    return notes_by_document
+
+
+async def appendDocumentsNoteReviews(mongodb, creator_id: str, reviews_by_document: dict[str, dict[str, list[dict[str, Any]]]],
+                                     in_collection_ids: set[str], timestamp: datetime) -> tuple[set[str], list[dict]]:
+    """
+    Appends reviews to notes of many documents of the given user, the writes made all at once, the reviews of a document with
+    its notes inside it in a single atomic write.
+
+    :param mongodb: The database
+    :param creator_id: The id of the user, the reviews are only appended to their documents
+    :param reviews_by_document: Dict of document ids to dicts of note ids to the reviews to append to them, as stored
+    :param in_collection_ids: The ids of the documents with their notes stored in the notes collection
+    :param timestamp: When the reviews were made
+    :return: The ids of the documents that didn't get their reviews, deleted or edited since they were read, and every document
+        that got reviews as it is after them, told by the writes themselves rather than by reading the documents again, with
+        its _id, creator_id, version and the summaries of the notes needed to reschedule its reviewed notes
+    """
+    embedded_reviews = {document_id: reviews_by_note for document_id, reviews_by_note in reviews_by_document.items()
+                        if document_id not in in_collection_ids}
+    in_collection_reviews = {document_id: reviews_by_note for document_id, reviews_by_note in reviews_by_document.items()
+                             if document_id in in_collection_ids}
+    failed_document_ids = set()
+    reviewed_documents = []
+    if embedded_reviews:
+        updated = await updateEachItem(
+            mongodb["documents"],
+            [{"_id": ObjectId(document_id), "creator_id": creator_id, **notesExistFilter(list(reviews_by_note.keys()))}
+             for document_id, reviews_by_note in embedded_reviews.items()],
+            [appendNoteReviewsUpdate(reviews_by_note) + [recordDocumentChangeStage(timestamp)] for reviews_by_note in embedded_reviews.values()],
+            [rescheduledDocumentProjection(list(reviews_by_note.keys())) for reviews_by_note in embedded_reviews.values()]
+        )
+        failed_document_ids |= {document_id for document_id, document in zip(embedded_reviews, updated) if document is None}
+        reviewed_documents += [assembleRescheduledNotes(document) for document in updated if document is not None]
+    if in_collection_reviews:
+        note_entries = [(document_id, note_id, reviews) for document_id, reviews_by_note in in_collection_reviews.items()
+                        for note_id, reviews in reviews_by_note.items()]
+        # the notes are written one by one, a document whose note was removed since it was read gets the reviews of its other notes
+        updated = await updateEachItem(
+            mongodb[NOTES_COLLECTION],
+            [{"document_id": ObjectId(document_id), "note_id": note_id, "creator_id": creator_id} for document_id, note_id, _ in note_entries],
+            [appendNoteItemReviewsUpdate(reviews) for _, _, reviews in note_entries]
+        )
+        failed_document_ids |= {document_id for (document_id, _, _), note_item in zip(note_entries, updated) if note_item is None}
+        reviewed_note_ids_by_document = {}
+        for (document_id, note_id, _), note_item in zip(note_entries, updated):
+            if note_item is not None:
+                reviewed_note_ids_by_document.setdefault(ObjectId(document_id), []).append(note_id)
+        if reviewed_note_ids_by_document:
+            # the versions the reviews changed the documents to, and the notes needed to reschedule them, at once
+            rescheduled_notes, *changed_documents = await asyncio.gather(
+                findRescheduledNoteItems(mongodb, reviewed_note_ids_by_document),
+                *[mongodb["documents"].find_one_and_update({"_id": document_id}, [recordDocumentChangeStage(timestamp)],
+                                                           projection={"creator_id": 1, "version": 1}, return_document=ReturnDocument.AFTER)
+                  for document_id in reviewed_note_ids_by_document]
+            )
+            for changed_document in changed_documents:
+                if changed_document is not None:
+                    changed_document["notes"] = rescheduled_notes.get(changed_document["_id"], {})
+                    reviewed_documents.append(changed_document)
+    return failed_document_ids, reviewed_documents
+
+
+async def updateEachItem(collection, filters: list[dict], updates: list[list[dict]],
+                         projections: Optional[list[dict]] = None) -> list[Optional[dict]]:
+    """
+    Writes the update of every filter in its own write, all at once, and returns each item as it is after its update, as told
+    by its own write rather than by reading the items again after.
+
+    :param collection: The collection of the items
+    :param filters: The filter of every item
+    :param updates: The update of every item
+    :param projections: The projection of every item returned, only its _id if None
+    :return: The item of every filter after its update, None if it didn't match, deleted or changed since it was read, or its
+        write failed
+    """
+    projections = projections or [{"_id": 1}] * len(filters)
+    results = await asyncio.gather(*[collection.find_one_and_update(item_filter, update, projection=projection,
+                                                                    return_document=ReturnDocument.AFTER)
+                                     for item_filter, update, projection in zip(filters, updates, projections)],
+                                   return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException) and not isinstance(result, WriteError):
+            raise result
+    return [None if isinstance(result, WriteError) else result for result in results]
+
+
+async def deleteDocument(mongodb, document_id: ObjectId, creator_id: str) -> bool:
+    """
+    Deletes a document of the given user, and its notes, returns whether it did.
+    """
+    document = await mongodb["documents"].find_one_and_delete({"_id": document_id, "creator_id": creator_id},
+                                                              projection={NOTES_IN_COLLECTION_FIELD: 1})
+    if document is None:
+        return False
+    if isNotesInCollection(document):
+        await mongodb[NOTES_COLLECTION].delete_many({"document_id": document_id})
+    return True
@@ -0,0 +1,118 @@
+from array import array
+from typing import Any, Iterator
+
+# the id of a missing parent, child or sibling
+NO_NOTE = -1
+
+
+def coordsSortKey(coords: str) -> tuple[int, ...]:
+    # notes sorted by their coords are in the order of the headings of the document, '2' before '10'
+    return tuple(int(part) for part in coords.split('.'))
+
+
+class NoteTree:
+    """
+    The structure of a document's notes as integer ids in flat arrays, built once per document instead of walking the
+    dotted coords and children lists of the stored notes.
+
+    Ids are given in pre-order, so a note comes before its children and the notes under it are the ids right after it,
+    up to subtree_ends[id]. The coords of every id are kept to convert back to the stored notes.
+    """
+    __slots__ = ('coords', 'ids', 'parents', 'first_children', 'next_siblings', 'depths', 'subtree_ends')
+
+    def __init__(self):
+        self.coords: list[str] = []
+        self.ids: dict[str, int] = {}
+        self.parents = array('i')
+        self.first_children = array('i')
+        self.next_siblings = array('i')
+        self.depths = array('i')
+        self.subtree_ends = array('i')
+
+    def __len__(self) -> int:
+        return len(self.coords)
+
+    @classmethod
+    def fromNotes(cls, notes: dict[str, Any]) -> 'NoteTree':
+        """
+        Builds the tree of the notes of a document, or of a parsed heading structure.
+
+        Roots are the coords without a '.', and the rest are reached through the children of every note, children that
+        don't exist are left out.
+
+        :param notes: Dict of coords to notes as stored, Note or HeadingNode, anything with children
+        :return: The tree of the notes
+        """
+        tree = cls()
+        # (coords, parent id) of the notes left to add, and the last child added to every parent
+        stack = [(coords, NO_NOTE) for coords in reversed(notes.keys()) if '.' not in coords]
+        previous_root = NO_NOTE
+        previous_siblings = {}
+        while stack:
+            coords, parent = stack.pop()
+            note = notes.get(coords)
+            if note is None:
+                continue
+            note_id = len(tree.coords)
+            tree.coords.append(coords)
+            tree.ids[coords] = note_id
+            tree.parents.append(parent)
+            tree.first_children.append(NO_NOTE)
+            tree.next_siblings.append(NO_NOTE)
+            tree.depths.append(0 if parent == NO_NOTE else tree.depths[parent] + 1)
+            tree.subtree_ends.append(note_id + 1)
+
+            previous_sibling = previous_siblings.get(parent, previous_root if parent == NO_NOTE else NO_NOTE)
+            if previous_sibling != NO_NOTE:
+                tree.next_siblings[previous_sibling] = note_id
+            elif parent != NO_NOTE:
+                tree.first_children[parent] = note_id
+            if parent == NO_NOTE:
+                previous_root = note_id
+            else:
+                previous_siblings[parent] = note_id
+
+            children = note['children'] if isinstance(note, dict) else note.children
+            stack.extend((child_coords, note_id) for child_coords in reversed(children))
+
+        # the subtree of a note ends where the subtree of its last descendant does
+        for note_id in range(len(tree.coords) - 1, -1, -1):
+            parent = tree.parents[note_id]
+            if parent != NO_NOTE and tree.subtree_ends[note_id] > tree.subtree_ends[parent]:
+                tree.subtree_ends[parent] = tree.subtree_ends[note_id]
+        return tree
+
+    def roots(self) -> Iterator[int]:
+        note_id = 0 if self.coords else NO_NOTE
+        while note_id != NO_NOTE:
+            yield note_id
+            note_id = self.next_siblings[note_id]
+
+    def children(self, note_id: int) -> Iterator[int]:
+        child_id = self.first_children[note_id]
+        while child_id != NO_NOTE:
+            yield child_id
+            child_id = self.next_siblings[child_id]
+
+    def subtree(self, note_id: int) -> range:
+        """
+        Returns the ids of a note and every note under it.
+        """
+        return range(note_id, self.subtree_ends[note_id])
+
+    def branch(self, note_id: int) -> list[int]:
+        """
+        Returns the ids of the root of a note, its child and so on down to the note.
+        """
+        branch = []
+        while note_id != NO_NOTE:
+            branch.append(note_id)
+            note_id = self.parents[note_id]
+        branch.reverse()
+        return branch
+
+    def childrenCoords(self, note_id: int) -> list[str]:
+        """
+        Returns the coords of the children of a note, as they are stored in its children.
+        """
+        return [self.coords[child_id] for child_id in self.children(note_id)]
@@ -0,0 +1,61 @@
+from typing import Any
+
+import orjson
+from bson import ObjectId
+from pydantic import BaseModel
+from starlette.requests import Request
+from starlette.responses import Response
+
+from string_utils import generateContentHash
+
+
+def dumpModelJson(model: BaseModel) -> bytes:
+    """
+    Returns the json of a model as bytes, serialized by pydantic without going through a dict or a str.
+    """
+    return model.__pydantic_serializer__.to_json(model, by_alias=False)
+
+
+class ModelResponse(Response):
+    """
+    A json response of a pydantic model, serialized by pydantic straight to json bytes instead of being dumped to a dict and then
+    encoded with the standard json module. Anything other than a model is encoded with orjson, ObjectIds and datetimes included.
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, BaseModel):
+            return dumpModelJson(content)
+        # naive datetimes are stored in utc, they are given with their offset the same as the timestamps of models
+        return orjson.dumps(content, default=_encodeDefault, option=orjson.OPT_NAIVE_UTC)
+
+
+def _encodeDefault(value: Any) -> Any:
+    # the types orjson can't encode by itself
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode='json')
+    raise TypeError(f'{type(value).__name__} is not json serializable')
+
+
+def generateETag(*parts: Any) -> str:
+    """
+    Returns a strong etag of the given parts, like the versions of the items of a response, equal parts give equal etags.
+    """
+    return f'"{generateContentHash(":".join(str(part) for part in parts))}"'
+
+
+def matchesETag(request: Request, etag: str) -> bool:
+    """
+    Returns whether the etag is one of the If-None-Match header of the request, the client already has the response.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    etags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in etags or etag in etags
+
+
+def notModifiedResponse(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
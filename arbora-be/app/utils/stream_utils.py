@@ -0,0 +1,36 @@
+from typing import AsyncIterator, Callable, Optional
+
+from pydantic import BaseModel
+
+from response_utils import dumpModelJson
+
+# listings streamed as newline delimited json, a line per item, are read from the database and written out this many items at a
+# time, so only a batch is ever held in memory however many items there are
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+STREAM_BATCH_SIZE = 50
+
+
+async def generateNdjsonLines(cursor, model: type[BaseModel], prepare_batch: Optional[Callable[[list[dict]], None]] = None,
+                              batch_size: int = STREAM_BATCH_SIZE) -> AsyncIterator[bytes]:
+    """
+    Yields the items of a cursor as lines of json, a chunk per batch, to stream in a StreamingResponse.
+
+    :param cursor: The motor cursor of the items as stored
+    :param model: The model every item is validated and dumped with
+    :param prepare_batch: Called with every batch before it is dumped, to update the items in place
+    :param batch_size: The items fetched from the database and written out at a time
+    """
+    batch = []
+    async for item in cursor.batch_size(batch_size):
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield _dumpBatch(batch, model, prepare_batch)
+            batch = []
+    if batch:
+        yield _dumpBatch(batch, model, prepare_batch)
+
+
+def _dumpBatch(batch: list[dict], model: type[BaseModel], prepare_batch: Optional[Callable[[list[dict]], None]]) -> bytes:
+    if prepare_batch is not None:
+        prepare_batch(batch)
+    return b''.join(dumpModelJson(model.model_validate(item)) + b'\n' for item in batch)
@@ -1,6 +1,14 @@
+import hashlib
 import random
 import string
 
 
 def generateRandomId(n: int) -> str:
     return ''.join(random.choices(string.ascii_lowercase + string.digits, k=n))
+
+
+def generateContentHash(content: str) -> str:
+    """
+    Returns a short fingerprint of content, equal fingerprints mean equal content.
+    """
+    return hashlib.blake2b(content.encode(), digest_size=16).hexdigest()
@@ -0,0 +1,185 @@
+import heapq
+from typing import Optional
+
+from pymongo import ASCENDING, ReplaceOne
+from pymongo.errors import BulkWriteError
+
+from note import RecallState
+from note_review_utils import calculateNextDueTimestamp, evaluateBranchRecall, getNoteRecallState
+from note_tree_utils import NO_NOTE, NoteTree
+
+# every note of every document has an entry in the note schedule collection with the timestamp it is due for review at, and the
+# recall states of its branch to work out its recall at any time. the entries of a user are indexed by when they are due so
+# the notes to study are an index range scan away
+NOTE_SCHEDULE_COLLECTION = "note_schedule"
+
+# the code of the error a write fails with when it would duplicate a unique key
+DUPLICATE_KEY_ERROR_CODE = 11000
+
+# the number of notes due the earliest that are read for every note of the study queue, for the ones whose recall decays slower
+# than the ones due before them to be picked over them
+STUDY_QUEUE_CANDIDATES_PER_NOTE = 2
+
+
+async def createNoteScheduleIndexes(mongodb) -> None:
+    await mongodb[NOTE_SCHEDULE_COLLECTION].create_index([("creator_id", ASCENDING), ("next_due", ASCENDING)])
+    await mongodb[NOTE_SCHEDULE_COLLECTION].create_index([("document_id", ASCENDING)])
+
+
+def generateNoteScheduleEntries(document: dict, note_ids: Optional[set[str]] = None, include_children: bool = True) -> list[dict]:
+    """
+    Returns the note schedule entries of the notes of a document.
+
+    :param document: The document as stored, with its _id, creator_id, version and notes
+    :param note_ids: The notes to return the entries of, every note if None
+    :param include_children: Whether to return the entries of the notes under the given ones too
+    :return: List of note schedule entries
+    """
+    document_id = str(document["_id"])
+    notes = document["notes"]
+    tree = NoteTree.fromNotes(notes)
+    states = [RecallState(**getNoteRecallState(notes[coords])) for coords in tree.coords]
+
+    included_ids = range(len(tree))
+    if note_ids is not None and include_children:
+        included_ids = sorted({included_id for note_id in note_ids if note_id in tree.ids for included_id in tree.subtree(tree.ids[note_id])})
+    elif note_ids is not None:
+        included_ids = sorted(tree.ids[note_id] for note_id in note_ids if note_id in tree.ids)
+
+    entries = []
+    for included_id in included_ids:
+        coords = tree.coords[included_id]
+        branch_states = [states[branch_id] for branch_id in tree.branch(included_id)]
+        entries.append({
+            "_id": f"{document_id}/{coords}",
+            "creator_id": document["creator_id"],
+            "document_id": document_id,
+            "version": document.get("version", 0),
+            "note_id": coords,
+            "title": notes[coords]["title"],
+            "next_due": calculateNextDueTimestamp(branch_states),
+            "branch_states": [state.model_dump() for state in branch_states],
+        })
+    return entries
+
+
+def findChangedScheduleNoteIds(current_notes: dict[str, dict], updated_notes: dict[str, dict]) -> tuple[set[str], set[str]]:
+    """
+    Returns the ids of the notes whose schedule entries an edit of a document changed, and of the notes it removed.
+
+    The entry of a note changes with its title and with the recall state of any note of its branch, so a note whose recall
+    state or parent changed, or that is new, changes the entries of every note under it too. Notes the edit only changed the
+    content of keep their entries.
+
+    :param current_notes: The notes of the document before the edit, as stored
+    :param updated_notes: The notes of the document after the edit, as stored
+    :return: Tuple of (changed note ids, removed note ids)
+    """
+    current_tree = NoteTree.fromNotes(current_notes)
+    tree = NoteTree.fromNotes(updated_notes)
+    # whether the branch of every note of the updated tree changed, its parents are before it
+    changed_branches = [False] * len(tree)
+    changed_ids = set()
+    for note_id, coords in enumerate(tree.coords):
+        note = updated_notes[coords]
+        parent = tree.parents[note_id]
+        current_id = current_tree.ids.get(coords)
+        if current_id is None:
+            changed_branches[note_id] = True
+            changed_ids.add(coords)
+            continue
+        current_note = current_notes[coords]
+        current_parent = current_tree.parents[current_id]
+        changed_branches[note_id] = ((parent != NO_NOTE and changed_branches[parent]) or
+                                     (current_tree.coords[current_parent] if current_parent != NO_NOTE else None) !=
+                                     (tree.coords[parent] if parent != NO_NOTE else None) or
+                                     not _hasSameRecall(current_note, note))
+        if changed_branches[note_id] or current_note["title"] != note["title"]:
+            changed_ids.add(coords)
+    removed_ids = {coords for coords in current_tree.coords if coords not in tree.ids}
+    return changed_ids, removed_ids
+
+
+def _hasSameRecall(note: dict, other_note: dict) -> bool:
+    # notes without a recall state have it worked out from their reviews
+    if note.get("recall_state") != other_note.get("recall_state"):
+        return False
+    return note.get("recall_state") is not None or note.get("reviews") == other_note.get("reviews")
+
+
+async def updateNoteSchedule(mongodb, document: dict, note_ids: Optional[set[str]] = None, is_new_document: bool = False) -> None:
+    """
+    Updates the note schedule entries of the notes of a document after they were reviewed, or of all of them after it was
+    created or when they are rebuilt.
+
+    Entries are only written over by ones of the same or a later version of the document, so a change whose schedule is
+    updated after that of a later one doesn't put back the stale entries.
+
+    :param mongodb: The database
+    :param document: The document as stored after the change, with its _id, creator_id, version and notes
+    :param note_ids: The notes that were reviewed, their children's entries are updated too, None to update every note
+    :param is_new_document: Whether the document was just created, it has no entries to remove yet
+    """
+    collection = mongodb[NOTE_SCHEDULE_COLLECTION]
+    version = document.get("version", 0)
+    if note_ids is None and not is_new_document:
+        # the entries of notes that no longer exist are removed, unless they were written by a later version
+        await collection.delete_many({"document_id": str(document["_id"]), "version": {"$not": {"$gte": version}}})
+    await _replaceNoteScheduleEntries(collection, generateNoteScheduleEntries(document, note_ids), version)
+
+
+async def updateEditedNoteSchedule(mongodb, document: dict, current_notes: dict[str, dict]) -> None:
+    """
+    Updates the note schedule entries of an edited document, only the ones of the notes the edit changed are written and only
+    the ones of the notes it removed are deleted, see findChangedScheduleNoteIds.
+
+    :param mongodb: The database
+    :param document: The document as stored after the edit, with its _id, creator_id, version and notes
+    :param current_notes: The notes of the document before the edit, as stored
+    """
+    collection = mongodb[NOTE_SCHEDULE_COLLECTION]
+    version = document.get("version", 0)
+    changed_ids, removed_ids = findChangedScheduleNoteIds(current_notes, document["notes"])
+    if removed_ids:
+        await collection.delete_many({"_id": {"$in": [f"{document['_id']}/{coords}" for coords in removed_ids]},
+                                      "version": {"$not": {"$gte": version}}})
+    await _replaceNoteScheduleEntries(collection, generateNoteScheduleEntries(document, changed_ids, include_children=False), version)
+
+
+async def _replaceNoteScheduleEntries(collection, entries: list[dict], version: int) -> None:
+    # entries of earlier versions, or saved before entries had one, are replaced, and the upsert of an entry that was replaced
+    # by a later version fails on its _id and is skipped
+    requests = [ReplaceOne({"_id": entry["_id"], "version": {"$not": {"$gt": version}}}, entry, upsert=True) for entry in entries]
+    if not requests:
+        return
+    try:
+        await collection.bulk_write(requests, ordered=False)
+    except BulkWriteError as error:
+        if any(write_error["code"] != DUPLICATE_KEY_ERROR_CODE for write_error in error.details["writeErrors"]):
+            raise
+
+
+async def deleteNoteSchedule(mongodb, document_id: str) -> None:
+    await mongodb[NOTE_SCHEDULE_COLLECTION].delete_many({"document_id": document_id})
+
+
+async def getStudyQueue(mongodb, creator_id: str, limit: int, now_timestamp: float) -> list[tuple[float, dict]]:
+    """
+    Returns the notes of a user with the lowest recall probability, across all of their documents.
+
+    The longer ago a note was due the lower its recall is, give or take how fast the recall of its branch decays, so only the
+    few notes due the earliest are read through the (creator_id, next_due) index, and the lowest are picked from those. Notes
+    that were never reviewed are due at 0 and are read first, their recall is 0.
+
+    :param mongodb: The database
+    :param creator_id: The id of the user
+    :param limit: The most notes to return
+    :param now_timestamp: The epoch timestamp to compute the recall at
+    :return: List of (recall_probability, note schedule entry), lowest recall first
+    """
+    no_of_candidates = limit * STUDY_QUEUE_CANDIDATES_PER_NOTE
+    entries = await (mongodb[NOTE_SCHEDULE_COLLECTION].find({"creator_id": creator_id}).sort("next_due", ASCENDING)
+                     .limit(no_of_candidates).to_list(length=no_of_candidates))
+    candidates = ((evaluateBranchRecall([RecallState(**state) for state in entry["branch_states"]], now_timestamp), entry)
+                  for entry in entries)
+    return heapq.nsmallest(limit, candidates, key=lambda candidate: candidate[0])
@@ -0,0 +1,82 @@
+import asyncio
+import re
+from datetime import datetime, timedelta
+from typing import Optional
+
+from pymongo import ASCENDING
+
+from model_utils import EPOCH
+from note_storage_utils import findDocuments
+
+# clients that keep a copy of a user's library sync it with the changes since their last sync. documents and folders are found
+# through their indexed updated_at, set by every change to them, and deleted ones through the tombstones left by their deletion.
+# a sync token is the time a sync started at, as epoch milliseconds
+TOMBSTONES_COLLECTION = "tombstones"
+
+# a change is timestamped before it is written, so a sync can start after the timestamp of a change it doesn't see yet. the next
+# sync starts this far back to see it, changes made right before a sync are sent again by the next one
+SYNC_TOKEN_OVERLAP = timedelta(seconds=10)
+# tombstones are kept this long, a client that hasn't synced since gets everything again instead of the changes
+TOMBSTONE_TTL = timedelta(days=30)
+
+
+async def createSyncIndexes(mongodb) -> None:
+    await mongodb["documents"].create_index([("creator_id", ASCENDING), ("updated_at", ASCENDING)])
+    await mongodb["folders"].create_index([("creator_id", ASCENDING), ("updated_at", ASCENDING)])
+    await mongodb[TOMBSTONES_COLLECTION].create_index([("creator_id", ASCENDING), ("deleted_at", ASCENDING)])
+    await mongodb[TOMBSTONES_COLLECTION].create_index([("deleted_at", ASCENDING)], expireAfterSeconds=int(TOMBSTONE_TTL.total_seconds()))
+
+
+def generateSyncToken(sync_timestamp: datetime) -> str:
+    """
+    Returns the token of a sync started at the given time, the next sync gets the changes since a little before it.
+    """
+    return str((sync_timestamp - SYNC_TOKEN_OVERLAP - EPOCH) // timedelta(milliseconds=1))
+
+
+def parseSyncToken(token: str) -> Optional[datetime]:
+    """
+    Returns the time the changes of a sync token are since, None if it isn't a valid token.
+    """
+    # tokens are ascii digits, and the ones past the latest datetime are invalid too
+    if not re.fullmatch(r"[0-9]{1,15}", token):
+        return None
+    try:
+        return EPOCH + timedelta(milliseconds=int(token))
+    except (OverflowError, ValueError):
+        return None
+
+
+async def recordTombstone(mongodb, creator_id: str, item_type: str, item_id: str, deleted_at: datetime) -> None:
+    """
+    Records the deletion of a document or folder, for the clients that have a copy of it to delete theirs when they sync.
+
+    :param mongodb: The database
+    :param creator_id: The id of the user the item belonged to
+    :param item_type: "document" or "folder"
+    :param item_id: The id of the deleted item
+    :param deleted_at: When it was deleted
+    """
+    await mongodb[TOMBSTONES_COLLECTION].insert_one({"creator_id": creator_id, "item_type": item_type, "item_id": item_id,
+                                                     "deleted_at": deleted_at})
+
+
+async def getSyncChanges(mongodb, creator_id: str, since: Optional[datetime]) -> tuple[list[dict], list[dict], list[dict]]:
+    """
+    Returns the documents and folders of a user changed since the given time, and the tombstones of the ones deleted since.
+
+    :param mongodb: The database
+    :param creator_id: The id of the user
+    :param since: The time of the changes to return, None for every document and folder and no tombstones
+    :return: Tuple of (documents, folders, tombstones) as stored
+    """
+    changed_filter = {"creator_id": creator_id}
+    if since is not None:
+        changed_filter["updated_at"] = {"$gte": since}
+    documents, folders = await asyncio.gather(
+        findDocuments(mongodb, changed_filter),
+        mongodb["folders"].find(changed_filter).to_list(length=None),
+    )
+    tombstones = [] if since is None else \
+        await mongodb[TOMBSTONES_COLLECTION].find({"creator_id": creator_id, "deleted_at": {"$gte": since}}).to_list(length=None)
+    return documents, folders, tombstones